@@ -87,6 +87,19 @@ DATABASES = {
 }
 
 
+# Cache
+# The response cache version, cached tiles and schedule versions live here.
+# With several worker processes use a shared backend (memcached, Redis,
+# database) so a write invalidates them everywhere: with this per-process
+# cache other workers serve them until they expire.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,110 @@
+"""
+Grid-based marker clustering.
+
+Every event is counted into one Web Mercator grid cell per zoom level and the
+per-cell totals are kept in the EventCluster table, so a viewport at any zoom
+is answered from a bounded number of precomputed rows instead of the events
+themselves. The totals are adjusted incrementally by the Event signals in
+models.py; rebuild() recomputes them from scratch.
+"""
+from math import floor
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .geo import mercator
+from .models import Event, EventCluster
+
+CLUSTER_MAX_ZOOM = 16
+# Each map tile is split into CELLS_PER_TILE x CELLS_PER_TILE cells (64px at 256px tiles)
+CELLS_PER_TILE = 4
+
+
+def cell_for(lat, lon, zoom):
+    """Return the (x, y) grid cell containing a point at the given zoom level"""
+    size = (2 ** zoom) * CELLS_PER_TILE
+    x, y = mercator(lat, lon)
+    return min(int(floor(x * size)), size - 1), min(int(floor(y * size)), size - 1)
+
+
+def add_event(lat, lon, delta=1):
+    """Add (delta=1) or remove (delta=-1) one event position from every zoom level"""
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        x, y = cell_for(lat, lon, zoom)
+        cells = EventCluster.objects.filter(zoom=zoom, cell_x=x, cell_y=y)
+        updated = cells.update(
+            count=F('count') + delta,
+            latitude_sum=F('latitude_sum') + lat * delta,
+            longitude_sum=F('longitude_sum') + lon * delta,
+        )
+        if delta < 0:
+            cells.filter(count__lte=0).delete()
+        elif not updated:
+            try:
+                with transaction.atomic():
+                    EventCluster.objects.create(
+                        zoom=zoom, cell_x=x, cell_y=y,
+                        count=delta, latitude_sum=lat * delta, longitude_sum=lon * delta,
+                    )
+            except IntegrityError:
+                # Another request created the cell first
+                cells.update(
+                    count=F('count') + delta,
+                    latitude_sum=F('latitude_sum') + lat * delta,
+                    longitude_sum=F('longitude_sum') + lon * delta,
+                )
+
+
+def move_event(old_position, new_position):
+    """Update the hierarchy for an event whose coordinates changed"""
+    if old_position == new_position:
+        return
+    if old_position is not None:
+        add_event(*old_position, delta=-1)
+    if new_position is not None:
+        add_event(*new_position)
+
+
+@transaction.atomic
+def rebuild(batch_size=2000):
+    """Recompute every cluster from the Event table, one zoom level at a time"""
+    EventCluster.objects.all().delete()
+    total = 0
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        cells = {}
+        for lat, lon in Event.objects.values_list('latitude', 'longitude').iterator(chunk_size=batch_size):
+            totals = cells.setdefault(cell_for(lat, lon, zoom), [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += lat
+            totals[2] += lon
+
+        EventCluster.objects.bulk_create(
+            (
+                EventCluster(zoom=zoom, cell_x=x, cell_y=y, count=count, latitude_sum=lat_sum, longitude_sum=lon_sum)
+                for (x, y), (count, lat_sum, lon_sum) in cells.items()
+            ),
+            batch_size=batch_size,
+        )
+        total += len(cells)
+    return total
+
+
+def clusters_in_viewport(boxes, zoom):
+    """Cluster centroids and counts for the (south, west, north, east) boxes at a zoom level"""
+    zoom = min(zoom, CLUSTER_MAX_ZOOM)
+    clusters = []
+    for south, west, north, east in boxes:
+        min_x, min_y = cell_for(north, west, zoom)
+        max_x, max_y = cell_for(south, east, zoom)
+        rows = EventCluster.objects.filter(
+            zoom=zoom,
+            cell_x__range=(min_x, max_x),
+            cell_y__range=(min_y, max_y),
+        ).values_list('count', 'latitude_sum', 'longitude_sum')
+        for count, lat_sum, lon_sum in rows:
+            clusters.append({
+                'latitude': lat_sum / count,
+                'longitude': lon_sum / count,
+                'count': count,
+            })
+    return clusters
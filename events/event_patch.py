@@ -0,0 +1,217 @@
+"""
+Partial updates of an event's geometry and subsections.
+
+Instead of reposting the whole event form, the editor sends only what
+changed:
+
+    {
+        "version": 7,
+        "event": {"latitude": 12.97, "boundary_vertices": [{"op": "replace", "index": 3, "point": [12.9, 77.5]}]},
+        "subsections": [
+            {"id": 4, "name": "Main Stage", "boundary_coordinates": [[12.9, 77.5], ...]},
+            {"id": 5, "delete": true},
+            {"name": "Food Court", "boundary_coordinates": [...], "color": "#3b82f6"}
+        ]
+    }
+
+A boundary is replaced whole with boundary_coordinates or edited with a list
+of vertex operations (replace, insert or remove the vertex at an index,
+applied in order). Only the points sent are validated and only the changed
+columns are written, with save(update_fields=...) so the usual signals keep
+tiles, clusters and caches up to date.
+
+Edits are guarded by Event.version: a patch must carry the version it was
+made against and is refused with VersionConflict when someone else saved
+the event in between. Every accepted patch increments it.
+"""
+import math
+import re
+
+from django.db import transaction
+
+from .models import Event, EventSubsection
+
+EVENT_GEOMETRY_FIELDS = ('latitude', 'longitude')
+SUBSECTION_TEXT_FIELDS = ('name', 'description', 'color')
+DERIVED_FIELDS = ['boundary_lod', 'boundary_encoded', 'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east']
+MAX_VERTICES = 10000
+COLOR_RE = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+class PatchError(Exception):
+    """The patch is malformed or would produce invalid geometry"""
+
+
+class VersionConflict(Exception):
+    def __init__(self, version):
+        super().__init__(f'Event is at version {version}')
+        self.version = version
+
+
+def _number(value, low, high, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or not low <= value <= high:
+        raise PatchError(f'Invalid {name}')
+    return value
+
+
+def _point(value):
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise PatchError('Points must be [lat, lng] pairs')
+    return [_number(value[0], -90, 90, 'latitude'), _number(value[1], -180, 180, 'longitude')]
+
+
+def _polygon(points):
+    if not isinstance(points, list) or not 3 <= len(points) <= MAX_VERTICES:
+        raise PatchError(f'A boundary needs between 3 and {MAX_VERTICES} points')
+    return [_point(point) for point in points]
+
+
+def apply_vertex_ops(points, ops):
+    """
+    New vertex list of a boundary after a list of {"op", "index", "point"}
+    operations. Only the points being set are validated: the rest were when
+    the boundary was saved.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise PatchError('boundary_vertices must be a non-empty list')
+    points = list(points or [])
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError('Invalid vertex operation')
+        index = op.get('index')
+        kind = op.get('op')
+        upper = len(points) if kind == 'insert' else len(points) - 1
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index <= upper:
+            raise PatchError(f'Vertex index {index} out of range')
+        if kind == 'replace':
+            points[index] = _point(op.get('point'))
+        elif kind == 'insert':
+            points.insert(index, _point(op.get('point')))
+        elif kind == 'remove':
+            del points[index]
+        else:
+            raise PatchError(f'Unknown vertex operation {kind}')
+    if not 3 <= len(points) <= MAX_VERTICES:
+        raise PatchError(f'A boundary needs between 3 and {MAX_VERTICES} points')
+    return points
+
+
+def _boundary_change(changes, current):
+    """The new boundary if changes edit it, else None"""
+    if 'boundary_coordinates' in changes and 'boundary_vertices' in changes:
+        raise PatchError('Send either boundary_coordinates or boundary_vertices')
+    if 'boundary_vertices' in changes:
+        return apply_vertex_ops(current, changes['boundary_vertices'])
+    if 'boundary_coordinates' in changes:
+        return _polygon(changes['boundary_coordinates'])
+    return None
+
+
+def _patch_event(event, changes):
+    """Apply event changes in memory, returning the changed columns"""
+    if not isinstance(changes, dict):
+        raise PatchError('event must be an object')
+    unknown = set(changes) - set(EVENT_GEOMETRY_FIELDS) - {'boundary_coordinates', 'boundary_vertices'}
+    if unknown:
+        raise PatchError(f'Unknown event fields: {", ".join(sorted(unknown))}')
+    fields = []
+    for name, low, high in (('latitude', -90, 90), ('longitude', -180, 180)):
+        if name in changes:
+            setattr(event, name, _number(changes[name], low, high, name))
+            fields.append(name)
+    if 'boundary_coordinates' in changes and changes['boundary_coordinates'] is None:
+        # An event's boundary is optional and may be cleared
+        if 'boundary_vertices' in changes:
+            raise PatchError('Send either boundary_coordinates or boundary_vertices')
+        event.boundary_coordinates = None
+        fields += ['boundary_coordinates'] + DERIVED_FIELDS
+    else:
+        boundary = _boundary_change(changes, event.boundary_coordinates)
+        if boundary is not None:
+            event.boundary_coordinates = boundary
+            fields += ['boundary_coordinates'] + DERIVED_FIELDS
+    return fields
+
+
+def _patch_subsection(subsection, changes):
+    """Apply subsection changes in memory, returning the changed columns"""
+    unknown = set(changes) - set(SUBSECTION_TEXT_FIELDS) - {'id', 'delete', 'boundary_coordinates', 'boundary_vertices'}
+    if unknown:
+        raise PatchError(f'Unknown subsection fields: {", ".join(sorted(unknown))}')
+    fields = []
+    for name in SUBSECTION_TEXT_FIELDS:
+        if name in changes:
+            value = changes[name]
+            if not isinstance(value, str):
+                raise PatchError(f'Invalid {name}')
+            value = value.strip()
+            if name == 'name' and not 0 < len(value) <= 200:
+                raise PatchError('A subsection needs a name of at most 200 characters')
+            if name == 'color' and not COLOR_RE.match(value):
+                raise PatchError('Colors must be #rrggbb')
+            setattr(subsection, name, value)
+            fields.append(name)
+    boundary = _boundary_change(changes, subsection.boundary_coordinates)
+    if boundary is not None:
+        subsection.boundary_coordinates = boundary
+        fields += ['boundary_coordinates'] + DERIVED_FIELDS
+    return fields
+
+
+def apply_patch(event_id, patch):
+    """
+    Apply a patch to an event and return {'version', 'created'}, created
+    being the ids of new subsections in the order they were sent. Raises
+    PatchError or VersionConflict, in which case nothing is written.
+    """
+    if not isinstance(patch, dict) or isinstance(patch.get('version'), bool) or not isinstance(patch.get('version'), int):
+        raise PatchError('A patch is an object with the version it was made against')
+    items = patch.get('subsections', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise PatchError('subsections must be a list of objects')
+
+    with transaction.atomic():
+        # Locking the event row serializes patches to the same event
+        event = Event.objects.select_for_update().get(pk=event_id)
+        if event.version != patch['version']:
+            raise VersionConflict(event.version)
+        event_fields = _patch_event(event, patch['event']) if 'event' in patch else []
+
+        ids = [item['id'] for item in items if 'id' in item]
+        if any(isinstance(subsection_id, bool) or not isinstance(subsection_id, int) for subsection_id in ids):
+            raise PatchError('Subsection ids must be integers')
+        subsections = EventSubsection.objects.filter(event=event, pk__in=ids).in_bulk()
+        if len(set(ids)) != len(ids) or len(subsections) != len(ids):
+            raise PatchError('Unknown or repeated subsection id')
+
+        updates, deletes, creates = [], [], []
+        for item in items:
+            if 'id' not in item:
+                if 'name' not in item or 'boundary_coordinates' not in item:
+                    raise PatchError('New subsections need a name and boundary_coordinates')
+                subsection = EventSubsection(event=event)
+                _patch_subsection(subsection, item)
+                creates.append(subsection)
+            elif item.get('delete'):
+                deletes.append(subsections[item['id']])
+            else:
+                subsection = subsections[item['id']]
+                fields = _patch_subsection(subsection, item)
+                if fields:
+                    updates.append((subsection, fields))
+
+        if not (event_fields or updates or deletes or creates):
+            return {'version': event.version, 'created': []}
+        for subsection in deletes:
+            subsection.delete()
+        for subsection, fields in updates:
+            subsection.save(update_fields=fields)
+        for subsection in creates:
+            subsection.save()
+
+        event.version += 1
+        if event_fields:
+            event.save(update_fields=event_fields + ['version'])
+        else:
+            Event.objects.filter(pk=event.pk).update(version=event.version)
+    return {'version': event.version, 'created': [subsection.id for subsection in creates]}
@@ -103,8 +103,8 @@ class StageEventForm(forms.ModelForm):
                 raise forms.ValidationError("End time must be after start time.")
 
             if self.subsection:
-                from django.db.models import Q
-                # Check for overlaps
+                # Check for overlaps in the database: a cached schedule index
+                # may not have seen a write made by another process yet
                 overlaps = self.subsection.scheduled_events.filter(
                     start_time__lt=end_time,
                     end_time__gt=start_time
@@ -117,3 +117,14 @@ class StageEventForm(forms.ModelForm):
                     raise forms.ValidationError("This time slot overlaps with another event on this stage.")
         
         return cleaned_data
+
+class ScheduleImportForm(forms.Form):
+    schedule_file = forms.FileField(help_text="CSV with stage, title, start, end (and optionally description) columns, or an iCalendar (.ics) file")
+
+    def clean_schedule_file(self):
+        schedule_file = self.cleaned_data['schedule_file']
+        try:
+            schedule_file.text = schedule_file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The file must be UTF-8 encoded.")
+        return schedule_file
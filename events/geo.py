@@ -0,0 +1,163 @@
+from array import array
+from math import radians, degrees, sin, cos, tan, sqrt, atan2, asin, sinh, atan, log, pi
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371
+
+# Below this radius the equirectangular approximation (with the mean latitude
+# of each pair) stays well inside EDGE_TOLERANCE, so only points close to the
+# edge of the circle need the exact haversine formula. Near the poles the
+# approximation breaks down, so circles reaching past EQUIRECTANGULAR_MAX_LAT
+# are always measured exactly.
+EQUIRECTANGULAR_MAX_KM = 100
+EQUIRECTANGULAR_MAX_LAT = 85
+EDGE_TOLERANCE = 0.005
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points in kilometers using Haversine formula"""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_boxes(lat, lon, radius_km):
+    """
+    Return the (south, west, north, east) boxes that enclose a circle of
+    radius_km around (lat, lon). Circles crossing the antimeridian are split
+    into two boxes so each one can be matched with plain range lookups.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    south = lat - degrees(angular)
+    north = lat + degrees(angular)
+
+    # Circles touching a pole cover every longitude
+    if south <= -90 or north >= 90:
+        return [(max(south, -90), -180, min(north, 90), 180)]
+
+    ratio = sin(angular) / cos(radians(lat))
+    if ratio >= 1:
+        return [(south, -180, north, 180)]
+
+    delta = degrees(asin(ratio))
+    west = lon - delta
+    east = lon + delta
+
+    if west < -180:
+        return [(south, west + 360, north, 180), (south, -180, north, east)]
+    if east > 180:
+        return [(south, west, north, 180), (south, -180, north, east - 360)]
+    return [(south, west, north, east)]
+
+
+def viewport_boxes(south, west, north, east):
+    """
+    Normalize a map viewport into (south, west, north, east) boxes. Leaflet
+    reports longitudes outside [-180, 180] once the world wraps, so they are
+    folded back and viewports spanning the antimeridian are split in two.
+    """
+    if not (-90 <= south <= north <= 90):
+        raise ValueError('Invalid viewport latitudes')
+    if east - west >= 360:
+        return [(south, -180, north, 180)]
+    if west > east:
+        raise ValueError('Invalid viewport longitudes')
+
+    west = (west + 180) % 360 - 180
+    east = (east + 180) % 360 - 180
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180), (south, -180, north, east)]
+
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator(lat, lon):
+    """Project a point to normalized Web Mercator coordinates, both in [0, 1]"""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lon + 180) / 360
+    y = (1 - log(tan(radians(lat)) + 1 / cos(radians(lat))) / pi) / 2
+    return x, y
+
+
+def mercator_latitude(y):
+    """Inverse of the normalized Web Mercator y coordinate"""
+    return degrees(atan(sinh(pi * (1 - 2 * y))))
+
+
+def bounding_box_filter(boxes):
+    """Build a Q object matching Event rows whose position falls in any of the boxes"""
+    query = Q()
+    for south, west, north, east in boxes:
+        query |= Q(latitude__range=(south, north), longitude__range=(west, east))
+    return query
+
+
+def pack_coordinates(rows):
+    """Pack (latitude, longitude) pairs into two float arrays for the batch functions"""
+    lats = array('d')
+    lons = array('d')
+    for lat, lon in rows:
+        lats.append(lat)
+        lons.append(lon)
+    return lats, lons
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distances in kilometers from (lat, lon) to every packed point"""
+    lat0 = radians(lat)
+    lon0 = radians(lon)
+    cos_lat0 = cos(lat0)
+    to_rad = pi / 180
+    distances = array('d', bytes(8 * len(lats)))
+    for i in range(len(lats)):
+        phi = lats[i] * to_rad
+        a = sin((phi - lat0) * 0.5) ** 2 + cos_lat0 * cos(phi) * sin((lons[i] * to_rad - lon0) * 0.5) ** 2
+        distances[i] = 2 * EARTH_RADIUS_KM * atan2(sqrt(a), sqrt(1 - a))
+    return distances
+
+
+def within_radius(lat, lon, lats, lons, radius_km):
+    """
+    Return (index, distance_km) pairs for the packed points within radius_km
+    of (lat, lon). Small radii are classified with the equirectangular
+    approximation and only points near the edge fall back to haversine.
+    """
+    if radius_km > EQUIRECTANGULAR_MAX_KM or abs(lat) + degrees(radius_km / EARTH_RADIUS_KM) > EQUIRECTANGULAR_MAX_LAT:
+        return [(i, d) for i, d in enumerate(haversine_many(lat, lon, lats, lons)) if d <= radius_km]
+
+    lat0 = radians(lat)
+    lon0 = radians(lon)
+    cos_lat0 = cos(lat0)
+    to_rad = pi / 180
+    two_pi = 2 * pi
+    inner = radius_km * (1 - EDGE_TOLERANCE)
+    outer = radius_km * (1 + EDGE_TOLERANCE)
+
+    matches = []
+    for i in range(len(lats)):
+        phi = lats[i] * to_rad
+        dphi = phi - lat0
+        dlam = lons[i] * to_rad - lon0
+        if dlam > pi:
+            dlam -= two_pi
+        elif dlam < -pi:
+            dlam += two_pi
+        x = dlam * cos((phi + lat0) * 0.5)
+        distance = EARTH_RADIUS_KM * sqrt(x * x + dphi * dphi)
+        if distance > outer:
+            continue
+        if distance >= inner:
+            a = sin(dphi * 0.5) ** 2 + cos_lat0 * cos(phi) * sin(dlam * 0.5) ** 2
+            distance = 2 * EARTH_RADIUS_KM * atan2(sqrt(a), sqrt(1 - a))
+            if distance > radius_km:
+                continue
+        matches.append((i, distance))
+    return matches
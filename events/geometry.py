@@ -0,0 +1,165 @@
+"""
+Polygon helpers for event and subsection boundaries.
+
+Boundaries are lists of [lat, lng] pairs. simplify_tiers() precomputes
+Douglas-Peucker simplifications for a few zoom levels so the APIs can ship
+a boundary at the resolution the map can actually draw, and encode_tiers()
+precomputes the Google encoded polyline form of each of them.
+"""
+from math import cos, radians
+
+# Below this zoom level polygons are too small to see, so zoomed-out responses skip them
+BOUNDARY_MIN_ZOOM = 12
+# Zoom levels with a precomputed simplification. Requests above the last
+# tier get the full resolution boundary.
+LOD_ZOOMS = (12, 14, 16)
+# Maximum deviation, in screen pixels, allowed by a simplified boundary
+PIXEL_TOLERANCE = 1.0
+
+
+def lod_tier(zoom):
+    """Return the precomputed tier key for a map zoom level, or None for full resolution"""
+    if zoom is None:
+        return None
+    for tier in LOD_ZOOMS:
+        if zoom <= tier:
+            return f'z{tier}'
+    return None
+
+
+def boundary_bounds(points):
+    """(south, west, north, east) envelope of a boundary, or None if it is missing or malformed"""
+    try:
+        lats = [point[0] for point in points]
+        lngs = [point[1] for point in points]
+        return min(lats), min(lngs), max(lats), max(lngs)
+    except (TypeError, IndexError, ValueError):
+        return None
+
+
+def _perpendicular_distance(point, start, end, scale):
+    x, y = point[1] * scale, point[0]
+    x1, y1 = start[1] * scale, start[0]
+    x2, y2 = end[1] * scale, end[0]
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / length_sq))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
+
+
+def _douglas_peucker(points, tolerance, scale):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_distance = None, tolerance
+        for i in range(first + 1, last):
+            distance = _perpendicular_distance(points[i], points[first], points[last], scale)
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_polygon(points, tolerance):
+    """
+    Simplify a polygon ring with Douglas-Peucker, tolerance in degrees of
+    latitude. The ring is split at the vertex farthest from the first one so
+    the result always keeps at least three vertices.
+    """
+    if not points or len(points) <= 4:
+        return points
+    scale = cos(radians(points[0][0]))
+    origin = points[0]
+    split = max(
+        range(1, len(points)),
+        key=lambda i: (points[i][0] - origin[0]) ** 2 + ((points[i][1] - origin[1]) * scale) ** 2,
+    )
+    head = _douglas_peucker(points[:split + 1], tolerance, scale)
+    tail = _douglas_peucker(points[split:] + [origin], tolerance, scale)
+    simplified = head + tail[1:]
+    # Keep the ring closed only if the input was
+    if points[-1] != origin:
+        simplified.pop()
+    return simplified
+
+
+def simplify_tiers(points):
+    """Precompute the simplified boundary for every LOD zoom level"""
+    if not isinstance(points, list) or len(points) < 3:
+        return None
+    try:
+        scale = cos(radians(points[0][0]))
+        tiers = {}
+        for zoom in LOD_ZOOMS:
+            # Degrees covered by one pixel at this zoom (Web Mercator, 256px tiles)
+            tolerance = PIXEL_TOLERANCE * 360 * scale / (256 * 2 ** zoom)
+            tiers[f'z{zoom}'] = simplify_polygon(points, tolerance)
+    except (TypeError, IndexError):
+        # Malformed boundaries are stored as given but get no simplified tiers
+        return None
+    return tiers
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=5):
+    """Encode [lat, lng] pairs with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = int(round(lat * factor)), int(round(lng * factor))
+        encoded.append(_encode_value(lat - prev_lat))
+        encoded.append(_encode_value(lng - prev_lng))
+        prev_lat, prev_lng = lat, lng
+    return ''.join(encoded)
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode a Google encoded polyline back into [lat, lng] pairs"""
+    factor = 10 ** precision
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+
+    points = []
+    lat = lng = 0
+    for i in range(0, len(values) - 1, 2):
+        lat += values[i]
+        lng += values[i + 1]
+        points.append([lat / factor, lng / factor])
+    return points
+
+
+def encode_tiers(points, tiers):
+    """Encoded polylines for the full boundary ('full') and each simplified tier"""
+    if tiers is None:
+        return None
+    try:
+        encoded = {'full': encode_polyline(points)}
+        for tier, simplified in tiers.items():
+            encoded[tier] = encode_polyline(simplified)
+    except (TypeError, ValueError):
+        return None
+    return encoded
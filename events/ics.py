@@ -0,0 +1,117 @@
+"""
+iCalendar feeds of stage and event schedules.
+
+Feeds are versioned by the schedule version timestamps of events/schedule.py,
+which become their ETag and Last-Modified, so calendar clients polling with
+conditional requests get a 304 after one cache read and one small query. A
+changed feed is streamed from the database row by row and the finished body
+is kept in the Django cache for the next client asking for that version.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+PRODID = '-//Event Map//Stage Schedules//EN'
+# Feeds bigger than this are streamed every time instead of cached
+MAX_CACHED_FEED_BYTES = 2 * 1024 * 1024
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+FEED_MAX_AGE = 300
+
+
+def escape_text(value):
+    value = (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+    return value.replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split a content line into CRLF-terminated chunks of at most 75 octets"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    chunks = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def iter_calendar(name, acts, stamp, host):
+    """
+    Lines of a VCALENDAR for (id, title, description, start_time, end_time,
+    stage name) rows. stamp (the schedule version) is used as DTSTAMP so the
+    same schedule always renders to the same bytes.
+    """
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{PRODID}')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold(f'X-WR-CALNAME:{escape_text(name)}')
+    dtstamp = format_datetime(stamp)
+    for act_id, title, description, start_time, end_time, stage in acts:
+        yield (
+            fold('BEGIN:VEVENT')
+            + fold(f'UID:stage-event-{act_id}@{host}')
+            + fold(f'DTSTAMP:{dtstamp}')
+            + fold(f'DTSTART:{format_datetime(start_time)}')
+            + fold(f'DTEND:{format_datetime(end_time)}')
+            + fold(f'SUMMARY:{escape_text(title)}')
+            + fold(f'LOCATION:{escape_text(stage)}')
+            + (fold(f'DESCRIPTION:{escape_text(description)}') if description else '')
+            + fold('END:VEVENT')
+        )
+    yield fold('END:VCALENDAR')
+
+
+def schedule_feed(request, feed_key, version, name, acts):
+    """
+    Conditional, cached response for a feed. version is a nanosecond
+    timestamp and acts a StageEvent queryset.
+    """
+    etag = f'"{feed_key}-{version}"'
+    last_modified = version // 10 ** 9
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # UIDs are scoped to the host name
+        host = request.get_host().split(':')[0]
+        cache_key = f'ics:{host}:{feed_key}:{version}'
+        body = cache.get(cache_key)
+        if body is not None:
+            response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+        else:
+            rows = acts.order_by('start_time', 'id').values_list(
+                'id', 'title', 'description', 'start_time', 'end_time', 'subsection__name',
+            ).iterator(chunk_size=500)
+            lines = iter_calendar(name, rows, datetime.fromtimestamp(last_modified, dt_timezone.utc), host)
+            response = StreamingHttpResponse(_caching(lines, cache_key), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=FEED_MAX_AGE)
+    return response
+
+
+def _caching(lines, cache_key):
+    """Pass lines through, storing the whole body once it was fully sent"""
+    parts = []
+    size = 0
+    for line in lines:
+        if parts is not None:
+            parts.append(line)
+            size += len(line)
+            if size > MAX_CACHED_FEED_BYTES:
+                parts = None
+        yield line
+    if parts is not None:
+        cache.set(cache_key, ''.join(parts), FEED_CACHE_TIMEOUT)
@@ -0,0 +1,532 @@
+"""
+Bulk ingestion of partner event feeds.
+
+Feeds are GeoJSON FeatureCollections or CSV files, read one record at a
+time: the GeoJSON reader decodes the features array element by element, so
+memory use depends on the batch size and the largest single feature, not on
+the size of the file.
+
+Events are upserted on Event.external_id, BATCH_SIZE records per
+transaction: one query finds the existing rows of a batch, changed ones are
+written with bulk_update(), new ones with bulk_create(), and unchanged ones
+are not written at all, so re-ingesting a feed is cheap. A record that
+carries subsections replaces the event's subsections, matched by name so
+stages keep their schedules.
+
+Bulk writes send no signals, so what the model receivers would do is done
+per batch (search tokens, schedule versions) or once at the end (marker
+clusters, tiles, response cache). Autocomplete suggestions of running
+servers pick the new events up when their index is next rebuilt.
+"""
+import csv
+import json
+import math
+import time
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Category, Event, EventSubsection, event_extent, subsection_extent
+
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 1024 * 1024
+# A feature bigger than this is taken for a malformed file rather than buffered
+MAX_FEATURE_BYTES = 64 * 1024 * 1024
+MAX_REPORTED_ERRORS = 20
+# Past this many changed events, clusters are rebuilt instead of updated one by one
+CLUSTER_REBUILD_THRESHOLD = 200
+
+EVENT_FIELDS = ['title', 'description', 'date', 'latitude', 'longitude', 'location_name', 'category_id', 'boundary_coordinates']
+SUBSECTION_FIELDS = ['description', 'boundary_coordinates', 'color']
+DERIVED_FIELDS = ['boundary_lod', 'boundary_encoded', 'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east']
+
+Record = namedtuple('Record', ['external_id', 'values', 'category', 'subsections'])
+
+
+class IngestError(Exception):
+    """A record, or the whole file, that can't be ingested"""
+
+
+class _JSONStream:
+    """Incremental reader of a JSON document from a text file"""
+
+    def __init__(self, file, chunk_size=READ_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if len(self.buffer) > MAX_FEATURE_BYTES:
+            raise IngestError('Invalid GeoJSON: a single value is too large')
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise IngestError(f'Invalid GeoJSON: expected {char!r}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise IngestError('Invalid GeoJSON: truncated or malformed value')
+                continue
+            # A number ending the buffer may go on in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(file, chunk_size=READ_CHUNK_SIZE):
+    """Features of a GeoJSON FeatureCollection, decoded one at a time"""
+    stream = _JSONStream(file, chunk_size)
+    stream.expect('{')
+    while stream.peek() != '}':
+        key = stream.value()
+        stream.expect(':')
+        if key != 'features':
+            stream.value()
+        else:
+            stream.expect('[')
+            while stream.peek() != ']':
+                yield stream.value()
+                if stream.peek() == ',':
+                    stream.pos += 1
+            stream.expect(']')
+        if stream.peek() == ',':
+            stream.pos += 1
+    stream.expect('}')
+
+
+def _number(value, low, high, name):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise IngestError(f'invalid {name}')
+    if not math.isfinite(value) or not low <= value <= high:
+        raise IngestError(f'invalid {name}')
+    return value
+
+
+def _boundary(points):
+    """[[lat, lng], ...] boundary of at least three points"""
+    if not isinstance(points, list) or len(points) < 3:
+        raise IngestError('a boundary needs at least three points')
+    try:
+        return [[_number(lat, -90, 90, 'latitude'), _number(lng, -180, 180, 'longitude')] for lat, lng in points]
+    except (TypeError, ValueError):
+        raise IngestError('boundary points must be [lat, lng] pairs')
+
+
+def _polygon_boundary(geometry):
+    """Boundary from the outer ring of a GeoJSON Polygon, which is closed and in [lng, lat] order"""
+    if not isinstance(geometry, dict) or geometry.get('type') != 'Polygon' or not geometry.get('coordinates'):
+        raise IngestError('subsection geometry must be a Polygon')
+    try:
+        ring = [[point[1], point[0]] for point in geometry['coordinates'][0]]
+    except (TypeError, IndexError, KeyError):
+        raise IngestError('invalid Polygon coordinates')
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    return _boundary(ring)
+
+
+def _text(data, name, max_length=None, required=False):
+    value = data.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise IngestError(f'missing {name}')
+    if max_length and len(value) > max_length:
+        raise IngestError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _subsections(items, geojson):
+    if items is None:
+        return None
+    if isinstance(items, str):
+        try:
+            items = json.loads(items) if items.strip() else None
+        except ValueError:
+            raise IngestError('invalid subsections JSON')
+        if items is None:
+            return None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise IngestError('subsections must be a list of objects')
+    subsections = {}
+    for item in items:
+        if geojson and 'geometry' in item:
+            boundary = _polygon_boundary(item['geometry'])
+        else:
+            boundary = _boundary(item.get('boundary_coordinates'))
+        name = _text(item, 'name', 200, required=True)
+        subsections[name] = {
+            'description': _text(item, 'description'),
+            'boundary_coordinates': boundary,
+            'color': _text(item, 'color', 7) or EventSubsection._meta.get_field('color').default,
+        }
+    return subsections
+
+
+def _record(external_id, data, latitude, longitude, boundary, geojson):
+    external_id = '' if external_id is None else str(external_id).strip()
+    if not external_id or len(external_id) > 200:
+        raise IngestError('missing or too long id')
+    try:
+        date = parse_datetime(_text(data, 'date', required=True))
+    except ValueError:
+        date = None
+    if date is None:
+        raise IngestError('invalid date')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    values = {
+        'title': _text(data, 'title', 200, required=True),
+        'description': _text(data, 'description'),
+        'date': date,
+        'latitude': _number(latitude, -90, 90, 'latitude'),
+        'longitude': _number(longitude, -180, 180, 'longitude'),
+        'location_name': _text(data, 'location_name', 200),
+        'boundary_coordinates': boundary,
+    }
+    return Record(external_id, values, _text(data, 'category', 100), _subsections(data.get('subsections'), geojson))
+
+
+def feature_record(feature):
+    """
+    Record of a GeoJSON Feature. Its geometry is a Point at the event or a
+    Polygon boundary, in which case the event is placed at the centre of the
+    boundary unless latitude and longitude properties say otherwise.
+    """
+    if not isinstance(feature, dict):
+        raise IngestError('not a Feature')
+    properties = feature.get('properties') or {}
+    geometry = feature.get('geometry') or {}
+    if not isinstance(properties, dict) or not isinstance(geometry, dict):
+        raise IngestError('not a Feature')
+    latitude, longitude = properties.get('latitude'), properties.get('longitude')
+    boundary = None
+    if geometry.get('type') == 'Point':
+        try:
+            longitude, latitude = geometry['coordinates'][:2]
+        except (TypeError, ValueError, KeyError):
+            raise IngestError('invalid Point coordinates')
+    elif geometry.get('type') == 'Polygon':
+        boundary = _polygon_boundary(geometry)
+        if latitude is None or longitude is None:
+            lats, lngs = [point[0] for point in boundary], [point[1] for point in boundary]
+            latitude, longitude = (min(lats) + max(lats)) / 2, (min(lngs) + max(lngs)) / 2
+    elif geometry:
+        raise IngestError(f'unsupported geometry {geometry.get("type")}')
+    external_id = feature.get('id', properties.get('id'))
+    return _record(external_id, properties, latitude, longitude, boundary, geojson=True)
+
+
+def csv_record(row):
+    """
+    Record of a CSV row with id, title, date, latitude and longitude columns
+    and optionally description, location_name, category, boundary (a JSON
+    list of [lat, lng] points) and subsections (a JSON list of objects).
+    """
+    boundary = (row.get('boundary') or '').strip()
+    if boundary:
+        try:
+            boundary = _boundary(json.loads(boundary))
+        except ValueError:
+            raise IngestError('invalid boundary JSON')
+    return _record(row.get('id'), row, row.get('latitude'), row.get('longitude'), boundary or None, geojson=False)
+
+
+def read_geojson(file):
+    """(position, record or IngestError) for each feature of a GeoJSON file"""
+    for position, feature in enumerate(iter_features(file), start=1):
+        try:
+            yield f'Feature {position}', feature_record(feature)
+        except IngestError as e:
+            yield f'Feature {position}', e
+
+
+def read_csv(file):
+    """(position, record or IngestError) for each row of a CSV file"""
+    # Boundaries of thousands of points are longer than the default 128 KB field limit
+    csv.field_size_limit(MAX_FEATURE_BYTES)
+    reader = csv.DictReader(file)
+    try:
+        fieldnames = reader.fieldnames or []
+    except csv.Error as e:
+        raise IngestError(f'Invalid CSV header: {e}')
+    missing = [name for name in ('id', 'title', 'date', 'latitude', 'longitude') if name not in fieldnames]
+    if missing:
+        raise IngestError(f'Missing columns: {", ".join(missing)}')
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader can't resynchronise after a malformed row
+            raise IngestError(f'Invalid CSV after line {reader.line_num}: {e}')
+        position = f'Line {reader.line_num}'
+        try:
+            yield position, csv_record(row)
+        except IngestError as e:
+            yield position, e
+
+
+def _union(box, other):
+    """Smallest (south, west, north, east) box covering box, which may be None, and other"""
+    if box is None:
+        return other
+    return min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])
+
+
+class Ingestion:
+    """Upserts records in batches and keeps the counts of what happened"""
+
+    def __init__(self, organizer, batch_size=BATCH_SIZE):
+        self.organizer = organizer
+        self.batch_size = batch_size
+        self.categories = {}
+        for category_id, name in Category.objects.order_by('-id').values_list('id', 'name'):
+            self.categories[name.lower()] = category_id
+        self.read = self.created = self.updated = self.unchanged = self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        # Union of the extents of everything written, for tile invalidation
+        self._extent = None
+        self._moves = []
+        # What the batch being written changed, kept once its transaction commits
+        self._batch_extent = None
+        self._batch_moves = []
+        self._batch_categories = {}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        """Records read per second"""
+        return self.read / max(self.elapsed, 1e-9)
+
+    def run(self, items, progress=None):
+        """
+        Ingest (position, record or IngestError) pairs, calling progress()
+        after every batch. If reading fails midway, the batches already
+        written are kept and their derived data refreshed.
+        """
+        batch = {}
+        try:
+            for position, record in items:
+                self.read += 1
+                if isinstance(record, IngestError):
+                    self._error(position, record)
+                    continue
+                # The last of repeated ids within a batch wins
+                batch.pop(record.external_id, None)
+                batch[record.external_id] = record
+                if len(batch) >= self.batch_size:
+                    self._apply(list(batch.values()))
+                    batch = {}
+                    if progress:
+                        progress(self)
+            if batch:
+                self._apply(list(batch.values()))
+                if progress:
+                    progress(self)
+        finally:
+            self._finish()
+        return self
+
+    def _error(self, position, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'{position}: {error}')
+
+    def _extend(self, extent):
+        lat, lon, south, west, north, east = extent
+        for box in ((lat, lon, lat, lon), (south, west, north, east)):
+            if box[0] is not None:
+                self._batch_extent = _union(self._batch_extent, box)
+
+    def _move(self, old_position, new_position):
+        if self._moves is None or old_position == new_position:
+            return
+        self._moves.append((old_position, new_position))
+        if len(self._moves) > CLUSTER_REBUILD_THRESHOLD:
+            self._moves = None
+
+    def _category_id(self, name):
+        if not name:
+            return None
+        category_id = self.categories.get(name.lower()) or self._batch_categories.get(name.lower())
+        if category_id is None:
+            category_id = self._batch_categories[name.lower()] = Category.objects.create(name=name).id
+        return category_id
+
+    def _apply(self, records):
+        self._batch_extent, self._batch_moves, self._batch_categories = None, [], {}
+        created, updated = self._write(records)
+        # A batch that rolled back raised above, and none of what it did is kept
+        self.categories.update(self._batch_categories)
+        if self._batch_extent is not None:
+            self._extent = _union(self._extent, self._batch_extent)
+        for old_position, new_position in self._batch_moves:
+            self._move(old_position, new_position)
+        self.created += created
+        self.updated += updated
+        self.unchanged += len(records) - created - updated
+
+    @transaction.atomic
+    def _write(self, records):
+        """Upsert a batch, returning the numbers of events created and updated"""
+        existing = Event.objects.filter(external_id__in=[record.external_id for record in records]).in_bulk(field_name='external_id')
+        creates, updates = [], []
+        events = {}
+        for record in records:
+            values = dict(record.values, category_id=self._category_id(record.category))
+            event = existing.get(record.external_id)
+            if event is None:
+                event = Event(external_id=record.external_id, organizer=self.organizer, **values)
+                event.update_boundary_geometry()
+                creates.append(event)
+                self._batch_moves.append((None, (event.latitude, event.longitude)))
+                self._extend(event_extent(event))
+            else:
+                changed = [name for name in EVENT_FIELDS if getattr(event, name) != values[name]]
+                if changed:
+                    self._extend(event_extent(event))
+                    old_position = (event.latitude, event.longitude)
+                    for name in changed:
+                        setattr(event, name, values[name])
+                    event.update_boundary_geometry()
+                    event.version = F('version') + 1
+                    updates.append(event)
+                    self._batch_moves.append((old_position, (event.latitude, event.longitude)))
+                    self._extend(event_extent(event))
+            events[record.external_id] = event
+
+        Event.objects.bulk_create(creates)
+        if creates and not connection.features.can_return_rows_from_bulk_insert:
+            # MySQL doesn't return the new ids, which subsections, clusters and the search index need
+            ids = dict(Event.objects.filter(
+                external_id__in=[event.external_id for event in creates],
+            ).values_list('external_id', 'id'))
+            for event in creates:
+                event.id = ids[event.external_id]
+        Event.objects.bulk_update(updates, EVENT_FIELDS + DERIVED_FIELDS + ['version'])
+        stages_changed = self._apply_subsections(
+            [(events[record.external_id], record.subsections) for record in records if record.subsections is not None]
+        )
+        changed_ids = [event.id for event in creates + updates]
+
+        from .schedule import bump_event_schedule_version
+        from .search import index_events
+        index_events(changed_ids)
+        # Event titles name schedule feeds
+        for event_id in set(event.id for event in updates) | stages_changed:
+            bump_event_schedule_version(event_id)
+        return len(creates), len(updates)
+
+    def _apply_subsections(self, items):
+        """Make each (event, {name: values}) pair's subsections match, returning the ids of the events changed"""
+        if not items:
+            return set()
+        current = {}
+        loaded = []
+        removed = []
+        changed = set()
+        for subsection in EventSubsection.objects.filter(event__in=[event for event, _ in items]).order_by('id'):
+            loaded.append(subsection.id)
+            by_name = current.setdefault(subsection.event_id, {})
+            if subsection.name in by_name:
+                removed.append(subsection.id)
+                changed.add(subsection.event_id)
+            else:
+                by_name[subsection.name] = subsection
+
+        creates, updates = [], []
+        for event, subsections in items:
+            stored = current.get(event.id, {})
+            for name, values in subsections.items():
+                subsection = stored.pop(name, None)
+                if subsection is None:
+                    subsection = EventSubsection(event=event, name=name, **values)
+                    subsection.update_boundary_geometry()
+                    creates.append(subsection)
+                elif any(getattr(subsection, field) != values[field] for field in SUBSECTION_FIELDS):
+                    self._extend(subsection_extent(subsection))
+                    for field in SUBSECTION_FIELDS:
+                        setattr(subsection, field, values[field])
+                    subsection.update_boundary_geometry()
+                    updates.append(subsection)
+                else:
+                    continue
+                self._extend(subsection_extent(subsection))
+                changed.add(event.id)
+            if stored:
+                removed += [subsection.id for subsection in stored.values()]
+                changed.add(event.id)
+
+        if removed:
+            # A regular delete, so the signals clean up schedules and tiles
+            EventSubsection.objects.filter(pk__in=removed).delete()
+        EventSubsection.objects.bulk_update(updates, SUBSECTION_FIELDS + DERIVED_FIELDS)
+        EventSubsection.objects.bulk_create(creates)
+        if creates and not connection.features.can_return_rows_from_bulk_insert:
+            # New subsections are the only ones of their events not loaded above, and names are unique among them
+            ids = {
+                (event_id, name): subsection_id
+                for event_id, name, subsection_id in EventSubsection.objects.filter(
+                    event_id__in={subsection.event_id for subsection in creates},
+                ).exclude(pk__in=loaded).values_list('event_id', 'name', 'id')
+            }
+            for subsection in creates:
+                subsection.id = ids[(subsection.event_id, subsection.name)]
+
+        from .schedule import bump_schedule_version
+        for subsection in updates + creates:
+            bump_schedule_version(subsection.id)
+        return changed
+
+    def _finish(self):
+        if not (self.created or self.updated or self._extent):
+            return
+        from . import clustering
+        from .response_cache import bump_version
+        from .tiles import invalidate_extents
+
+        if self._moves is None:
+            clustering.rebuild()
+        else:
+            for old_position, new_position in self._moves:
+                clustering.move_event(old_position, new_position)
+        if self._extent is not None:
+            invalidate_extents([(None, None) + self._extent])
+        bump_version()
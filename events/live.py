@@ -0,0 +1,189 @@
+"""
+Server-Sent Events push of live stage transitions.
+
+Clients connect to an SSE stream for an event or a single stage and receive:
+
+* ``status``: the current board (or stage status) when they connect;
+* ``live``: a stage whose live act changed (an act started or ended);
+* ``next``: a stage whose next act changed.
+
+Each process keeps one channel per event with open streams. A channel
+computes the event's board once and fans it out to every connection, and a
+single timer task keeps a heap of the moments at which some board changes
+(the next start_time or end_time boundary of each channel), so idle
+connections cost one waiting coroutine each and no queries. Saving or
+deleting a StageEvent refreshes its channel immediately through notify().
+Signals only reach the process that made the change, so channels are also
+refreshed every REFRESH_INTERVAL seconds.
+
+The streams are async views and need the site served through config/asgi.py.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+
+from .schedule import live_board
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 15
+REFRESH_INTERVAL = 60
+# Acts are live up to and including end_time, so transitions are computed just after a boundary
+BOUNDARY_DELAY = 0.01
+
+
+class Channel:
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.subscribers = set()
+        self.board = None
+        self.refresh_at = None
+        self.refreshing = False
+        self.dirty = False
+
+
+class LiveHub:
+    def __init__(self):
+        self.loop = None
+        self.channels = {}
+        self._timers = []
+        self._timer_changed = None
+        self._timer_task = None
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # First stream on this loop (a new loop per test, for instance)
+            self.loop = loop
+            self.channels = {}
+            self._timers = []
+            self._timer_changed = asyncio.Event()
+            self._timer_task = loop.create_task(self._run_timers())
+
+    def subscribe(self, event_id):
+        """Queue receiving every new board of an event, starting with the current one"""
+        self._start()
+        channel = self.channels.get(event_id)
+        if channel is None:
+            channel = self.channels[event_id] = Channel(event_id)
+        queue = asyncio.Queue(maxsize=1)
+        channel.subscribers.add(queue)
+        if channel.board is not None:
+            queue.put_nowait(channel.board)
+        else:
+            self._schedule(channel, 0)
+        return queue
+
+    def unsubscribe(self, event_id, queue):
+        channel = self.channels.get(event_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            del self.channels[event_id]
+
+    def notify(self, event_id):
+        """Refresh an event's channel now; safe to call from any thread"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._wake, event_id)
+
+    def _wake(self, event_id):
+        channel = self.channels.get(event_id)
+        if channel is not None:
+            self._schedule(channel, 0)
+
+    def _schedule(self, channel, delay):
+        when = time.monotonic() + delay
+        if channel.refresh_at is not None and channel.refresh_at <= when:
+            return
+        channel.refresh_at = when
+        heapq.heappush(self._timers, (when, channel.event_id))
+        self._timer_changed.set()
+
+    async def _run_timers(self):
+        while True:
+            self._timer_changed.clear()
+            timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._timer_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            when, event_id = heapq.heappop(self._timers)
+            channel = self.channels.get(event_id)
+            # Skip timers superseded by an earlier one or belonging to a closed channel
+            if channel is not None and channel.refresh_at == when:
+                channel.refresh_at = None
+                self.loop.create_task(self._refresh(channel))
+
+    async def _refresh(self, channel):
+        if channel.refreshing:
+            channel.dirty = True
+            return
+        channel.refreshing = True
+        try:
+            board, changes_at = await sync_to_async(live_board)(channel.event_id)
+        except Exception:
+            # The timer was consumed: without a new one the channel would never refresh again
+            logger.exception('Refreshing the live board of event %s failed', channel.event_id)
+            channel.dirty = False
+            self._schedule(channel, REFRESH_INTERVAL)
+            return
+        finally:
+            channel.refreshing = False
+        if channel.board != board:
+            channel.board = board
+            for queue in channel.subscribers:
+                if queue.full():
+                    # Slow clients only need the latest board
+                    queue.get_nowait()
+                queue.put_nowait(board)
+        if channel.dirty:
+            channel.dirty = False
+            self._schedule(channel, 0)
+            return
+        delay = REFRESH_INTERVAL
+        if changes_at is not None:
+            delay = min(delay, max(0, changes_at.timestamp() - time.time()) + BOUNDARY_DELAY)
+        self._schedule(channel, delay)
+
+
+hub = LiveHub()
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def stream(event_id, subsection_id=None):
+    """SSE messages for an event, or for one of its stages"""
+    queue = hub.subscribe(event_id)
+    try:
+        previous = None
+        while True:
+            try:
+                board = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if subsection_id is not None:
+                board = [stage for stage in board if stage['id'] == subsection_id]
+            if previous is None:
+                yield sse('status', board[0] if subsection_id is not None and board else board)
+            else:
+                before = {stage['id']: stage for stage in previous}
+                for stage in board:
+                    old = before.get(stage['id'])
+                    if old is None or old['live_event'] != stage['live_event']:
+                        yield sse('live', stage)
+                    if old is None or old['next_event'] != stage['next_event'] or old['upcoming_count'] != stage['upcoming_count']:
+                        yield sse('next', stage)
+            previous = board
+    finally:
+        hub.unsubscribe(event_id, queue)
@@ -0,0 +1,269 @@
+"""
+Synthetic datasets for load tests and benchmarks.
+
+generate() adds events clustered around real cities, each with an irregular
+boundary polygon, stages laid out inside it and a back to back schedule of
+non-overlapping acts on every stage. The same seed always produces the same
+events, titles and shapes; dates are relative to the time of generation,
+and a share of the events is running right now so live lookups have acts
+to find.
+
+Building model instances for millions of rows would take far longer than
+writing them, so rows are built as tuples and inserted with executemany(),
+one transaction per batch, with ids handed out by the generator. Computing
+boundary simplifications and encodings for every polygon would dominate
+too, so each city gets a small pool of shapes whose derived fields are
+computed once with the regular geometry code. Polygons are placed on a 1e-5
+degree grid, which makes translating a shape's simplified tiers and encoded
+polylines exact instead of recomputing them.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .geometry import encode_polyline, encode_tiers, simplify_tiers
+from .models import Category, Event, EventSubsection, SearchToken, StageEvent
+from .schedule import bump_schedule_versions
+from .search import event_tokens
+
+BATCH_SIZE = 2000
+# Coordinates are integers in units of 1e-5 degrees (about a metre)
+GRID = 100000
+SHAPES_PER_CITY = 24
+# Share of events taking place now, and of events scattered away from city centres
+LIVE_SHARE = 0.1
+SCATTERED_SHARE = 0.05
+
+# name, latitude, longitude, weight
+CITIES = [
+    ('Bengaluru', 12.9716, 77.5946, 8), ('Mumbai', 19.0760, 72.8777, 8), ('Delhi', 28.6139, 77.2090, 8),
+    ('London', 51.5074, -0.1278, 6), ('New York', 40.7128, -74.0060, 6), ('San Francisco', 37.7749, -122.4194, 4),
+    ('Los Angeles', 34.0522, -118.2437, 5), ('Berlin', 52.5200, 13.4050, 4), ('Paris', 48.8566, 2.3522, 5),
+    ('Tokyo', 35.6762, 139.6503, 7), ('Singapore', 1.3521, 103.8198, 3), ('Sydney', -33.8688, 151.2093, 3),
+    ('São Paulo', -23.5505, -46.6333, 5), ('Lagos', 6.5244, 3.3792, 4), ('Nairobi', -1.2921, 36.8219, 2),
+    ('Cairo', 30.0444, 31.2357, 3), ('Toronto', 43.6532, -79.3832, 3), ('Mexico City', 19.4326, -99.1332, 4),
+    ('Madrid', 40.4168, -3.7038, 3), ('Seoul', 37.5665, 126.9780, 4), ('Istanbul', 41.0082, 28.9784, 3),
+    ('Cape Town', -33.9249, 18.4241, 2), ('Buenos Aires', -34.6037, -58.3816, 3), ('Jakarta', -6.2088, 106.8456, 4),
+]
+VENUES = ['Park', 'Arena', 'Convention Centre', 'Stadium', 'Grounds', 'Expo Hall', 'Square', 'Waterfront', 'Campus', 'Gardens']
+CATEGORY_WORDS = {
+    'Music': (['Jazz', 'Rock', 'Indie', 'Electronic', 'Folk', 'Classical'], ['Festival', 'Night', 'Live', 'Sessions']),
+    'Technology': (['Python', 'Cloud', 'AI', 'Open Source', 'Security', 'Data'], ['Summit', 'Conference', 'Meetup', 'Hackathon']),
+    'Sports': (['City', 'Marathon', 'Cycling', 'Football', 'Cricket', 'Street'], ['Cup', 'Run', 'League', 'Open']),
+    'Art': (['Modern', 'Street', 'Photo', 'Sculpture', 'Digital', 'Craft'], ['Showcase', 'Biennale', 'Fair', 'Walk']),
+    'Food': (['Street Food', 'Wine', 'Coffee', 'Vegan', 'Spice', 'Night Market'], ['Festival', 'Expo', 'Fair', 'Carnival']),
+    'Business': (['Startup', 'Fintech', 'Retail', 'Growth', 'Founders', 'Trade'], ['Forum', 'Expo', 'Summit', 'Week']),
+    'Health': (['Yoga', 'Wellness', 'Mindful', 'Fitness', 'Nutrition', 'Health'], ['Retreat', 'Expo', 'Day', 'Camp']),
+    'Education': (['Science', 'Maths', 'Robotics', 'Language', 'Career', 'Book'], ['Fair', 'Week', 'Camp', 'Olympiad']),
+}
+STAGE_NAMES = ['Main Stage', 'Second Stage', 'Tent', 'Dome', 'Garden Stage', 'Club', 'Arena', 'Workshop Area', 'Food Court', 'Lounge']
+ACT_WORDS = ['Opening', 'Headliner', 'Workshop', 'Keynote', 'Panel', 'Set', 'Showcase', 'Session', 'Talk', 'Finale']
+
+
+def _ring(rng, radius, vertices, lat):
+    """Irregular ring of integer (lat, lng) offsets, radius in metres"""
+    scale = math.cos(math.radians(lat))
+    angles = [2 * math.pi * (i + rng.uniform(0, 0.8)) / vertices for i in range(vertices)]
+    offsets = []
+    for angle in angles:
+        distance = radius * rng.uniform(0.7, 1.3) / 1.11
+        offset = (round(distance * math.sin(angle)), round(distance * math.cos(angle) / scale))
+        if offset not in offsets:
+            offsets.append(offset)
+    return offsets
+
+
+class Shape:
+    """A boundary polygon with its derived fields computed once, to be moved anywhere on the grid"""
+
+    def __init__(self, offsets, lat, lng):
+        self.offsets = offsets
+        origin = (round(lat * GRID), round(lng * GRID))
+        points = [[(origin[0] + a) / GRID, (origin[1] + b) / GRID] for a, b in offsets]
+        tiers = simplify_tiers(points)
+        encoded = encode_tiers(points, tiers)
+        index = {tuple(point): i for i, point in enumerate(points)}
+        self.tiers = {tier: [index[tuple(point)] for point in simplified] for tier, simplified in tiers.items()}
+        # Every polyline starts at the first point, followed by deltas that don't change when moving on the grid
+        head = len(encode_polyline(points[:1]))
+        self.tails = {key: polyline[head:] for key, polyline in encoded.items()}
+        self.south, self.north = min(a for a, _ in offsets), max(a for a, _ in offsets)
+        self.west, self.east = min(b for _, b in offsets), max(b for _, b in offsets)
+
+    def place(self, lat, lng):
+        """
+        (boundary_coordinates, boundary_lod, boundary_encoded, south, west,
+        north, east) of the shape moved to (lat, lng), in grid units
+        """
+        points = [[(lat + a) / GRID, (lng + b) / GRID] for a, b in self.offsets]
+        head = encode_polyline(points[:1])
+        return (
+            points,
+            {tier: [points[i] for i in indexes] for tier, indexes in self.tiers.items()},
+            {key: head + tail for key, tail in self.tails.items()},
+            (lat + self.south) / GRID, (lng + self.west) / GRID, (lat + self.north) / GRID, (lng + self.east) / GRID,
+        )
+
+
+def _insert(model, columns, rows):
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+EVENT_COLUMNS = [
+    'id', 'external_id', 'title', 'description', 'date', 'latitude', 'longitude', 'location_name', 'category_id',
+    'organizer_id', 'version', 'created_at', 'boundary_coordinates', 'boundary_lod', 'boundary_encoded',
+    'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east',
+]
+STAGE_COLUMNS = [
+    'id', 'event_id', 'name', 'description', 'color', 'created_at', 'boundary_coordinates', 'boundary_lod', 'boundary_encoded',
+    'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east',
+]
+SLOT_COLUMNS = ['subsection_id', 'title', 'description', 'start_time', 'end_time', 'created_at']
+TOKEN_COLUMNS = ['event_id', 'token', 'weight']
+
+
+class Generator:
+    def __init__(self, organizer, seed=42, stages_per_event=3, slots_per_stage=10, batch_size=BATCH_SIZE):
+        self.organizer = organizer
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.stages_per_event = stages_per_event
+        self.slots_per_stage = slots_per_stage
+        self.batch_size = batch_size
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        # Times fall on a five minute grid, so few distinct values need adapting
+        self._datetime = lru_cache(maxsize=None)(connection.ops.adapt_datetimefield_value)
+        self._created_at = self._datetime(timezone.now())
+        self.categories = []
+        for name in CATEGORY_WORDS:
+            category = Category.objects.filter(name=name).first() or Category.objects.create(name=name)
+            self.categories.append(category)
+        self.weights = [city[3] for city in CITIES]
+        self.event_shapes = {}
+        self.stage_shapes = {}
+        for city, lat, lng, _ in CITIES:
+            self.event_shapes[city] = [
+                Shape(_ring(self.rng, self.rng.uniform(150, 600), self.rng.randint(8, 24), lat), lat, lng)
+                for _ in range(SHAPES_PER_CITY)
+            ]
+            self.stage_shapes[city] = [
+                Shape(_ring(self.rng, self.rng.uniform(15, 50), self.rng.randint(4, 8), lat), lat, lng)
+                for _ in range(SHAPES_PER_CITY)
+            ]
+        self.created = {'events': 0, 'stages': 0, 'slots': 0}
+
+    def _json(self, value):
+        return connection.ops.adapt_json_value(value, None)
+
+    def _geometry(self, shape, lat, lng):
+        boundary, lod, encoded, *bounds = shape.place(lat, lng)
+        return [self._json(boundary), self._json(lod), self._json(encoded)] + bounds
+
+    def _event(self, event_id, n, tokens):
+        rng = self.rng
+        city, lat, lng, _ = rng.choices(CITIES, self.weights)[0]
+        spread = 1.0 if rng.random() < SCATTERED_SHARE else 0.08
+        lat = round((lat + rng.gauss(0, spread)) * GRID)
+        lng = round((lng + rng.gauss(0, spread) / math.cos(math.radians(lat / GRID))) * GRID)
+        category = rng.choice(self.categories)
+        adjectives, kinds = CATEGORY_WORDS[category.name]
+        if rng.random() < LIVE_SHARE:
+            date = self.now - timedelta(hours=rng.randint(0, 3))
+        else:
+            date = self.now + timedelta(days=rng.randint(-30, 180), hours=rng.randint(-8, 8))
+        text = {
+            'title': f'{rng.choice(adjectives)} {rng.choice(kinds)} {city} {date.year}',
+            'description': f'A {category.name.lower()} event in {city}.',
+            'location_name': f'{city} {rng.choice(VENUES)}',
+            'category__name': category.name,
+        }
+        # Bulk inserts send no signals, so the search index is filled here
+        tokens += ((event_id, token, weight) for token, weight in event_tokens(text).items())
+        shape = rng.choice(self.event_shapes[city])
+        row = [
+            event_id, f'load-{self.seed}-{n}', text['title'], text['description'], self._datetime(date),
+            lat / GRID, lng / GRID, text['location_name'], category.id, self.organizer.id, 1, self._created_at,
+        ] + self._geometry(shape, lat, lng)
+        return row, city, lat, lng, (shape.north - shape.south) // 4, date
+
+    def _stages(self, stage_id, event_id, city, lat, lng, spread):
+        rng = self.rng
+        for i in range(self.stages_per_event):
+            name = STAGE_NAMES[i % len(STAGE_NAMES)]
+            if i >= len(STAGE_NAMES):
+                name += f' {i // len(STAGE_NAMES) + 1}'
+            # Stages sit inside the event boundary, around its centre
+            shape = rng.choice(self.stage_shapes[city])
+            geometry = self._geometry(shape, lat + rng.randint(-spread, spread), lng + rng.randint(-spread, spread))
+            yield [stage_id + i, event_id, name, '', '#%06x' % rng.randrange(0x1000000), self._created_at] + geometry
+
+    def _slots(self, stage_id, start):
+        rng = self.rng
+        t = start + timedelta(minutes=rng.choice([0, 15, 30]))
+        for i in range(self.slots_per_stage):
+            end = t + timedelta(minutes=rng.choice([20, 30, 45, 60, 90]))
+            yield (stage_id, f'{rng.choice(ACT_WORDS)} {i + 1}', '', self._datetime(t), self._datetime(end), self._created_at)
+            # Acts on a stage never overlap: the next one starts after a break
+            t = end + timedelta(minutes=rng.choice([0, 5, 10, 15]))
+
+    @transaction.atomic
+    def _batch(self, first, count):
+        events, stages, slots, tokens = [], [], [], []
+        for n in range(first, first + count):
+            event_id = self.next_event_id + n
+            row, city, lat, lng, spread, date = self._event(event_id, n, tokens)
+            events.append(row)
+            stage_id = self.next_stage_id + n * self.stages_per_event
+            for stage in self._stages(stage_id, event_id, city, lat, lng, spread):
+                stages.append(stage)
+                slots += self._slots(stage[0], date)
+        _insert(Event, EVENT_COLUMNS, events)
+        _insert(EventSubsection, STAGE_COLUMNS, stages)
+        _insert(StageEvent, SLOT_COLUMNS, slots)
+        _insert(SearchToken, TOKEN_COLUMNS, tokens)
+        # Ids of deleted stages are reused, and their cached schedules must not be
+        bump_schedule_versions(stage[0] for stage in stages)
+        self.created['events'] += len(events)
+        self.created['stages'] += len(stages)
+        self.created['slots'] += len(slots)
+
+    def run(self, events, progress=None):
+        """Add events (with their stages and schedules), calling progress() after every batch"""
+        started = time.perf_counter()
+        # Ids are handed out here, so nothing else may insert events or stages meanwhile
+        self.next_event_id = (Event.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.next_stage_id = (EventSubsection.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        for first in range(0, events, self.batch_size):
+            self._batch(first, min(self.batch_size, events - first))
+            if progress:
+                progress(self.created['events'], time.perf_counter() - started)
+
+        # Move sequences past the explicit ids on backends that have them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Event, EventSubsection]):
+                cursor.execute(sql)
+        # and do what the model receivers would have done
+        from . import clustering
+        from .response_cache import bump_version
+        from .tiles import invalidate_extents
+        clustering.rebuild()
+        invalidate_extents([(None, None, -90, -180, 90, 180)])
+        bump_version()
+        return self.created
+
+
+def generate(organizer, events, stages_per_event=3, slots_per_stage=10, seed=42, batch_size=BATCH_SIZE, progress=None):
+    """Add a synthetic dataset, returning the numbers of events, stages and slots created"""
+    return Generator(organizer, seed, stages_per_event, slots_per_stage, batch_size).run(events, progress)
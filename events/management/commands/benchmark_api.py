@@ -0,0 +1,150 @@
+import json
+import math
+import random
+import time
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from events import response_cache
+from events.load_data import CATEGORY_WORDS, CITIES, generate
+from events.models import Event, EventSubsection
+
+# Latency compared by --compare; the tail percentiles are too noisy over a few dozen requests
+LATENCY_KEYS = ['p50_ms']
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, query counts and response sizes of the public API hot paths on generated datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='Events per dataset')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per path and scale')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark_api.json', help='File the results are written to as JSON')
+        parser.add_argument('--compare', metavar='BASELINE', help='Results file of an earlier run to check for regressions')
+        parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative latency increase over the baseline')
+        parser.add_argument('--max-extra-queries', type=int, default=0, help='Allowed query count increase over the baseline')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Cannot read baseline {options["compare"]}: {e}')
+        if Event.objects.filter(external_id__startswith=f'load-{options["seed"]}-').exists():
+            raise CommandError(f'A dataset with seed {options["seed"]} is already in the database; use another seed')
+
+        # Requests go straight to the views, under a host the settings accept
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        self.factory = RequestFactory(SERVER_NAME=host)
+        results = {}
+        self.stdout.write(f'{"events":>8} {"path":<22} {"p50 (ms)":>9} {"p90 (ms)":>9} {"p99 (ms)":>9} {"queries":>8} {"bytes":>9}')
+        for scale in options['scales']:
+            # Every dataset is generated in a transaction that is rolled back after measuring it
+            try:
+                with transaction.atomic():
+                    organizer = User.objects.create_user(username=f'benchmark-{time.time_ns()}')
+                    generate(organizer, scale, seed=options['seed'])
+                    results[str(scale)] = self.run(scale, options['requests'], random.Random(options['seed']))
+                    raise Rollback
+            except Rollback:
+                pass
+        # The rolled back rows may still be in cached responses
+        response_cache.bump_version()
+
+        with open(options['output'], 'w') as f:
+            json.dump({'requests': options['requests'], 'seed': options['seed'], 'results': results}, f, indent=2)
+        self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            self.compare(results, baseline, options['threshold'], options['max_extra_queries'])
+
+    def cases(self, rng, stage_ids):
+        """(name, url) of the requests to measure, drawn from the generated dataset"""
+        city, lat, lon, _ = rng.choice(CITIES)
+        adjectives, _ = rng.choice(list(CATEGORY_WORDS.values()))
+        lon_span = 0.1 / math.cos(math.radians(lat))
+        bbox = f'{lat - 0.1:.4f},{lon - lon_span:.4f},{lat + 0.1:.4f},{lon + lon_span:.4f}'
+        stage_id = rng.choice(stage_ids)
+        return [
+            ('event_list', f'{reverse("event_list_api")}?bbox={bbox}&zoom=13'),
+            ('event_list_search', f'{reverse("event_list_api")}?search={rng.choice(adjectives)}+{city}'),
+            ('nearby_events', f'{reverse("nearby_events_api")}?lat={lat}&lon={lon}&radius=10'),
+            ('stage_details', reverse('stage_details_api', args=[stage_id])),
+            ('stage_events_public', reverse('stage_events_public', args=[stage_id])),
+        ]
+
+    def request(self, url):
+        """Body size, query count and seconds of one uncached request"""
+        request = self.factory.get(url)
+        request.user = AnonymousUser()
+        match = resolve(request.path)
+        # Measure the work behind a response, not the response cache
+        response_cache.responses.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = match.func(request, *match.args, **match.kwargs)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return len(body), len(queries), elapsed
+
+    def run(self, scale, requests, rng):
+        stage_ids = list(EventSubsection.objects.values_list('id', flat=True))
+        samples = {}
+        for i in range(requests + 1):
+            for name, url in self.cases(rng, stage_ids):
+                size, queries, elapsed = self.request(url)
+                # The first round only warms up connections and imports
+                if i:
+                    samples.setdefault(name, []).append((elapsed * 1000, queries, size))
+
+        results = {}
+        for name, rows in samples.items():
+            times = sorted(row[0] for row in rows)
+            results[name] = {
+                'p50_ms': round(percentile(times, 0.5), 3),
+                'p90_ms': round(percentile(times, 0.9), 3),
+                'p99_ms': round(percentile(times, 0.99), 3),
+                'queries': max(row[1] for row in rows),
+                'bytes': round(sum(row[2] for row in rows) / len(rows)),
+            }
+            result = results[name]
+            self.stdout.write(
+                f'{scale:>8} {name:<22} {result["p50_ms"]:>9.2f} {result["p90_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                f'{result["queries"]:>8} {result["bytes"]:>9}'
+            )
+        return results
+
+    def compare(self, results, baseline, threshold, max_extra_queries):
+        regressions = []
+        for scale, paths in results.items():
+            for name, result in paths.items():
+                before = baseline.get(scale, {}).get(name)
+                if before is None:
+                    continue
+                for key in LATENCY_KEYS:
+                    if result[key] > before[key] * (1 + threshold):
+                        regressions.append(f'{name} at {scale} events: {key} {before[key]:.2f} -> {result[key]:.2f}')
+                if result['queries'] > before['queries'] + max_extra_queries:
+                    regressions.append(f'{name} at {scale} events: queries {before["queries"]} -> {result["queries"]}')
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regressions against the baseline')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
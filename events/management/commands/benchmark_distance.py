@@ -0,0 +1,42 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from events.geo import haversine_distance, bounding_boxes, pack_coordinates, within_radius
+
+class Command(BaseCommand):
+    help = 'Compares per-row haversine_distance with the batched within_radius engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--radius', type=float, default=10, help='Search radius in km')
+        parser.add_argument('--lat', type=float, default=12.9716)
+        parser.add_argument('--lon', type=float, default=77.5946)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        lat, lon, radius = options['lat'], options['lon'], options['radius']
+        rng = random.Random(options['seed'])
+
+        # Candidates are drawn from the bounding box, which is what the
+        # indexed query hands to the distance check in nearby_events_api
+        south, west, north, east = bounding_boxes(lat, lon, radius)[0]
+
+        self.stdout.write(f'{"points":>10} {"scalar (s)":>12} {"batch (s)":>12} {"speedup":>9} {"matches":>9}')
+        for size in options['sizes']:
+            points = [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(size)]
+
+            started = time.perf_counter()
+            scalar = [d for d in (haversine_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in points) if d <= radius]
+            scalar_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            lats, lons = pack_coordinates(points)
+            batch = within_radius(lat, lon, lats, lons, radius)
+            batch_time = time.perf_counter() - started
+
+            if len(scalar) != len(batch):
+                self.stderr.write(self.style.ERROR(f'Mismatch at {size} points: {len(scalar)} != {len(batch)}'))
+
+            self.stdout.write(
+                f'{size:>10} {scalar_time:>12.3f} {batch_time:>12.3f} {scalar_time / batch_time:>8.2f}x {len(batch):>9}'
+            )
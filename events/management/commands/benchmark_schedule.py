@@ -0,0 +1,86 @@
+import random
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from events.models import Event, EventSubsection, StageEvent
+from events.schedule import ScheduleIndex, schedule_index
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Compares database range queries with the in-memory ScheduleIndex on long stage schedules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='Slots per stage')
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(
+            f'{"slots":>8} {"build (ms)":>11} '
+            f'{"db live (ms)":>13} {"idx live (us)":>14} '
+            f'{"db overlap (ms)":>16} {"idx overlap (us)":>17}'
+        )
+        # Everything is written in a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                organizer = User.objects.create_user(username=f'benchmark-{time.time_ns()}')
+                for size in options['sizes']:
+                    self.run(size, options['queries'], organizer, rng)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, size, queries, organizer, rng):
+        start = timezone.now()
+        event = Event.objects.create(
+            title='Benchmark', description='', date=start, latitude=0, longitude=0,
+            location_name='Benchmark', organizer=organizer,
+        )
+        stage = EventSubsection.objects.create(event=event, name='Stage', boundary_coordinates=[])
+        # Back to back 20 to 40 minute slots with short breaks
+        slots = []
+        t = start
+        for i in range(size):
+            end = t + timedelta(minutes=rng.randint(20, 40))
+            slots.append(StageEvent(subsection=stage, title=f'Slot {i}', start_time=t, end_time=end))
+            t = end + timedelta(minutes=rng.choice([0, 0, 5, 10]))
+        StageEvent.objects.bulk_create(slots, batch_size=2000)
+        span = (t - start).total_seconds()
+        moments = [start + timedelta(seconds=rng.uniform(0, span)) for _ in range(queries)]
+
+        started = time.perf_counter()
+        index = schedule_index(stage.id)
+        build_time = time.perf_counter() - started
+        assert isinstance(index, ScheduleIndex) and len(index) == size
+
+        acts = stage.scheduled_events
+        started = time.perf_counter()
+        db_live = [acts.filter(start_time__lte=m, end_time__gte=m).values_list('id', flat=True).first() for m in moments]
+        db_live_time = time.perf_counter() - started
+        started = time.perf_counter()
+        idx_live = [(index.live_at(m) or [None])[0] for m in moments]
+        idx_live_time = time.perf_counter() - started
+        if [slot.id if slot else None for slot in idx_live] != db_live:
+            self.stderr.write(self.style.ERROR(f'Live lookups disagree at {size} slots'))
+
+        windows = [(m, m + timedelta(minutes=15)) for m in moments]
+        started = time.perf_counter()
+        db_overlap = [acts.filter(start_time__lt=e, end_time__gt=s).exists() for s, e in windows]
+        db_overlap_time = time.perf_counter() - started
+        started = time.perf_counter()
+        idx_overlap = [index.overlaps(s, e) for s, e in windows]
+        idx_overlap_time = time.perf_counter() - started
+        if idx_overlap != db_overlap:
+            self.stderr.write(self.style.ERROR(f'Overlap checks disagree at {size} slots'))
+
+        self.stdout.write(
+            f'{size:>8} {build_time * 1000:>11.1f} '
+            f'{db_live_time / queries * 1000:>13.3f} {idx_live_time / queries * 1e6:>14.2f} '
+            f'{db_overlap_time / queries * 1000:>16.3f} {idx_overlap_time / queries * 1e6:>17.2f}'
+        )
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from events.load_data import BATCH_SIZE, generate
+from events.models import Event, UserProfile
+
+class Command(BaseCommand):
+    help = 'Adds a synthetic dataset of clustered events, stages and schedules for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument('--stages-per-event', type=int, default=3)
+        parser.add_argument('--slots-per-stage', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--organizer', default='loadtest', help='Username owning the events, created if missing')
+
+    def handle(self, *args, **options):
+        if Event.objects.filter(external_id__startswith=f'load-{options["seed"]}-').exists():
+            raise CommandError(f'A dataset with seed {options["seed"]} was already generated; use another seed')
+        organizer, created = User.objects.get_or_create(username=options['organizer'])
+        if created:
+            organizer.set_unusable_password()
+            organizer.save()
+            UserProfile.objects.filter(user=organizer).update(role='ORGANIZER')
+
+        def progress(events, elapsed):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{events} events, {events / elapsed:.0f} events/s')
+
+        self.stdout.write('Generating data...')
+        counts = generate(
+            organizer, options['events'], options['stages_per_event'], options['slots_per_stage'],
+            options['seed'], options['batch_size'], progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {counts["events"]} events, {counts["stages"]} stages and {counts["slots"]} scheduled events'
+        ))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from events.models import Event
+from events.schedule_import import ScheduleImportError, import_schedule, parse_schedule
+
+class Command(BaseCommand):
+    help = 'Imports the stage schedule of an event from a CSV or iCalendar file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f'Event {options["event_id"]} does not exist')
+        with open(options['path'], encoding='utf-8-sig') as schedule_file:
+            text = schedule_file.read()
+
+        started = time.perf_counter()
+        try:
+            created = import_schedule(event, parse_schedule(text, options['path']))
+        except ScheduleImportError as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError('Nothing was imported')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(created)} scheduled events in {time.perf_counter() - started:.2f}s'
+        ))
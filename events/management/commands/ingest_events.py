@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from events.ingest import BATCH_SIZE, IngestError, Ingestion, read_csv, read_geojson
+
+class Command(BaseCommand):
+    help = 'Upserts events from a partner feed: a GeoJSON FeatureCollection or a CSV file of any size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--organizer', required=True, help='Username owning the new events')
+        parser.add_argument('--format', choices=['geojson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            organizer = User.objects.get(username=options['organizer'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["organizer"]} does not exist')
+        file_format = options['format'] or ('csv' if options['path'].lower().endswith('.csv') else 'geojson')
+
+        def progress(ingestion):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{ingestion.read} records, {ingestion.rate:.0f} records/s')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as feed:
+            records = read_csv(feed) if file_format == 'csv' else read_geojson(feed)
+            try:
+                ingestion = Ingestion(organizer, options['batch_size']).run(records, progress)
+            except IngestError as e:
+                raise CommandError(f'{e}; batches before the error were saved')
+
+        for error in ingestion.errors:
+            self.stderr.write(error)
+        if ingestion.failed > len(ingestion.errors):
+            self.stderr.write(f'... and {ingestion.failed - len(ingestion.errors)} more invalid records')
+        self.stdout.write(self.style.SUCCESS(
+            f'{ingestion.read} records in {ingestion.elapsed:.2f}s ({ingestion.rate:.0f} records/s): '
+            f'{ingestion.created} created, {ingestion.updated} updated, {ingestion.unchanged} unchanged, {ingestion.failed} invalid'
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from events.clustering import rebuild
+
+class Command(BaseCommand):
+    help = 'Recomputes the precomputed marker clusters from all events'
+
+    def handle(self, *args, **kwargs):
+        cells = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {cells} cluster cells'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from events.search import rebuild
+
+class Command(BaseCommand):
+    help = 'Recomputes the event search index from all events'
+
+    def handle(self, *args, **kwargs):
+        tokens = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {tokens} search tokens'))
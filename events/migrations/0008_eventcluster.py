@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:18
+
+from math import cos, floor, log, pi, radians, tan
+
+from django.db import migrations, models
+
+# A frozen copy of the grid in events.clustering and events.geo at the time
+# of this migration, which must not depend on the current code
+CLUSTER_MAX_ZOOM = 16
+CELLS_PER_TILE = 4
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def cell_for(lat, lon, zoom):
+    size = (2 ** zoom) * CELLS_PER_TILE
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lon + 180) / 360
+    y = (1 - log(tan(radians(lat)) + 1 / cos(radians(lat))) / pi) / 2
+    return min(int(floor(x * size)), size - 1), min(int(floor(y * size)), size - 1)
+
+
+def build_clusters(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventCluster = apps.get_model('events', 'EventCluster')
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        cells = {}
+        for lat, lon in Event.objects.values_list('latitude', 'longitude').iterator(chunk_size=2000):
+            totals = cells.setdefault(cell_for(lat, lon, zoom), [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += lat
+            totals[2] += lon
+        EventCluster.objects.bulk_create(
+            (
+                EventCluster(zoom=zoom, cell_x=x, cell_y=y, count=count, latitude_sum=lat_sum, longitude_sum=lon_sum)
+                for (x, y), (count, lat_sum, lon_sum) in cells.items()
+            ),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_lat_lng_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'cell_x', 'cell_y'), name='event_cluster_cell')],
+            },
+        ),
+        migrations.RunPython(build_clusters, migrations.RunPython.noop),
+    ]
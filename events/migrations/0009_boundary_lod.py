@@ -0,0 +1,109 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:24
+
+from math import cos, radians
+
+from django.db import migrations, models
+
+# A frozen copy of the helpers in events.geometry at the time of this
+# migration, which must not depend on the current code
+LOD_ZOOMS = (12, 14, 16)
+PIXEL_TOLERANCE = 1.0
+
+
+def _perpendicular_distance(point, start, end, scale):
+    x, y = point[1] * scale, point[0]
+    x1, y1 = start[1] * scale, start[0]
+    x2, y2 = end[1] * scale, end[0]
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / length_sq))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
+
+
+def _douglas_peucker(points, tolerance, scale):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_distance = None, tolerance
+        for i in range(first + 1, last):
+            distance = _perpendicular_distance(points[i], points[first], points[last], scale)
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_polygon(points, tolerance):
+    """
+    Simplify a polygon ring with Douglas-Peucker, tolerance in degrees of
+    latitude. The ring is split at the vertex farthest from the first one so
+    the result always keeps at least three vertices.
+    """
+    if not points or len(points) <= 4:
+        return points
+    scale = cos(radians(points[0][0]))
+    origin = points[0]
+    split = max(
+        range(1, len(points)),
+        key=lambda i: (points[i][0] - origin[0]) ** 2 + ((points[i][1] - origin[1]) * scale) ** 2,
+    )
+    head = _douglas_peucker(points[:split + 1], tolerance, scale)
+    tail = _douglas_peucker(points[split:] + [origin], tolerance, scale)
+    simplified = head + tail[1:]
+    # Keep the ring closed only if the input was
+    if points[-1] != origin:
+        simplified.pop()
+    return simplified
+
+
+def simplify_tiers(points):
+    """Precompute the simplified boundary for every LOD zoom level"""
+    if not isinstance(points, list) or len(points) < 3:
+        return None
+    try:
+        scale = cos(radians(points[0][0]))
+        tiers = {}
+        for zoom in LOD_ZOOMS:
+            # Degrees covered by one pixel at this zoom (Web Mercator, 256px tiles)
+            tolerance = PIXEL_TOLERANCE * 360 * scale / (256 * 2 ** zoom)
+            tiers[f'z{zoom}'] = simplify_polygon(points, tolerance)
+    except (TypeError, IndexError):
+        # Malformed boundaries are stored as given but get no simplified tiers
+        return None
+    return tiers
+
+
+def compute_boundary_lod(apps, schema_editor):
+    for model_name in ('Event', 'EventSubsection'):
+        model = apps.get_model('events', model_name)
+        for obj in model.objects.exclude(boundary_coordinates__isnull=True).iterator():
+            obj.boundary_lod = simplify_tiers(obj.boundary_coordinates)
+            obj.save(update_fields=['boundary_lod'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_eventcluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='boundary_lod',
+            field=models.JSONField(blank=True, editable=False, help_text='Simplified boundary per zoom tier, computed on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='boundary_lod',
+            field=models.JSONField(blank=True, editable=False, help_text='Simplified boundary per zoom tier, computed on save', null=True),
+        ),
+        migrations.RunPython(compute_boundary_lod, migrations.RunPython.noop),
+    ]
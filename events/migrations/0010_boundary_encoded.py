@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:26
+
+from django.db import migrations, models
+
+# A frozen copy of the helpers in events.geometry at the time of this
+# migration, which must not depend on the current code
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=5):
+    """Encode [lat, lng] pairs with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = int(round(lat * factor)), int(round(lng * factor))
+        encoded.append(_encode_value(lat - prev_lat))
+        encoded.append(_encode_value(lng - prev_lng))
+        prev_lat, prev_lng = lat, lng
+    return ''.join(encoded)
+
+
+def encode_tiers(points, tiers):
+    """Encoded polylines for the full boundary ('full') and each simplified tier"""
+    if tiers is None:
+        return None
+    try:
+        encoded = {'full': encode_polyline(points)}
+        for tier, simplified in tiers.items():
+            encoded[tier] = encode_polyline(simplified)
+    except (TypeError, ValueError):
+        return None
+    return encoded
+
+
+def compute_boundary_encoded(apps, schema_editor):
+    for model_name in ('Event', 'EventSubsection'):
+        model = apps.get_model('events', model_name)
+        for obj in model.objects.exclude(boundary_lod__isnull=True).iterator():
+            obj.boundary_encoded = encode_tiers(obj.boundary_coordinates, obj.boundary_lod)
+            obj.save(update_fields=['boundary_encoded'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_boundary_lod'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='boundary_encoded',
+            field=models.JSONField(blank=True, editable=False, help_text='Encoded polyline of the full boundary and each zoom tier, computed on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='boundary_encoded',
+            field=models.JSONField(blank=True, editable=False, help_text='Encoded polyline of the full boundary and each zoom tier, computed on save', null=True),
+        ),
+        migrations.RunPython(compute_boundary_encoded, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+# A frozen copy of the helpers in events.geometry at the time of this
+# migration, which must not depend on the current code
+
+
+def boundary_bounds(points):
+    """(south, west, north, east) envelope of a boundary, or None if it is missing or malformed"""
+    try:
+        lats = [point[0] for point in points]
+        lngs = [point[1] for point in points]
+        return min(lats), min(lngs), max(lats), max(lngs)
+    except (TypeError, IndexError, ValueError):
+        return None
+
+
+def compute_boundary_bounds(apps, schema_editor):
+    for model_name in ('Event', 'EventSubsection'):
+        model = apps.get_model('events', model_name)
+        for obj in model.objects.exclude(boundary_coordinates__isnull=True).iterator():
+            bounds = boundary_bounds(obj.boundary_coordinates)
+            if bounds:
+                obj.bounds_south, obj.bounds_west, obj.bounds_north, obj.bounds_east = bounds
+                obj.save(update_fields=['bounds_south', 'bounds_west', 'bounds_north', 'bounds_east'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_boundary_encoded'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='bounds_east',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='bounds_north',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='bounds_south',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='bounds_west',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='bounds_east',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='bounds_north',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='bounds_south',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventsubsection',
+            name='bounds_west',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['bounds_south', 'bounds_west'], name='event_bounds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventsubsection',
+            index=models.Index(fields=['bounds_south', 'bounds_west'], name='subsection_bounds_idx'),
+        ),
+        migrations.RunPython(compute_boundary_bounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:39
+
+import django.db.models.deletion
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of the tokenizer in events.search at the time of this
+# migration, which must not depend on the current models
+FIELD_WEIGHTS = {'title': 8, 'category__name': 4, 'location_name': 2, 'description': 1}
+TOKEN_MAX_LENGTH = 40
+TOKEN_RE = re.compile(r'\w+')
+
+
+def event_tokens(values):
+    tokens = {}
+    for column, weight in FIELD_WEIGHTS.items():
+        text = values.get(column)
+        if not text:
+            continue
+        for token in dict.fromkeys(token[:TOKEN_MAX_LENGTH] for token in TOKEN_RE.findall(text.casefold())):
+            tokens[token] = tokens.get(token, 0) + weight
+    return tokens
+
+
+def build_search_index(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    SearchToken = apps.get_model('events', 'SearchToken')
+    rows = (
+        SearchToken(event_id=values['id'], token=token, weight=weight)
+        for values in Event.objects.values('id', *FIELD_WEIGHTS).iterator()
+        for token, weight in event_tokens(values).items()
+    )
+    SearchToken.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_boundary_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'event'], name='search_token_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_searchtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stageevent',
+            index=models.Index(fields=['subsection', 'start_time', 'end_time'], name='stage_event_schedule_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_stage_event_schedule_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every edit, for optimistic concurrency in the edit API'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_event_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='external_id',
+            field=models.CharField(blank=True, editable=False, help_text='Identifier in the partner feed the event was ingested from', max_length=200, null=True, unique=True),
+        ),
+    ]
@@ -1,7 +1,28 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
+from .geometry import simplify_tiers, encode_tiers, boundary_bounds
+
+class BoundaryBoundsMixin(models.Model):
+    """Envelope of boundary_coordinates, kept up to date on save so tiles can find polygons with range queries"""
+    bounds_south = models.FloatField(null=True, blank=True, editable=False)
+    bounds_west = models.FloatField(null=True, blank=True, editable=False)
+    bounds_north = models.FloatField(null=True, blank=True, editable=False)
+    bounds_east = models.FloatField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def update_boundary_bounds(self):
+        bounds = boundary_bounds(self.boundary_coordinates) or (None, None, None, None)
+        self.bounds_south, self.bounds_west, self.bounds_north, self.bounds_east = bounds
+
+    def update_boundary_geometry(self):
+        """Recompute everything derived from boundary_coordinates; save() does it, bulk writes must call it"""
+        self.boundary_lod = simplify_tiers(self.boundary_coordinates)
+        self.boundary_encoded = encode_tiers(self.boundary_coordinates, self.boundary_lod)
+        self.update_boundary_bounds()
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -12,7 +33,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Event(models.Model):
+class Event(BoundaryBoundsMixin):
     title = models.CharField(max_length=200)
     description = models.TextField()
     date = models.DateTimeField()
@@ -21,27 +42,222 @@ class Event(models.Model):
     location_name = models.CharField(max_length=200)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     boundary_coordinates = models.JSONField(null=True, blank=True, help_text="List of [lat, lng] coordinates for the boundary polygon")
+    boundary_lod = models.JSONField(null=True, blank=True, editable=False, help_text="Simplified boundary per zoom tier, computed on save")
+    boundary_encoded = models.JSONField(null=True, blank=True, editable=False, help_text="Encoded polyline of the full boundary and each zoom tier, computed on save")
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events', default=4)
+    external_id = models.CharField(max_length=200, null=True, blank=True, unique=True, editable=False, help_text="Identifier in the partner feed the event was ingested from")
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Incremented on every edit, for optimistic concurrency in the edit API")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='event_lat_lng_idx'),
+            models.Index(fields=['bounds_south', 'bounds_west'], name='event_bounds_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
-class EventSubsection(models.Model):
+    def save(self, *args, **kwargs):
+        # A partial save that leaves the boundary alone keeps its derived columns
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'boundary_coordinates' in update_fields:
+            self.update_boundary_geometry()
+        super().save(*args, **kwargs)
+
+class EventCluster(models.Model):
+    """Precomputed marker cluster: the events falling in one map grid cell at one zoom level"""
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'cell_x', 'cell_y'], name='event_cluster_cell'),
+        ]
+
+    def __str__(self):
+        return f"z{self.zoom} ({self.cell_x}, {self.cell_y}): {self.count}"
+
+@receiver(pre_save, sender=Event)
+def remember_event_position(sender, instance, raw=False, **kwargs):
+    instance._previous_position = None
+    instance._previous_extent = None
+    instance._previous_labels = None
+    if instance.pk and not raw:
+        previous = Event.objects.filter(pk=instance.pk).values_list(
+            'latitude', 'longitude', 'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east',
+            'title', 'location_name',
+        ).first()
+        if previous:
+            instance._previous_position = previous[:2]
+            instance._previous_extent = previous[:6]
+            instance._previous_labels = previous[6:]
+
+@receiver(post_save, sender=Event)
+def update_event_clusters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    from .clustering import move_event
+    move_event(getattr(instance, '_previous_position', None), (instance.latitude, instance.longitude))
+
+@receiver(post_delete, sender=Event)
+def remove_event_from_clusters(sender, instance, **kwargs):
+    from .clustering import add_event
+    add_event(instance.latitude, instance.longitude, delta=-1)
+
+class SearchToken(models.Model):
+    """One word of an event's searchable text, the inverted index behind event search"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=40)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'event'], name='search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.event_id})"
+
+@receiver(post_save, sender=Event)
+def index_event_search_tokens(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Geometry-only edits leave the searchable text alone
+    if raw or (update_fields and not update_fields & {'title', 'description', 'location_name', 'category'}):
+        return
+    from .search import index_events
+    index_events([instance.pk])
+
+@receiver(post_save, sender=Category)
+def index_category_events(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    from .search import index_events
+    index_events(instance.event_set.values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Category)
+def remember_category_events(sender, instance, **kwargs):
+    instance._event_ids = list(instance.event_set.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Category)
+def index_uncategorized_events(sender, instance, **kwargs):
+    from .search import index_events
+    index_events(getattr(instance, '_event_ids', []))
+
+@receiver(post_save, sender=Event)
+def update_event_suggestions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .suggest import EVENT, LOCATION, index
+    previous = getattr(instance, '_previous_labels', None)
+    if previous:
+        index.replace(EVENT, previous[0], instance.title)
+        index.replace(LOCATION, previous[1], instance.location_name)
+    else:
+        index.add(EVENT, instance.title)
+        index.add(LOCATION, instance.location_name)
+
+@receiver(post_delete, sender=Event)
+def remove_event_suggestions(sender, instance, **kwargs):
+    from .suggest import EVENT, LOCATION, index
+    index.add(EVENT, instance.title, -1)
+    index.add(LOCATION, instance.location_name, -1)
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, raw=False, **kwargs):
+    instance._previous_name = None
+    if instance.pk and not raw:
+        instance._previous_name = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .suggest import CATEGORY, index
+    previous = getattr(instance, '_previous_name', None)
+    if previous is not None:
+        index.replace(CATEGORY, previous, instance.name)
+    else:
+        index.add(CATEGORY, instance.name)
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    from .suggest import CATEGORY, index
+    index.add(CATEGORY, instance.name, -1)
+
+def event_extent(instance):
+    return (
+        instance.latitude, instance.longitude,
+        instance.bounds_south, instance.bounds_west, instance.bounds_north, instance.bounds_east,
+    )
+
+@receiver(post_save, sender=Event)
+def invalidate_event_tiles(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .tiles import invalidate_extents
+    invalidate_extents([getattr(instance, '_previous_extent', None), event_extent(instance)])
+
+@receiver(post_delete, sender=Event)
+def invalidate_deleted_event_tiles(sender, instance, **kwargs):
+    from .tiles import invalidate_extents
+    invalidate_extents([event_extent(instance)])
+
+class EventSubsection(BoundaryBoundsMixin):
     """Represents a subsection/stage/area within an event"""
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='subsections')
     name = models.CharField(max_length=200, help_text="e.g., Main Stage, Food Court, VIP Area")
     description = models.TextField(blank=True, help_text="Optional details about this area")
     boundary_coordinates = models.JSONField(help_text="Polygon coordinates for this subsection")
+    boundary_lod = models.JSONField(null=True, blank=True, editable=False, help_text="Simplified boundary per zoom tier, computed on save")
+    boundary_encoded = models.JSONField(null=True, blank=True, editable=False, help_text="Encoded polyline of the full boundary and each zoom tier, computed on save")
     color = models.CharField(max_length=7, default='#ff7800', help_text="Hex color code for map display")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['bounds_south', 'bounds_west'], name='subsection_bounds_idx'),
+        ]
     
     def __str__(self):
         return f"{self.event.title} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        # A partial save that leaves the boundary alone keeps its derived columns
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'boundary_coordinates' in update_fields:
+            self.update_boundary_geometry()
+        super().save(*args, **kwargs)
+
+def subsection_extent(instance):
+    return (None, None, instance.bounds_south, instance.bounds_west, instance.bounds_north, instance.bounds_east)
+
+@receiver(pre_save, sender=EventSubsection)
+def remember_subsection_extent(sender, instance, raw=False, **kwargs):
+    instance._previous_extent = None
+    if instance.pk and not raw:
+        previous = EventSubsection.objects.filter(pk=instance.pk).values_list(
+            'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east'
+        ).first()
+        if previous:
+            instance._previous_extent = (None, None) + previous
+
+@receiver(post_save, sender=EventSubsection)
+def invalidate_subsection_tiles(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .tiles import invalidate_extents
+    invalidate_extents([getattr(instance, '_previous_extent', None), subsection_extent(instance)])
+
+@receiver(post_delete, sender=EventSubsection)
+def invalidate_deleted_subsection_tiles(sender, instance, **kwargs):
+    from .tiles import invalidate_extents
+    invalidate_extents([subsection_extent(instance)])
+
 class UserProfile(models.Model):
     ROLE_CHOICES = (
         ('ADMIN', 'Admin'),
@@ -77,7 +293,78 @@ class StageEvent(models.Model):
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['subsection', 'start_time', 'end_time'], name='stage_event_schedule_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} @ {self.subsection.name}"
 
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventSubsection)
+@receiver(post_delete, sender=EventSubsection)
+@receiver(post_save, sender=StageEvent)
+@receiver(post_delete, sender=StageEvent)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_dataset_version(sender, raw=False, **kwargs):
+    if raw:
+        return
+    from .response_cache import bump_version
+    bump_version()
+
+@receiver(pre_save, sender=StageEvent)
+def remember_stage_event_subsection(sender, instance, raw=False, **kwargs):
+    instance._previous_subsection_id = None
+    if instance.pk and not raw:
+        instance._previous_subsection_id = StageEvent.objects.filter(pk=instance.pk).values_list(
+            'subsection_id', flat=True
+        ).first()
+
+@receiver(post_save, sender=StageEvent)
+@receiver(post_delete, sender=StageEvent)
+def bump_stage_schedule_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .schedule import bump_schedule_version
+    bump_schedule_version(instance.subsection_id)
+    previous = getattr(instance, '_previous_subsection_id', None)
+    if previous and previous != instance.subsection_id:
+        bump_schedule_version(previous)
+
+@receiver(post_save, sender=EventSubsection)
+@receiver(post_delete, sender=EventSubsection)
+def bump_stage_schedule_versions(sender, instance, raw=False, **kwargs):
+    # Stage names appear in schedule feeds, and a new stage may reuse the id
+    # of a deleted one whose index is still cached
+    if raw:
+        return
+    from .schedule import bump_event_schedule_version, bump_schedule_version
+    bump_schedule_version(instance.id)
+    bump_event_schedule_version(instance.event_id)
+
+@receiver(post_save, sender=Event)
+def bump_event_schedule_feed(sender, instance, raw=False, **kwargs):
+    # The event title names its schedule feed
+    if raw:
+        return
+    from .schedule import bump_event_schedule_version
+    bump_event_schedule_version(instance.id)
+
+@receiver(post_save, sender=StageEvent)
+@receiver(post_delete, sender=StageEvent)
+def push_stage_schedule(sender, instance, raw=False, **kwargs):
+    from .live import hub
+    if raw or not hub.channels:
+        return
+    event_id = EventSubsection.objects.filter(pk=instance.subsection_id).values_list('event_id', flat=True).first()
+    if event_id is not None:
+        transaction.on_commit(lambda: hub.notify(event_id))
+
+@receiver(post_save, sender=EventSubsection)
+@receiver(post_delete, sender=EventSubsection)
+def push_event_stages(sender, instance, raw=False, **kwargs):
+    from .live import hub
+    if not raw and hub.channels:
+        transaction.on_commit(lambda: hub.notify(instance.event_id))
@@ -0,0 +1,43 @@
+"""
+Keyset (cursor) pagination helpers for the event APIs.
+
+A cursor is the sort key of the last item on the previous page, encoded as
+URL-safe base64 JSON, so fetching any page costs the same as the first one.
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def is_paginated(request):
+    return 'limit' in request.GET or 'cursor' in request.GET
+
+
+def parse_page(request):
+    """Return (limit, cursor) from the request, raising ValueError if either is malformed"""
+    limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError('Invalid limit')
+    cursor = request.GET.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Malformed base64 or JSON both surface as ValueError subclasses
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def next_page_url(request, values):
+    """Absolute URL of the page following the one whose last sort key is values"""
+    params = request.GET.copy()
+    params['cursor'] = encode_cursor(values)
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
@@ -0,0 +1,246 @@
+"""
+Response caching for the public read APIs.
+
+Responses are cached in process, keyed by URL and by a dataset version
+number kept in the Django cache. The Event, EventSubsection, StageEvent and
+Category signals in models.py bump the version once every write commits,
+which makes all earlier entries unreachable at once, so a hit needs no
+database access at all. Bumping earlier would let a concurrent request cache
+the rows as they were before the commit under the new version. Writes made
+with queryset.update() or bulk_create() send no signals and must call
+bump_version() themselves.
+
+For the version to reach every worker the Django cache must be shared
+between processes (memcached, Redis, database...). With a per-process cache
+other workers keep serving their entries, so no entry is kept longer than
+RESPONSE_CACHE_TTL.
+
+Every cacheable response carries a strong ETag (a hash of its body) and
+requests whose If-None-Match matches get an empty 304.
+
+Misses are coalesced: concurrent identical requests in one process wait for
+the first of them to render the response instead of all querying the
+database. With the EVENTS_SHARED_COALESCING setting, the first request
+across all processes also takes a lock in the Django cache and publishes its
+response there for the others.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+
+VERSION_KEY = 'events:dataset-version'
+MAX_ENTRIES = 1000
+MAX_BYTES = 64 * 1024 * 1024
+# Larger bodies (full exports) are served but not kept
+MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# Seconds an entry is served, which bounds its staleness where the cache isn't shared
+RESPONSE_CACHE_TTL = 60
+# Seconds a request waits for an identical in-flight one before rendering itself
+COALESCE_TIMEOUT = 10
+SHARED_POLL_INTERVAL = 0.05
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a flushed cache never hands out an old version again
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Make every cached response unreachable once the current transaction commits"""
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by number of entries and total body size"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """entry is a (body, ...) tuple; its size is the length of the body"""
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = entry
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+responses = LRUCache()
+_current_version = None
+
+
+def _cache_key(request, version):
+    # Escaped, so that a value containing & or = can't stand for other parameters
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    return f'{version}:{request.scheme}://{request.get_host()}{request.path}?{query}'
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _shared_single_flight(key, render):
+    """Render once across processes, using a lock and a result slot in the Django cache"""
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    lock_key, result_key = f'events:flight:{digest}', f'events:flight-result:{digest}'
+    if cache.add(lock_key, 1, COALESCE_TIMEOUT):
+        try:
+            entry, response = render()
+            if entry is not None:
+                cache.set(result_key, entry, COALESCE_TIMEOUT)
+            return entry, response
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + COALESCE_TIMEOUT
+    while time.monotonic() < deadline:
+        entry = cache.get(result_key)
+        if entry is not None:
+            return entry, None
+        if cache.get(lock_key) is None:
+            # The other process finished without a cacheable response, or died
+            break
+        time.sleep(SHARED_POLL_INTERVAL)
+    return render()
+
+
+def single_flight(key, render):
+    """
+    Run render() once for concurrent callers with the same key. render returns
+    (entry, response) with entry None for responses that must not be shared;
+    waiting callers get (entry, None), or render themselves if there is no
+    entry to share.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait(COALESCE_TIMEOUT)
+        if flight.entry is not None:
+            return flight.entry, None
+        return render()
+
+    try:
+        if getattr(settings, 'EVENTS_SHARED_COALESCING', False):
+            entry, response = _shared_single_flight(key, render)
+        else:
+            entry, response = render()
+        flight.entry = entry
+        return entry, response
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _etag(body):
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def _not_modified(request, etag):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in etags or '*' in etags
+
+
+def cached_response(view):
+    """
+    Cache successful GET responses of a view until the dataset changes. A
+    view whose response only stays valid until some moment (e.g. the live
+    act of a stage) sets response.expires_at to a timestamp.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        global _current_version
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        version = get_version()
+        if version != _current_version:
+            # Entries of older versions can never be hit again
+            responses.clear()
+            _current_version = version
+        key = _cache_key(request, version)
+        entry = responses.get(key)
+        if entry is not None and entry[3] is not None and entry[3] <= time.time():
+            entry = None
+
+        if entry is None:
+            def render():
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return None, response
+                body = response.content
+                expires_at = time.time() + RESPONSE_CACHE_TTL
+                if getattr(response, 'expires_at', None) is not None:
+                    expires_at = min(expires_at, response.expires_at)
+                entry = (body, _etag(body), response['Content-Type'], expires_at)
+                if len(body) <= MAX_ENTRY_BYTES:
+                    responses.set(key, entry)
+                return entry, response
+
+            entry, response = single_flight(key, render)
+            if entry is None:
+                return response
+
+        body, etag, content_type, _ = entry
+        if _not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type=content_type)
+        response['ETag'] = etag
+        return response
+    return wrapper
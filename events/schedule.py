@@ -0,0 +1,228 @@
+"""
+Stage schedule queries.
+
+live_board() answers "what is playing now and what's next" for every stage
+of an event in a fixed number of queries, however many stages there are:
+one for the stages, one for the acts on now and one window-function query
+for the next act and the number of upcoming acts of each stage.
+
+schedule_index() returns an in-memory ScheduleIndex of one stage's acts that
+answers "live at t", "next after t" and overlap checks with binary searches.
+Indexes are cached per process and tagged with the stage's schedule version,
+a timestamp kept in the Django cache and bumped by the StageEvent signals in
+models.py, so every process drops its copy when the schedule changes.
+Versions are bumped when the write is made, so the writing transaction sees
+its own changes, and again once it commits, which drops indexes other
+requests rebuilt from the rows as they were before. A process only learns
+about the change once the Django cache does, so indexes serve read paths;
+validating writes queries the database.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import EventSubsection, StageEvent
+
+MAX_CACHED_INDEXES = 256
+
+Slot = namedtuple('Slot', ['id', 'title', 'start_time', 'end_time'])
+
+
+class ScheduleIndex:
+    """
+    Acts of one stage sorted by start time, with the running maximum of
+    their end times. An act is live at t when start_time <= t <= end_time.
+    """
+
+    def __init__(self, slots):
+        self.slots = sorted(slots, key=lambda slot: (slot.start_time, slot.id))
+        self.starts = [slot.start_time for slot in self.slots]
+        self.max_ends = list(accumulate((slot.end_time for slot in self.slots), max))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def live_at(self, t):
+        """Acts live at t, earliest start first"""
+        live = []
+        i = bisect_right(self.starts, t) - 1
+        # Walk back only while some earlier act still ends after t
+        while i >= 0 and self.max_ends[i] >= t:
+            if self.slots[i].end_time >= t:
+                live.append(self.slots[i])
+            i -= 1
+        live.reverse()
+        return live
+
+    def next_after(self, t):
+        """First act starting after t, or None"""
+        i = bisect_right(self.starts, t)
+        return self.slots[i] if i < len(self.slots) else None
+
+    def count_after(self, t):
+        return len(self.slots) - bisect_right(self.starts, t)
+
+    def overlapping(self, start_time, end_time, exclude=None):
+        """Acts sharing some time with [start_time, end_time), back to back ones excepted"""
+        found = []
+        i = bisect_left(self.starts, end_time) - 1
+        while i >= 0 and self.max_ends[i] > start_time:
+            slot = self.slots[i]
+            if slot.end_time > start_time and slot.id != exclude:
+                found.append(slot)
+            i -= 1
+        found.reverse()
+        return found
+
+    def overlaps(self, start_time, end_time, exclude=None):
+        return bool(self.overlapping(start_time, end_time, exclude))
+
+
+def _version_key(subsection_id):
+    return f'schedule-version:{subsection_id}'
+
+
+def schedule_version(subsection_id):
+    """Nanosecond timestamp of the last change to a stage's schedule"""
+    version = cache.get(_version_key(subsection_id))
+    if version is None:
+        cache.add(_version_key(subsection_id), time.time_ns(), None)
+        version = cache.get(_version_key(subsection_id))
+    return version
+
+
+def bump_schedule_version(subsection_id):
+    _bump([_version_key(subsection_id)])
+
+
+def bump_schedule_versions(subsection_ids):
+    """bump_schedule_version() for many stages at once, after bulk writes"""
+    _bump([_version_key(subsection_id) for subsection_id in subsection_ids])
+
+
+def _event_version_key(event_id):
+    return f'schedule-version:event:{event_id}'
+
+
+def event_schedule_version(event_id, subsection_ids):
+    """
+    Version of a whole event's schedule: the latest of its stages' versions
+    and of the event's own one, bumped when stages are added, renamed or
+    removed.
+    """
+    keys = [_event_version_key(event_id)] + [_version_key(subsection_id) for subsection_id in subsection_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        versions = cache.get_many(keys)
+    return max(versions.values())
+
+
+def bump_event_schedule_version(event_id):
+    _bump([_event_version_key(event_id)])
+
+
+def _bump(keys):
+    """Advance version keys now and again when the current transaction commits"""
+    def bump():
+        current = cache.get_many(keys)
+        now = time.time_ns()
+        cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def schedule_index(subsection_id):
+    """ScheduleIndex of a stage, rebuilt with one query when its schedule changed"""
+    version = schedule_version(subsection_id)
+    with _indexes_lock:
+        cached = _indexes.get(subsection_id)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(subsection_id)
+            return cached[1]
+
+    index = ScheduleIndex(
+        Slot(*row) for row in StageEvent.objects.filter(subsection_id=subsection_id).values_list(
+            'id', 'title', 'start_time', 'end_time',
+        )
+    )
+    with _indexes_lock:
+        _indexes[subsection_id] = (version, index)
+        _indexes.move_to_end(subsection_id)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def stage_status(subsection_id, name, live_event, next_event, upcoming_count):
+    """Payload of one stage; live_event and next_event are dicts with title, start_time and end_time"""
+    return {
+        'id': subsection_id,
+        'name': name,
+        'live_event': {
+            'title': live_event['title'],
+            'start': live_event['start_time'].strftime('%H:%M'),
+            'end': live_event['end_time'].strftime('%H:%M')
+        } if live_event else None,
+        'next_event': {
+            'title': next_event['title'],
+            'start': next_event['start_time'].strftime('%H:%M')
+        } if next_event else None,
+        'upcoming_count': upcoming_count
+    }
+
+
+def status_changes_at(live_events, next_events):
+    """Earliest moment a live act ends or a next act starts, or None"""
+    moments = [event['end_time'] for event in live_events if event]
+    moments += [event['start_time'] for event in next_events if event]
+    return min(moments) if moments else None
+
+
+def live_board(event_id, now=None):
+    """
+    Status of every stage of an event, in stage order, and the moment it
+    next changes (None if nothing is scheduled anymore).
+    """
+    now = now or timezone.now()
+    stages = list(EventSubsection.objects.filter(event_id=event_id).values_list('id', 'name'))
+    acts = StageEvent.objects.filter(subsection__event_id=event_id)
+
+    live = {}
+    # Overlapping acts are rare; like stage_details_api, the earliest one wins
+    for act in acts.filter(start_time__lte=now, end_time__gte=now).order_by('-start_time').values(
+        'subsection_id', 'title', 'start_time', 'end_time',
+    ):
+        live[act['subsection_id']] = act
+
+    upcoming = {}
+    for act in acts.filter(start_time__gt=now).annotate(
+        position=Window(RowNumber(), partition_by=F('subsection_id'), order_by=[F('start_time').asc(), F('id').asc()]),
+        upcoming_count=Window(Count('id'), partition_by=F('subsection_id')),
+    ).filter(position=1).values('subsection_id', 'title', 'start_time', 'end_time', 'upcoming_count'):
+        upcoming[act['subsection_id']] = act
+
+    board = [
+        stage_status(
+            stage_id, name, live.get(stage_id), upcoming.get(stage_id),
+            upcoming[stage_id]['upcoming_count'] if stage_id in upcoming else 0,
+        )
+        for stage_id, name in stages
+    ]
+    return board, status_changes_at(live.values(), upcoming.values())
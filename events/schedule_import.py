@@ -0,0 +1,224 @@
+"""
+Bulk import of a whole event's stage schedule from CSV or iCalendar.
+
+Rows are matched to the event's stages by name, then the new and existing
+acts of each stage are sorted by start time and swept once to find every
+overlap, instead of one query per row. Imports are all or nothing: if any
+row is invalid nothing is written, otherwise all rows are inserted with
+bulk_create() in one transaction.
+"""
+import csv
+import io
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StageEvent
+
+CSV_COLUMNS = ('stage', 'title', 'start', 'end')
+TITLE_MAX_LENGTH = StageEvent._meta.get_field('title').max_length
+
+ImportRow = namedtuple('ImportRow', ['line', 'stage', 'title', 'description', 'start_time', 'end_time'])
+
+
+class ScheduleImportError(Exception):
+    """Raised with (line, message) pairs; errors holds them formatted in line order"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid rows')
+        self.errors = [
+            f'Line {line}: {message}' if line else message
+            for line, message in sorted(errors, key=lambda error: error[0] or 0)
+        ]
+
+
+def _aware(value):
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def parse_csv(text):
+    """
+    Rows of a CSV with a header naming at least stage, title, start and end
+    (ISO 8601 times, naive ones in the site time zone) and optionally
+    description.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {name.strip().lower() for name in reader.fieldnames or []}
+    missing = [name for name in CSV_COLUMNS if name not in columns]
+    if missing:
+        raise ScheduleImportError([(None, f'Missing columns: {", ".join(missing)}')])
+
+    rows, errors = [], []
+    for line, record in enumerate(reader, start=2):
+        # DictReader puts the fields past the header in a list under None
+        if None in record:
+            errors.append((line, 'more fields than columns'))
+            continue
+        record = {(key or '').strip().lower(): (value or '').strip() for key, value in record.items()}
+        try:
+            start_time = _aware(datetime.fromisoformat(record['start']))
+            end_time = _aware(datetime.fromisoformat(record['end']))
+        except ValueError:
+            errors.append((line, 'invalid start or end time'))
+            continue
+        rows.append(ImportRow(line, record['stage'], record['title'], record.get('description', ''), start_time, end_time))
+    if errors:
+        raise ScheduleImportError(errors)
+    return rows
+
+
+def _unfold(text):
+    """Logical lines of an iCalendar file, with folded continuation lines joined"""
+    lines = []
+    for raw in text.splitlines():
+        if raw[:1] in (' ', '\t') and lines:
+            lines[-1] += raw[1:]
+        elif raw:
+            lines.append(raw)
+    return lines
+
+
+def _ics_text(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _ics_datetime(value, params):
+    if 'VALUE=DATE' in params or len(value) == 8:
+        raise ValueError('All-day entries are not supported')
+    if value.endswith('Z'):
+        return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=dt_timezone.utc)
+    parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    tzid = next((param[5:] for param in params if param.startswith('TZID=')), None)
+    if tzid:
+        from zoneinfo import ZoneInfo
+        return parsed.replace(tzinfo=ZoneInfo(tzid.strip('"')))
+    return _aware(parsed)
+
+
+def parse_ics(text):
+    """Rows of an iCalendar file: one per VEVENT, the stage name in LOCATION"""
+    rows, errors = [], []
+    current = None
+    for line, content in enumerate(_unfold(text), start=1):
+        name, _, value = content.partition(':')
+        name, *params = name.split(';')
+        name = name.upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            current = {'line': line}
+        elif name == 'END' and value.upper() == 'VEVENT' and current is not None:
+            if 'start' not in current or 'end' not in current:
+                errors.append((current['line'], 'event without DTSTART and DTEND'))
+            else:
+                rows.append(ImportRow(
+                    current['line'], current.get('stage', ''), current.get('title', ''),
+                    current.get('description', ''), current['start'], current['end'],
+                ))
+            current = None
+        elif current is not None:
+            try:
+                if name == 'DTSTART':
+                    current['start'] = _ics_datetime(value, params)
+                elif name == 'DTEND':
+                    current['end'] = _ics_datetime(value, params)
+            except (ValueError, LookupError):
+                errors.append((line, f'invalid {name}'))
+            if name == 'SUMMARY':
+                current['title'] = _ics_text(value)
+            elif name == 'DESCRIPTION':
+                current['description'] = _ics_text(value)
+            elif name == 'LOCATION':
+                current['stage'] = _ics_text(value)
+    if errors:
+        raise ScheduleImportError(errors)
+    return rows
+
+
+def parse_schedule(text, filename=''):
+    """Rows of a CSV or iCalendar schedule, told apart by extension or content"""
+    if filename.lower().endswith('.ics') or text.lstrip().upper().startswith('BEGIN:VCALENDAR'):
+        return parse_ics(text)
+    return parse_csv(text)
+
+
+def find_overlaps(acts):
+    """
+    Overlapping pairs among (start_time, end_time, key) tuples, found with one
+    sort and sweep. Back to back acts do not overlap.
+    """
+    overlaps = []
+    active = []
+    for start_time, end_time, key in sorted(acts, key=lambda act: (act[0], act[1])):
+        # Acts that ended by now can't overlap this one or any later one
+        active = [act for act in active if act[1] > start_time]
+        overlaps.extend((other[2], key) for other in active)
+        active.append((start_time, end_time, key))
+    return overlaps
+
+
+def import_schedule(event, rows):
+    """
+    Validate rows against the event's stages and existing schedule and
+    insert them all, returning the created StageEvents. Raises
+    ScheduleImportError listing every problem otherwise.
+    """
+    stages = {stage.name.strip().lower(): stage for stage in event.subsections.all()}
+    errors = []
+    by_stage = {}
+    for row in rows:
+        stage = stages.get(row.stage.strip().lower())
+        if stage is None:
+            errors.append((row.line, f'unknown stage "{row.stage}"'))
+        elif not row.title:
+            errors.append((row.line, 'missing title'))
+        elif len(row.title) > TITLE_MAX_LENGTH:
+            errors.append((row.line, f'title is longer than {TITLE_MAX_LENGTH} characters'))
+        elif row.start_time >= row.end_time:
+            errors.append((row.line, 'end time must be after start time'))
+        else:
+            by_stage.setdefault(stage, []).append(row)
+
+    existing = {}
+    for subsection_id, title, start_time, end_time in StageEvent.objects.filter(
+        subsection__in=list(by_stage),
+    ).values_list('subsection_id', 'title', 'start_time', 'end_time'):
+        existing.setdefault(subsection_id, []).append((start_time, end_time, title))
+
+    for stage, stage_rows in by_stage.items():
+        acts = [(row.start_time, row.end_time, row) for row in stage_rows]
+        acts += existing.get(stage.id, [])
+        for pair in find_overlaps(acts):
+            new = sorted((key for key in pair if isinstance(key, ImportRow)), key=lambda row: row.line)
+            if len(new) == 2:
+                errors.append((new[1].line, f'overlaps line {new[0].line} on {stage.name}'))
+            elif new:
+                title = next(key for key in pair if not isinstance(key, ImportRow))
+                errors.append((new[0].line, f'overlaps "{title}" already scheduled on {stage.name}'))
+    if errors:
+        raise ScheduleImportError(errors)
+
+    created = [
+        StageEvent(
+            subsection=stage, title=row.title, description=row.description,
+            start_time=row.start_time, end_time=row.end_time,
+        )
+        for stage, stage_rows in by_stage.items()
+        for row in stage_rows
+    ]
+    with transaction.atomic():
+        StageEvent.objects.bulk_create(created, batch_size=1000)
+        _schedules_changed(event.id, [stage.id for stage in by_stage])
+    return created
+
+
+def _schedules_changed(event_id, subsection_ids):
+    # bulk_create() sends no signals, so do what the StageEvent receivers would
+    from .live import hub
+    from .response_cache import bump_version
+    from .schedule import bump_schedule_versions
+
+    # Bumped again on commit, or an index rebuilt meanwhile would miss the new acts
+    bump_schedule_versions(subsection_ids)
+    bump_version()
+    transaction.on_commit(lambda: hub.notify(event_id))
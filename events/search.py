@@ -0,0 +1,110 @@
+"""
+Inverted-index event search.
+
+Every event is split into lowercase word tokens, stored in the SearchToken
+table with a weight depending on the field they came from. A query matches
+the events containing, for each of its words, a token starting with that
+word, and results are ranked by the summed weight of the matching tokens.
+Prefix lookups are index range scans on (token, event), so a search never
+reads the event text itself. The index is kept up to date by the Event and
+Category signals in models.py; rebuild() recomputes it from scratch.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import Event, SearchToken
+
+# Payload column -> token weight
+FIELD_WEIGHTS = {
+    'title': 8,
+    'category__name': 4,
+    'location_name': 2,
+    'description': 1,
+}
+TOKEN_MAX_LENGTH = 40
+MAX_QUERY_TERMS = 8
+# Upper bound of every string starting with a given prefix
+PREFIX_END = '\uffff'
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Distinct lowercase word tokens of a text, in order of appearance"""
+    if not text:
+        return []
+    return list(dict.fromkeys(token[:TOKEN_MAX_LENGTH] for token in TOKEN_RE.findall(text.casefold())))
+
+
+def event_tokens(values):
+    """{token: weight} for a dict of FIELD_WEIGHTS columns"""
+    tokens = {}
+    for column, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(values.get(column)):
+            tokens[token] = tokens.get(token, 0) + weight
+    return tokens
+
+
+def _index_rows(events):
+    for values in events.values('id', *FIELD_WEIGHTS):
+        for token, weight in event_tokens(values).items():
+            yield SearchToken(event_id=values['id'], token=token, weight=weight)
+
+
+@transaction.atomic
+def index_events(event_ids, batch_size=2000):
+    """Replace the tokens of the given events with ones computed from their current text"""
+    event_ids = list(event_ids)
+    if not event_ids:
+        return
+    SearchToken.objects.filter(event_id__in=event_ids).delete()
+    SearchToken.objects.bulk_create(_index_rows(Event.objects.filter(id__in=event_ids)), batch_size=batch_size)
+
+
+@transaction.atomic
+def rebuild(batch_size=2000):
+    """Recompute the whole index, returning the number of tokens written"""
+    SearchToken.objects.all().delete()
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(Event.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        rows = list(_index_rows(Event.objects.filter(id__in=ids)))
+        SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+        total += len(rows)
+        last_id = ids[-1]
+    return total
+
+
+def _prefix(term):
+    return Q(token__gte=term, token__lt=term + PREFIX_END)
+
+
+def search_events(events, query):
+    """
+    Restrict an Event queryset to the events matching every word of query,
+    annotated with a search_rank and ordered by it (best first, then by id).
+    A query without any word matches nothing.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return events.none()
+
+    any_term = Q()
+    for term in terms:
+        any_term |= _prefix(term)
+    # One grouped index scan: an event matches when every term hit one of its tokens
+    matches = SearchToken.objects.filter(any_term).values('event_id').annotate(**{
+        f'term_{i}': Max(Case(When(_prefix(term), then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, term in enumerate(terms)
+    }).filter(**{f'term_{i}': 1 for i in range(len(terms))})
+    rank = SearchToken.objects.filter(any_term, event=OuterRef('pk')).values('event').annotate(
+        total=Sum('weight'),
+    ).values('total')
+    return events.filter(id__in=matches.values('event_id')).annotate(
+        search_rank=Subquery(rank, output_field=IntegerField()),
+    ).order_by('-search_rank', 'id')
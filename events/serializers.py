@@ -0,0 +1,152 @@
+"""
+Shared payload builders for the public event APIs.
+
+Rows are read with values_list() so no model instances are created and only
+the requested columns leave the database, and all subsections for a page of
+events are fetched in one extra query, keeping the number of queries fixed no
+matter how many events are returned.
+"""
+import json
+
+from .geometry import lod_tier
+from .models import EventSubsection
+
+# Payload key -> ORM column
+EVENT_COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'date': 'date',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'location_name': 'location_name',
+    'category': 'category__name',
+    'boundary_coordinates': 'boundary_coordinates',
+    'version': 'version',
+}
+EVENT_FIELDS = tuple(EVENT_COLUMNS)
+INCLUDES = ('subsections',)
+GEOMETRY_FORMATS = ('json', 'polyline')
+SUBSECTION_FIELDS = ('id', 'event_id', 'name', 'description', 'boundary_coordinates', 'color')
+STREAM_CHUNK_SIZE = 500
+
+
+def parse_fields(request):
+    """
+    Read the sparse fieldset parameters, e.g. fields=id,title,latitude,longitude
+    and include=subsections. Without fields the full payload (with subsections)
+    is returned. Raises ValueError for unknown names.
+    """
+    include = {name for name in request.GET.get('include', '').split(',') if name}
+    if include - set(INCLUDES):
+        raise ValueError('Unknown include')
+
+    fields = request.GET.get('fields')
+    if not fields:
+        return EVENT_FIELDS, True
+    fields = tuple(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    if not fields or any(name not in EVENT_COLUMNS for name in fields):
+        raise ValueError('Unknown field')
+    return fields, 'subsections' in include
+
+
+def parse_geometry_format(request):
+    """
+    Read format=json|polyline. Polyline responses carry every boundary as a
+    Google encoded polyline string instead of nested [lat, lng] arrays.
+    Returns True for encoded geometry, raising ValueError for unknown formats.
+    """
+    geometry_format = request.GET.get('format', 'json')
+    if geometry_format not in GEOMETRY_FORMATS:
+        raise ValueError('Unknown format')
+    return geometry_format == 'polyline'
+
+
+def boundary_column(zoom, encoded=False):
+    """Column holding boundaries simplified for the zoom level (full resolution if None)"""
+    tier = lod_tier(zoom)
+    if encoded:
+        return f'boundary_encoded__{tier or "full"}'
+    return f'boundary_lod__{tier}' if tier else 'boundary_coordinates'
+
+
+def event_rows(events, fields=EVENT_FIELDS, zoom=None, encoded=False, extra=()):
+    """
+    Event payloads (without subsections) for a queryset, in one query. 'id' is
+    always included. With a zoom level, boundaries come from the matching
+    precomputed simplification tier, and with encoded from its precomputed
+    polyline string. extra names annotations of the queryset read along,
+    under their own name.
+    """
+    if 'id' not in fields:
+        fields = ('id',) + tuple(fields)
+    columns = dict(EVENT_COLUMNS, boundary_coordinates=boundary_column(zoom, encoded))
+    keys = tuple(fields) + tuple(extra)
+    rows = []
+    for values in events.values_list(*(columns[name] for name in fields), *extra):
+        row = dict(zip(keys, values))
+        if 'date' in row:
+            row['date'] = row['date'].strftime('%Y-%m-%d %H:%M')
+        if 'category' in row:
+            row['category'] = row['category'] or 'Uncategorized'
+        rows.append(row)
+    return rows
+
+
+def attach_subsections(rows, event_ids=None, zoom=None, encoded=False):
+    """
+    Fill in the 'subsections' of each event payload with one query. event_ids
+    may be a subquery (e.g. queryset.values('id')) to avoid sending a long
+    list of ids back to the database.
+    """
+    if not rows:
+        return rows
+    if event_ids is None:
+        event_ids = [row['id'] for row in rows]
+
+    by_event = {}
+    for row in rows:
+        row['subsections'] = by_event[row['id']] = []
+    columns = [boundary_column(zoom, encoded) if name == 'boundary_coordinates' else name for name in SUBSECTION_FIELDS]
+    subsections = EventSubsection.objects.filter(event_id__in=event_ids).order_by('created_at')
+    for values in subsections.values_list(*columns):
+        subsection = dict(zip(SUBSECTION_FIELDS, values))
+        target = by_event.get(subsection.pop('event_id'))
+        if target is not None:
+            target.append(subsection)
+    return rows
+
+
+def serialize_events(events, fields=EVENT_FIELDS, include_subsections=True, zoom=None, encoded=False, extra=()):
+    """Event payloads, optionally with subsections, in a fixed number of queries"""
+    rows = event_rows(events, fields, zoom, encoded, extra)
+    if include_subsections:
+        # Sliced querysets cannot be used as IN subqueries on MySQL
+        attach_subsections(rows, None if events.query.is_sliced else events.values('id'), zoom, encoded)
+    return rows
+
+
+def iter_events_json(events, fields=EVENT_FIELDS, include_subsections=True, zoom=None, encoded=False,
+                     chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a JSON array of event payloads piece by piece. Rows are read in
+    keyset-ordered chunks of chunk_size (id > last id seen) so only one chunk
+    is held in memory at a time, even on backends without server-side cursors.
+    """
+    events = events.order_by('id')
+    last_id = None
+    separator = ''
+    yield '['
+    while True:
+        page = events if last_id is None else events.filter(id__gt=last_id)
+        rows = event_rows(page[:chunk_size], fields, zoom, encoded)
+        if not rows:
+            break
+        if include_subsections:
+            attach_subsections(rows, zoom=zoom, encoded=encoded)
+        yield separator + ','.join(json.dumps(row) for row in rows)
+        separator = ','
+        last_id = rows[-1]['id']
+        if len(rows) < chunk_size:
+            break
+    yield ']'
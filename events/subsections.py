@@ -0,0 +1,97 @@
+"""
+Saving the subsections submitted with the event form.
+
+The form posts the whole list of subsections, existing ones carrying their
+id. apply_subsections() diffs it against the stored rows and, in one
+transaction, updates only the changed rows with bulk_update(), inserts the
+new ones with bulk_create() and deletes the ones left out, so renaming a
+stage keeps its schedule and costs one UPDATE. Tiles, caches and live
+boards are refreshed once the transaction commits.
+"""
+from django.db import connection, transaction
+
+from .models import EventSubsection, subsection_extent
+
+FIELDS = ('name', 'description', 'boundary_coordinates', 'color')
+DERIVED_FIELDS = ('boundary_lod', 'boundary_encoded', 'bounds_south', 'bounds_west', 'bounds_north', 'bounds_east')
+
+
+def _values(item):
+    """Field values of a submitted subsection; KeyError if name or boundary is missing"""
+    return {
+        'name': item['name'],
+        'description': item.get('description') or '',
+        'boundary_coordinates': item['boundary_coordinates'],
+        'color': item.get('color') or EventSubsection._meta.get_field('color').default,
+    }
+
+
+def apply_subsections(event, submitted):
+    """
+    Make event's subsections match the submitted list of dicts. Items whose
+    id is not one of the event's subsections are added as new ones. Returns
+    (created, updated, deleted) counts.
+    """
+    existing = {subsection.id: subsection for subsection in event.subsections.all()}
+    created, updated = [], []
+    extents = []
+    kept = set()
+    for item in submitted:
+        values = _values(item)
+        try:
+            subsection = existing.get(int(item.get('id')))
+        except (TypeError, ValueError):
+            subsection = None
+        if subsection is None or subsection.id in kept:
+            subsection = EventSubsection(event=event, **values)
+            subsection.update_boundary_geometry()
+            created.append(subsection)
+            continue
+        kept.add(subsection.id)
+        changed = [name for name in FIELDS if getattr(subsection, name) != values[name]]
+        if not changed:
+            continue
+        if 'boundary_coordinates' in changed:
+            extents.append(subsection_extent(subsection))
+        for name in changed:
+            setattr(subsection, name, values[name])
+        if 'boundary_coordinates' in changed:
+            subsection.update_boundary_geometry()
+        updated.append(subsection)
+
+    removed = [subsection_id for subsection_id in existing if subsection_id not in kept]
+    if not (created or updated or removed):
+        return 0, 0, 0
+
+    with transaction.atomic():
+        if removed:
+            # A regular delete, so the signals clean up schedules and tiles
+            EventSubsection.objects.filter(pk__in=removed).delete()
+        if updated:
+            EventSubsection.objects.bulk_update(updated, FIELDS + DERIVED_FIELDS)
+        if created:
+            EventSubsection.objects.bulk_create(created)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # MySQL doesn't return the new ids
+                ids = event.subsections.exclude(pk__in=list(existing)).order_by('id').values_list('id', flat=True)
+                for subsection, subsection_id in zip(created, ids):
+                    subsection.id = subsection_id
+        changed = updated + created
+        transaction.on_commit(lambda: _subsections_changed(event.id, changed, extents))
+    return len(created), len(updated), len(removed)
+
+
+def _subsections_changed(event_id, subsections, extents):
+    # bulk_update() and bulk_create() send no signals, so do what the
+    # EventSubsection receivers would
+    from .live import hub
+    from .response_cache import bump_version
+    from .schedule import bump_event_schedule_version, bump_schedule_version
+    from .tiles import invalidate_extents
+
+    invalidate_extents(extents + [subsection_extent(subsection) for subsection in subsections])
+    for subsection in subsections:
+        bump_schedule_version(subsection.id)
+    bump_event_schedule_version(event_id)
+    bump_version()
+    hub.notify(event_id)
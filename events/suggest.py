@@ -0,0 +1,140 @@
+"""
+In-process prefix autocomplete over event titles, locations and categories.
+
+Every distinct label is stored once per word it contains, under the
+lowercase text starting at that word ("Jazz Night" under "jazz night" and
+"night"), in a sorted list. A prefix lookup is a bisect to the first key
+starting with the query followed by a short forward scan, so suggestions
+never touch the database.
+
+The index is built lazily on the first lookup and kept up to date by the
+Event and Category signals in models.py. Signals only reach the process that
+saved the model, so each process also rebuilds its copy once it is older
+than SUGGEST_MAX_AGE. Only one request at a time rebuilds it; the others keep
+answering from the current copy meanwhile.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .models import Category, Event
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+# Keys looked at per lookup; bounds the cost of one-letter prefixes
+MAX_SCANNED = 200
+SUGGEST_MAX_AGE = 300
+
+EVENT, LOCATION, CATEGORY = 'event', 'location', 'category'
+
+
+def _keys(label):
+    """Lowercase suffixes of a label starting at each of its words"""
+    text = ' '.join(label.casefold().split())
+    keys = [text]
+    for i, char in enumerate(text):
+        if char == ' ':
+            keys.append(text[i + 1:])
+    return list(dict.fromkeys(keys))
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+        self._keys = []
+        # (kind, label) -> number of rows carrying the label
+        self._counts = {}
+        self.built_at = None
+
+    def build(self):
+        counts = {}
+        for title, location in Event.objects.values_list('title', 'location_name').iterator():
+            for entry in ((EVENT, title), (LOCATION, location)):
+                counts[entry] = counts.get(entry, 0) + 1
+        for name in Category.objects.values_list('name', flat=True):
+            counts[(CATEGORY, name)] = counts.get((CATEGORY, name), 0) + 1
+        keys = sorted(
+            (key, kind, label)
+            for (kind, label), count in counts.items() if label and label.strip()
+            for key in _keys(label)
+        )
+        with self._lock:
+            self._keys, self._counts = keys, counts
+            self.built_at = time.monotonic()
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > SUGGEST_MAX_AGE
+
+    def refresh(self):
+        """
+        Rebuild the index if it is stale, unless another thread already is.
+        Before the first build there is nothing to answer from, so callers
+        wait for it instead.
+        """
+        if not self.is_stale():
+            return
+        if not self._building.acquire(blocking=self.built_at is None):
+            return
+        try:
+            if self.is_stale():
+                self.build()
+        finally:
+            self._building.release()
+
+    def add(self, kind, label, delta=1):
+        """Count one more (delta=1) or one less (delta=-1) row carrying a label"""
+        if not label or not label.strip() or self.built_at is None:
+            return
+        entry = (kind, label)
+        with self._lock:
+            count = self._counts.get(entry, 0) + delta
+            if count > 0:
+                if entry not in self._counts:
+                    for key in _keys(label):
+                        insort(self._keys, (key, kind, label))
+                self._counts[entry] = count
+            elif entry in self._counts:
+                del self._counts[entry]
+                for key in _keys(label):
+                    i = bisect_left(self._keys, (key, kind, label))
+                    if i < len(self._keys) and self._keys[i] == (key, kind, label):
+                        del self._keys[i]
+
+    def replace(self, kind, old_label, new_label):
+        if old_label != new_label:
+            self.add(kind, old_label, -1)
+            self.add(kind, new_label)
+
+    def suggest(self, query, limit=DEFAULT_SUGGESTIONS):
+        """
+        Up to limit {'text', 'type'} suggestions whose label has a word
+        starting with query, the most common labels first, then labels
+        matched from their first word, then alphabetically.
+        """
+        prefix = ' '.join(query.casefold().split())
+        if not prefix:
+            return []
+        with self._lock:
+            keys, counts = self._keys, self._counts
+            candidates = {}
+            i = bisect_left(keys, (prefix,))
+            for key, kind, label in keys[i:i + MAX_SCANNED]:
+                if not key.startswith(prefix):
+                    break
+                leading = label.casefold().startswith(prefix)
+                entry = (kind, label)
+                candidates[entry] = candidates.get(entry, False) or leading
+            ranked = sorted(
+                candidates.items(),
+                key=lambda item: (-counts.get(item[0], 0), not item[1], item[0][1].casefold(), item[0][0]),
+            )
+        return [{'text': label, 'type': kind} for (kind, label), _ in ranked[:limit]]
+
+
+index = SuggestIndex()
+
+
+def suggest(query, limit=DEFAULT_SUGGESTIONS):
+    index.refresh()
+    return index.suggest(query, limit)
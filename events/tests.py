@@ -1,7 +1,29 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timezone as dt_timezone
+from math import cos, sin, pi
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.test import TestCase, SimpleTestCase, Client, override_settings
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from .models import Category, Event, EventCluster, EventSubsection, SearchToken, StageEvent
+from . import clustering, geo, geometry, ingest, live, response_cache, schedule, schedule_import, search, suggest, tiles
+from .schedule import live_board
+from .serializers import EVENT_FIELDS, iter_events_json
 
 class AuthenticationTests(TestCase):
     def setUp(self):
@@ -68,3 +90,1594 @@ class AuthenticationTests(TestCase):
         self.client.login(username='existinguser', password='testpassword123')
         response = self.client.post(self.logout_url)
         self.assertRedirects(response, reverse('login'))
+
+
+class NearbyEventsApiTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        for title, lat, lon in [
+            ('Close Event', 12.9716, 77.5946),
+            ('Across Town', 13.0300, 77.6400),
+            ('Far Away', 28.6139, 77.2090),
+            ('Dateline East', 0.0, 179.99),
+        ]:
+            Event.objects.create(
+                title=title, description='', date=timezone.now(),
+                latitude=lat, longitude=lon, location_name=title,
+                organizer=self.organizer,
+            )
+
+    def get_titles(self, **params):
+        response = self.client.get(reverse('nearby_events_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.json()]
+
+    def test_returns_events_within_radius_sorted_by_distance(self):
+        self.assertEqual(self.get_titles(lat=12.9716, lon=77.5946, radius=10), ['Close Event', 'Across Town'])
+
+    def test_excludes_events_outside_radius(self):
+        self.assertEqual(self.get_titles(lat=12.9716, lon=77.5946, radius=1), ['Close Event'])
+
+    def test_search_across_antimeridian(self):
+        self.assertEqual(self.get_titles(lat=0.0, lon=-179.99, radius=5), ['Dateline East'])
+
+    def test_invalid_parameters(self):
+        response = self.client.get(reverse('nearby_events_api'), {'lat': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchDistanceTests(SimpleTestCase):
+    def test_within_radius_matches_scalar_haversine(self):
+        rng = random.Random(7)
+        for lat, lon, radius in [(12.97, 77.59, 10), (64.13, -21.9, 50), (0.0, 179.95, 25), (40.7, -74.0, 500)]:
+            points = [(lat + rng.uniform(-1, 1) * radius / 80, lon + rng.uniform(-1, 1) * radius / 40) for _ in range(2000)]
+            points = [(p_lat, (p_lon + 180) % 360 - 180) for p_lat, p_lon in points]
+            lats, lons = geo.pack_coordinates(points)
+            expected = {
+                i: geo.haversine_distance(lat, lon, p_lat, p_lon)
+                for i, (p_lat, p_lon) in enumerate(points)
+                if geo.haversine_distance(lat, lon, p_lat, p_lon) <= radius
+            }
+            matches = dict(geo.within_radius(lat, lon, lats, lons, radius))
+            self.assertEqual(set(matches), set(expected))
+            for i, distance in matches.items():
+                self.assertAlmostEqual(distance, expected[i], places=2)
+
+
+class EventListApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        for title, lat, lon in [
+            ('Bangalore Meetup', 12.9716, 77.5946),
+            ('Delhi Fair', 28.6139, 77.2090),
+            ('Fiji Festival', -17.7134, 178.0650),
+            ('Samoa Carnival', -13.7590, -172.1046),
+        ]:
+            Event.objects.create(
+                title=title, description='', date=timezone.now(),
+                latitude=lat, longitude=lon, location_name=title,
+                boundary_coordinates=[[lat, lon], [lat + 0.01, lon], [lat, lon + 0.01]],
+                organizer=self.organizer,
+            )
+
+    def get_events(self, **params):
+        response = self.client.get(reverse('event_list_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_without_bbox_returns_all_events(self):
+        self.assertEqual(len(self.get_events()), 4)
+
+    def test_bbox_limits_results_to_viewport(self):
+        events = self.get_events(bbox='10,70,20,80')
+        self.assertEqual([event['title'] for event in events], ['Bangalore Meetup'])
+
+    def test_bbox_across_antimeridian(self):
+        events = self.get_events(bbox='-20,170,-10,190')
+        self.assertEqual(sorted(event['title'] for event in events), ['Fiji Festival', 'Samoa Carnival'])
+
+    def test_low_zoom_omits_boundaries(self):
+        event = self.get_events(bbox='10,70,20,80', zoom=5)[0]
+        self.assertNotIn('boundary_coordinates', event)
+        self.assertNotIn('subsections', event)
+        event = self.get_events(bbox='10,70,20,80', zoom=15)[0]
+        self.assertEqual(len(event['boundary_coordinates']), 3)
+
+    def test_invalid_bbox(self):
+        for bbox in ['1,2,3', '20,70,10,80', 'a,b,c,d']:
+            response = self.client.get(reverse('event_list_api'), {'bbox': bbox})
+            self.assertEqual(response.status_code, 400)
+
+
+class EventClustersApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.events = [
+            Event.objects.create(
+                title=f'Event {i}', description='', date=timezone.now(),
+                latitude=12.97 + i * 0.001, longitude=77.59, location_name='Bangalore',
+                organizer=self.organizer,
+            )
+            for i in range(3)
+        ]
+        Event.objects.create(
+            title='Delhi Fair', description='', date=timezone.now(),
+            latitude=28.61, longitude=77.21, location_name='Delhi', organizer=self.organizer,
+        )
+
+    def get_clusters(self, **params):
+        response = self.client.get(reverse('event_clusters_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(response.json(), key=lambda cluster: cluster['latitude'])
+
+    def test_nearby_events_are_merged_at_low_zoom(self):
+        clusters = self.get_clusters(bbox='0,60,40,90', zoom=4)
+        self.assertEqual([cluster['count'] for cluster in clusters], [3, 1])
+        self.assertAlmostEqual(clusters[0]['latitude'], 12.971)
+
+    def test_clusters_follow_saves_and_deletes(self):
+        moved = self.events[0]
+        moved.latitude, moved.longitude = 28.62, 77.22
+        moved.save()
+        self.events[1].delete()
+        clusters = self.get_clusters(bbox='0,60,40,90', zoom=4)
+        self.assertEqual([cluster['count'] for cluster in clusters], [1, 2])
+
+    def test_rebuild_matches_incremental_updates(self):
+        before = sorted(EventCluster.objects.values_list('zoom', 'cell_x', 'cell_y', 'count'))
+        clustering.rebuild()
+        self.assertEqual(sorted(EventCluster.objects.values_list('zoom', 'cell_x', 'cell_y', 'count')), before)
+
+    def test_zoom_is_required(self):
+        response = self.client.get(reverse('event_clusters_api'), {'bbox': '0,60,40,90'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EventSerializerQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.category = Category.objects.create(name='Music')
+
+    def create_events(self, count):
+        events = Event.objects.bulk_create([
+            Event(
+                title=f'Event {i}', description='', date=timezone.now(),
+                latitude=12.9 + (i % 100) * 0.0005, longitude=77.5 + (i // 100) * 0.0005,
+                location_name='Bangalore', category=self.category if i % 2 else None,
+                organizer=self.organizer,
+            )
+            for i in range(count)
+        ])
+        EventSubsection.objects.bulk_create([
+            EventSubsection(event=event, name='Main Stage', boundary_coordinates=[[0, 0], [0, 1], [1, 1]])
+            for event in events
+        ])
+
+    def test_event_list_query_count_is_constant(self):
+        for count in [10, 10000]:
+            with self.captureOnCommitCallbacks(execute=True):
+                Event.objects.all().delete()
+                self.create_events(count)
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('event_list_api'))
+            data = response.json()
+            self.assertEqual(len(data), count)
+            self.assertEqual(len(data[0]['subsections']), 1)
+            self.assertEqual({event['category'] for event in data}, {'Music', 'Uncategorized'})
+
+    def test_nearby_query_count_is_constant(self):
+        for count in [10, 10000]:
+            with self.captureOnCommitCallbacks(execute=True):
+                Event.objects.all().delete()
+                self.create_events(count)
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('nearby_events_api'), {'lat': 12.9, 'lon': 77.5, 'radius': 50})
+            self.assertEqual(len(response.json()), count)
+
+
+class StreamingEventListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        events = Event.objects.bulk_create([
+            Event(
+                title=f'Event {i}', description='', date=timezone.now(),
+                latitude=12.9, longitude=77.5, location_name='Bangalore', organizer=self.organizer,
+            )
+            for i in range(5)
+        ])
+        EventSubsection.objects.create(event=events[3], name='Main Stage', boundary_coordinates=[[0, 0], [0, 1], [1, 1]])
+
+    def test_stream_matches_regular_response(self):
+        expected = self.client.get(reverse('event_list_api')).json()
+        response = self.client.get(reverse('event_list_api'), {'stream': '1'})
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(sorted(streamed, key=lambda event: event['id']), sorted(expected, key=lambda event: event['id']))
+
+    def test_stream_in_small_chunks(self):
+        for chunk_size in [1, 2, 5, 10]:
+            events = json.loads(''.join(iter_events_json(Event.objects.all(), chunk_size=chunk_size)))
+            self.assertEqual([event['title'] for event in events], [f'Event {i}' for i in range(5)])
+            self.assertEqual(len(events[3]['subsections']), 1)
+
+    def test_stream_empty_result(self):
+        response = self.client.get(reverse('event_list_api'), {'stream': '1', 'search': 'nothing'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        # bulk_create() doesn't bump the response cache version
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        Event.objects.bulk_create([
+            Event(
+                title=f'Event {i}', description='', date=timezone.now(),
+                latitude=12.9 + i * 0.001, longitude=77.5, location_name='Bangalore', organizer=self.organizer,
+            )
+            for i in range(7)
+        ])
+
+    def collect_pages(self, url, params):
+        titles = []
+        pages = 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            titles.extend(event['title'] for event in body['results'])
+            pages += 1
+            if not body['next']:
+                return titles, pages
+            response = self.client.get(body['next'])
+
+    def test_event_list_pages(self):
+        titles, pages = self.collect_pages(reverse('event_list_api'), {'limit': 3})
+        self.assertEqual(titles, [f'Event {i}' for i in range(7)])
+        self.assertEqual(pages, 3)
+
+    def test_nearby_pages_ordered_by_distance(self):
+        params = {'lat': 12.9035, 'lon': 77.5, 'radius': 50, 'limit': 2}
+        titles, pages = self.collect_pages(reverse('nearby_events_api'), params)
+        self.assertEqual(titles[:3], ['Event 3', 'Event 4', 'Event 2'])
+        self.assertEqual(sorted(titles), [f'Event {i}' for i in range(7)])
+        self.assertEqual(pages, 4)
+
+    def test_nearby_page_loads_only_its_payloads(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('nearby_events_api'), {'lat': 12.9035, 'lon': 77.5, 'radius': 50, 'limit': 2})
+        self.assertEqual([event['title'] for event in response.json()['results']], ['Event 3', 'Event 4'])
+        payloads = [query['sql'] for query in queries if '"events_event"."description"' in query['sql']]
+        self.assertEqual(len(payloads), 1)
+        self.assertIn(' IN (', payloads[0])
+
+    def test_unpaginated_requests_return_plain_list(self):
+        response = self.client.get(reverse('event_list_api'))
+        self.assertEqual(len(response.json()), 7)
+
+    def test_invalid_page_parameters(self):
+        for params in [{'limit': 0}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}]:
+            response = self.client.get(reverse('event_list_api'), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.event = Event.objects.create(
+            title='Bangalore Meetup', description='A long description', date=timezone.now(),
+            latitude=12.9716, longitude=77.5946, location_name='Bangalore',
+            boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+            organizer=self.organizer,
+        )
+        EventSubsection.objects.create(event=self.event, name='Main Stage', boundary_coordinates=[[0, 0], [0, 1], [1, 1]])
+
+    def test_fields_limit_payload_and_skip_subsections(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('event_list_api'), {'fields': 'id,title,latitude,longitude'})
+        self.assertEqual(response.json(), [{
+            'id': self.event.id, 'title': 'Bangalore Meetup', 'latitude': 12.9716, 'longitude': 77.5946,
+        }])
+
+    def test_include_subsections(self):
+        response = self.client.get(reverse('event_list_api'), {'fields': 'title', 'include': 'subsections'})
+        event = response.json()[0]
+        self.assertEqual(set(event), {'id', 'title', 'subsections'})
+        self.assertEqual(event['subsections'][0]['name'], 'Main Stage')
+
+    def test_nearby_fields(self):
+        response = self.client.get(reverse('nearby_events_api'), {
+            'lat': 12.97, 'lon': 77.59, 'fields': 'title',
+        })
+        self.assertEqual(set(response.json()[0]), {'id', 'title', 'distance'})
+
+    def test_detail_endpoint(self):
+        response = self.client.get(reverse('event_detail_api', args=[self.event.id]))
+        event = response.json()
+        self.assertEqual(set(event), set(EVENT_FIELDS) | {'subsections'})
+        self.assertEqual(len(event['boundary_coordinates']), 3)
+        self.assertEqual(len(event['subsections']), 1)
+
+        response = self.client.get(reverse('event_detail_api', args=[self.event.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('event_list_api'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BoundarySimplificationTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        # A hand-drawn looking ring of 400 vertices, roughly 1km across
+        self.ring = [
+            [12.97 + 0.005 * sin(2 * pi * i / 400), 77.59 + 0.005 * cos(2 * pi * i / 400)]
+            for i in range(400)
+        ]
+        self.ring.append(self.ring[0])
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Bangalore',
+            boundary_coordinates=self.ring, organizer=self.organizer,
+        )
+        EventSubsection.objects.create(event=self.event, name='Main Stage', boundary_coordinates=self.ring)
+
+    def test_tiers_are_computed_on_save(self):
+        tiers = self.event.boundary_lod
+        self.assertEqual(set(tiers), {f'z{zoom}' for zoom in geometry.LOD_ZOOMS})
+        sizes = [len(tiers[f'z{zoom}']) for zoom in geometry.LOD_ZOOMS]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertLess(sizes[0], 50)
+        self.assertGreaterEqual(sizes[0], 4)
+        self.assertEqual(tiers['z12'][0], tiers['z12'][-1])
+
+    def test_partial_save_keeps_tiers(self):
+        stage = self.event.subsections.get()
+        with patch('events.models.simplify_tiers', return_value=None) as simplify:
+            self.event.latitude = 12.971
+            self.event.save(update_fields=['latitude'])
+            stage.name = 'Big Stage'
+            stage.save(update_fields=['name'])
+            simplify.assert_not_called()
+            stage.save(update_fields=['boundary_coordinates', 'boundary_lod'])
+            simplify.assert_called_once_with(self.ring)
+
+    def test_api_returns_tier_for_zoom(self):
+        response = self.client.get(reverse('event_list_api'), {'zoom': 12})
+        event = response.json()[0]
+        self.assertEqual(event['boundary_coordinates'], self.event.boundary_lod['z12'])
+        self.assertEqual(len(event['subsections'][0]['boundary_coordinates']), len(self.event.boundary_lod['z12']))
+
+        event = self.client.get(reverse('event_list_api'), {'zoom': 18}).json()[0]
+        self.assertEqual(len(event['boundary_coordinates']), len(self.ring))
+
+    def test_simplify_keeps_small_polygons(self):
+        triangle = [[0, 0], [0, 1], [1, 1]]
+        self.assertEqual(geometry.simplify_polygon(triangle, 10), triangle)
+        self.assertIsNone(geometry.simplify_tiers('not a polygon'))
+
+
+class EncodedGeometryTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.boundary = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453], [38.5, -120.2]]
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=40.0, longitude=-121.0, location_name='California',
+            boundary_coordinates=self.boundary, organizer=self.organizer,
+        )
+        EventSubsection.objects.create(event=self.event, name='Main Stage', boundary_coordinates=self.boundary)
+
+    def test_polyline_round_trip(self):
+        # Reference value from the Google encoded polyline documentation
+        self.assertEqual(geometry.encode_polyline(self.boundary[:3]), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(geometry.decode_polyline(geometry.encode_polyline(self.boundary)), self.boundary)
+
+    def test_api_polyline_format(self):
+        response = self.client.get(reverse('event_list_api'), {'format': 'polyline'})
+        event = response.json()[0]
+        self.assertEqual(geometry.decode_polyline(event['boundary_coordinates']), self.boundary)
+        self.assertEqual(geometry.decode_polyline(event['subsections'][0]['boundary_coordinates']), self.boundary)
+
+        response = self.client.get(reverse('event_detail_api', args=[self.event.id]), {'format': 'polyline', 'zoom': 12})
+        self.assertEqual(response.json()['boundary_coordinates'], self.event.boundary_encoded['z12'])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('event_list_api'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TileApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.9716, longitude=77.5946, location_name='Bangalore',
+            boundary_coordinates=[[12.970, 77.593], [12.973, 77.593], [12.973, 77.596], [12.970, 77.596]],
+            organizer=self.organizer,
+        )
+        self.stage = EventSubsection.objects.create(
+            event=self.event, name='Main Stage', color='#ff0000',
+            boundary_coordinates=[[12.971, 77.594], [12.972, 77.594], [12.972, 77.595]],
+        )
+
+    def get_tile(self, z, lat=12.9716, lon=77.5946):
+        x, y = tiles.tile_for(lat, lon, z)
+        response = self.client.get(reverse('tile_api', args=[z, x, y]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_low_zoom_tile_has_clusters(self):
+        tile = self.get_tile(5)
+        self.assertEqual([cluster[2] for cluster in tile['clusters']], [1])
+        self.assertNotIn('polygons', tile)
+
+    def test_high_zoom_tile_has_markers_and_clipped_polygons(self):
+        tile = self.get_tile(15)
+        self.assertEqual([marker[0] for marker in tile['events']], [self.event.id])
+        self.assertEqual({polygon.get('subsection') for polygon in tile['polygons']}, {None, self.stage.id})
+        for polygon in tile['polygons']:
+            coordinates = polygon['ring']
+            self.assertTrue(all(-tiles.TILE_BUFFER <= value <= tiles.TILE_EXTENT + tiles.TILE_BUFFER for value in coordinates))
+
+    def test_save_invalidates_touched_tiles_only(self):
+        x, y = tiles.tile_for(12.9716, 77.5946, 15)
+        far_x, far_y = tiles.tile_for(28.61, 77.21, 15)
+        self.get_tile(15)
+        self.get_tile(15, 28.61, 77.21)
+        self.assertIsNotNone(cache.get(tiles.tile_key(15, far_x, far_y)))
+
+        self.stage.color = '#00ff00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stage.save()
+            # Tiles rendered before the commit would still show the old color
+            self.assertIsNotNone(cache.get(tiles.tile_key(15, x, y)))
+        self.assertIsNone(cache.get(tiles.tile_key(15, x, y)))
+        self.assertIsNotNone(cache.get(tiles.tile_key(15, far_x, far_y)))
+        colors = {polygon.get('color') for polygon in self.get_tile(15)['polygons']}
+        self.assertIn('#00ff00', colors)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        self.assertEqual(self.get_tile(15)['events'], [])
+
+    def test_clip_ring(self):
+        square = [[0, 0], [0, 2], [2, 2], [2, 0]]
+        clipped = tiles.clip_ring(square, 1, 1, 3, 3)
+        self.assertEqual(sorted(map(tuple, clipped)), [(1, 1), (1, 2), (2, 1), (2, 2)])
+
+    def test_out_of_range_tile(self):
+        response = self.client.get(reverse('tile_api', args=[3, 8, 0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_large_change_invalidates_whole_zoom_level(self):
+        x, y = tiles.tile_for(12.9716, 77.5946, 15)
+        self.get_tile(15)
+        key = tiles.tile_key(15, x, y)
+        self.assertIsNotNone(cache.get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.create(
+                title='City Marathon', description='', date=timezone.now(),
+                latitude=30.0, longitude=70.0, location_name='Somewhere',
+                boundary_coordinates=[[29.5, 69.5], [30.5, 69.5], [30.5, 70.5]],
+                organizer=self.organizer,
+            )
+        self.assertNotEqual(tiles.tile_key(15, x, y), key)
+        self.assertIsNone(cache.get(tiles.tile_key(15, x, y)))
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.music = Category.objects.create(name='Music')
+        for title, description, location, category in [
+            ('Jazz Night', 'Live jazz by the river', 'Riverside Park', self.music),
+            ('Food Festival', 'Street food and live music', 'Jazzland Square', None),
+            ('Book Fair', 'Authors and publishers', 'City Library', None),
+        ]:
+            Event.objects.create(
+                title=title, description=description, date=timezone.now(),
+                latitude=12.97, longitude=77.59, location_name=location,
+                category=category, organizer=organizer,
+            )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('event_list_api'), dict(params, search=query))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Rock & Roll: rock ON!'), ['rock', 'roll', 'on'])
+        self.assertEqual(search.tokenize(''), [])
+
+    def test_prefix_match_ranked_by_field(self):
+        titles = [event['title'] for event in self.search('jaz')]
+        # Title matches outrank location matches
+        self.assertEqual(titles, ['Jazz Night', 'Food Festival'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual([event['title'] for event in self.search('live riv')], ['Jazz Night'])
+        self.assertEqual(self.search('jazz library'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_category_search(self):
+        self.assertEqual([event['title'] for event in self.search('MUSIC')], ['Jazz Night', 'Food Festival'])
+
+    def test_index_follows_changes(self):
+        event = Event.objects.get(title='Book Fair')
+        event.title = 'Poetry Slam'
+        with self.captureOnCommitCallbacks(execute=True):
+            event.save()
+        self.assertEqual(self.search('book'), [])
+        self.assertEqual([e['title'] for e in self.search('poetry')], ['Poetry Slam'])
+
+        self.music.name = 'Concerts'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.music.save()
+        self.assertEqual([e['title'] for e in self.search('concerts')], ['Jazz Night'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.music.delete()
+        self.assertEqual(self.search('concerts'), [])
+
+    def test_rebuild_matches_incremental_index(self):
+        indexed = sorted(SearchToken.objects.values_list('event_id', 'token', 'weight'))
+        search.rebuild(batch_size=2)
+        self.assertEqual(sorted(SearchToken.objects.values_list('event_id', 'token', 'weight')), indexed)
+
+    def test_paginated_search_keeps_rank_order(self):
+        # Events with their ranks, then subsections
+        with self.assertNumQueries(2):
+            page = self.search('jaz', limit=1)
+        self.assertEqual([event['title'] for event in page['results']], ['Jazz Night'])
+        page = self.client.get(page['next']).json()
+        self.assertEqual([event['title'] for event in page['results']], ['Food Festival'])
+        self.assertIsNone(page['next'])
+
+class EventSuggestTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.music = Category.objects.create(name='Music')
+        for title, location in [
+            ('Jazz Night', 'Riverside Park'),
+            ('Jazz Night', 'City Hall'),
+            ('Late Night Jazz', 'Jazzland Square'),
+            ('Book Fair', 'City Library'),
+        ]:
+            Event.objects.create(
+                title=title, description='', date=timezone.now(),
+                latitude=12.97, longitude=77.59, location_name=location,
+                category=self.music, organizer=self.organizer,
+            )
+        suggest.index.build()
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse('event_suggest_api'), dict(params, q=query))
+        self.assertEqual(response.status_code, 200)
+        return [(item['text'], item['type']) for item in response.json()['suggestions']]
+
+    def test_prefix_suggestions(self):
+        self.assertEqual(self.suggest('jaz'), [
+            ('Jazz Night', 'event'),
+            ('Jazzland Square', 'location'),
+            ('Late Night Jazz', 'event'),
+        ])
+        self.assertEqual(self.suggest('NIGHT', limit=1), [('Jazz Night', 'event')])
+        self.assertEqual(self.suggest('city l'), [('City Library', 'location')])
+        self.assertEqual(self.suggest('mus'), [('Music', 'category')])
+        self.assertEqual(self.suggest('  '), [])
+
+    def test_invalid_limit(self):
+        for limit in ['0', '100', 'x']:
+            response = self.client.get(reverse('event_suggest_api'), {'q': 'jaz', 'limit': limit})
+            self.assertEqual(response.status_code, 400)
+
+    def test_suggestions_follow_changes(self):
+        event = Event.objects.get(title='Book Fair')
+        event.title = 'Comic Con'
+        event.save()
+        self.assertEqual(self.suggest('book'), [])
+        self.assertEqual(self.suggest('com'), [('Comic Con', 'event')])
+
+        Event.objects.filter(title='Jazz Night').first().delete()
+        self.assertIn(('Jazz Night', 'event'), self.suggest('jazz'))
+        Event.objects.get(title='Jazz Night').delete()
+        self.assertNotIn(('Jazz Night', 'event'), self.suggest('jazz'))
+
+        self.music.name = 'Concerts'
+        self.music.save()
+        self.assertEqual(self.suggest('con'), [('Concerts', 'category'), ('Comic Con', 'event')])
+        self.music.delete()
+        self.assertEqual(self.suggest('conc'), [])
+
+    def test_matches_rebuilt_index(self):
+        Event.objects.create(
+            title='Food Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Jazzland Square', organizer=self.organizer,
+        )
+        incremental = self.suggest('j')
+        suggest.index.build()
+        self.assertEqual(self.suggest('j'), incremental)
+
+    def test_stale_index_rebuilt_by_one_caller(self):
+        Event.objects.filter(title='Book Fair').update(title='Comic Con')
+        suggest.index.built_at -= suggest.SUGGEST_MAX_AGE + 1
+        # While another request rebuilds, the current copy answers without queries
+        with suggest.index._building:
+            with self.assertNumQueries(0):
+                self.assertEqual(suggest.suggest('book'), [{'text': 'Book Fair', 'type': 'event'}])
+        self.assertEqual(suggest.suggest('book'), [])
+        self.assertFalse(suggest.index.is_stale())
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.category = Category.objects.create(name='Music')
+        self.event = Event.objects.create(
+            title='Jazz Night', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Riverside Park',
+            category=self.category, organizer=organizer,
+            boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+        )
+        self.stage = EventSubsection.objects.create(
+            event=self.event, name='Main Stage',
+            boundary_coordinates=[[12.97, 77.59], [12.975, 77.59], [12.97, 77.595]],
+        )
+        self.url = reverse('event_list_api')
+
+    def test_repeated_request_skips_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_entries_expire(self):
+        # Other processes' writes only show once entries expire when the cache isn't shared
+        with patch.object(response_cache, 'RESPONSE_CACHE_TTL', -1):
+            self.client.get(self.url)
+            Event.objects.filter(pk=self.event.pk).update(title='Blues Night')
+            self.assertEqual(self.client.get(self.url).json()[0]['title'], 'Blues Night')
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_writes_invalidate(self):
+        detail_url = reverse('event_detail_api', args=[self.event.id])
+        now = timezone.now()
+        for change in [
+            lambda: Event.objects.get(pk=self.event.pk).save(),
+            lambda: self.stage.save(),
+            lambda: StageEvent.objects.create(
+                subsection=self.stage, title='Opening Act',
+                start_time=now - timezone.timedelta(minutes=5), end_time=now + timezone.timedelta(hours=1),
+            ),
+            lambda: self.category.save(),
+        ]:
+            self.client.get(detail_url)
+            version = response_cache.get_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+                # Until the write commits other requests must not cache its rows under a new version
+                self.assertEqual(response_cache.get_version(), version)
+            self.assertNotEqual(response_cache.get_version(), version)
+            with self.assertNumQueries(2):
+                self.client.get(detail_url)
+
+    def test_stage_details_follow_schedule(self):
+        url = reverse('stage_details_api', args=[self.stage.id])
+        etag = self.client.get(url)['ETag']
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            StageEvent.objects.create(
+                subsection=self.stage, title='Opening Act',
+                start_time=now - timezone.timedelta(minutes=5), end_time=now + timezone.timedelta(hours=1),
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['live_event']['title'], 'Opening Act')
+
+    def test_escaped_query_is_a_different_key(self):
+        Event.objects.create(
+            title='Rock Night', description='', date=timezone.now(), latitude=12.97, longitude=77.59,
+            location_name='Riverside Park', category=self.category, organizer=self.event.organizer,
+        )
+        self.assertEqual(self.client.get(f'{self.url}?search=rock%26zoom%3D3').json(), [])
+        self.assertEqual(len(self.client.get(f'{self.url}?search=rock&zoom=3').json()), 1)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get(self.url, {'zoom': 'x'}).status_code, 400)
+        self.assertEqual(len([key for key in response_cache.responses._entries if 'zoom=x' in key]), 0)
+
+    def test_lru_limits(self):
+        lru = response_cache.LRUCache(max_entries=2, max_bytes=10)
+        lru.set('a', (b'1234',))
+        lru.set('b', (b'1234',))
+        lru.get('a')
+        lru.set('c', (b'12',))
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+        lru.set('d', (b'123456',))
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.size, 8)
+        lru.set('e', (b'x' * 11,))
+        self.assertIsNone(lru.get('e'))
+
+class RequestCoalescingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def render(self, entry=('body',)):
+        self.calls += 1
+        self.release.wait(5)
+        return entry, 'response'
+
+    def run_concurrently(self, render, count=8):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(response_cache.single_flight('key', render)))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_render_once(self):
+        results = self.run_concurrently(self.render)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([entry for entry, _ in results], [('body',)] * 8)
+        self.assertEqual([response for _, response in results].count('response'), 1)
+        self.assertEqual(response_cache._flights, {})
+
+    def test_unshareable_responses_are_rendered_by_each_request(self):
+        results = self.run_concurrently(lambda: self.render(entry=None), count=3)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(results, [(None, 'response')] * 3)
+
+    @override_settings(EVENTS_SHARED_COALESCING=True)
+    def test_waits_for_other_process(self):
+        digest = response_cache.hashlib.sha1(b'key').hexdigest()
+        # Another process holds the lock and publishes its result shortly
+        cache.add(f'events:flight:{digest}', 1)
+        timer = threading.Timer(0.1, cache.set, (f'events:flight-result:{digest}', ('shared',)))
+        timer.start()
+        self.release.set()
+        self.assertEqual(response_cache.single_flight('key', self.render), (('shared',), None))
+        self.assertEqual(self.calls, 0)
+        timer.join()
+
+    @override_settings(EVENTS_SHARED_COALESCING=True)
+    def test_shared_lock_is_released(self):
+        self.release.set()
+        self.assertEqual(response_cache.single_flight('key', self.render), (('body',), 'response'))
+        digest = response_cache.hashlib.sha1(b'key').hexdigest()
+        self.assertIsNone(cache.get(f'events:flight:{digest}'))
+        self.assertEqual(cache.get(f'events:flight-result:{digest}'), ('body',))
+
+class StageLiveBoardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=organizer,
+        )
+        now = timezone.now()
+        hour = timezone.timedelta(hours=1)
+        self.stages = []
+        for i in range(30):
+            stage = EventSubsection.objects.create(
+                event=self.event, name=f'Stage {i}',
+                boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+            )
+            self.stages.append(stage)
+            if i % 3 == 0:
+                StageEvent.objects.create(subsection=stage, title=f'Live {i}', start_time=now - hour, end_time=now + hour)
+            for j in range(i % 4):
+                StageEvent.objects.create(
+                    subsection=stage, title=f'Next {i}.{j}',
+                    start_time=now + (j + 2) * hour, end_time=now + (j + 3) * hour,
+                )
+
+    def test_board_matches_stage_details(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('event_stages_live_api', args=[self.event.id]))
+        self.assertEqual(response.status_code, 200)
+        board = response.json()
+        self.assertEqual(board['event'], self.event.id)
+        self.assertEqual(len(board['stages']), 30)
+        for stage, status in zip(self.stages, board['stages']):
+            details = self.client.get(reverse('stage_details_api', args=[stage.id])).json()
+            self.assertEqual(status, details)
+        self.assertEqual(board['stages'][3]['live_event']['title'], 'Live 3')
+        self.assertEqual(board['stages'][3]['next_event']['title'], 'Next 3.0')
+        self.assertEqual(board['stages'][3]['upcoming_count'], 3)
+        self.assertIsNone(board['stages'][4]['live_event'])
+
+    def test_unknown_event(self):
+        response = self.client.get(reverse('event_stages_live_api', args=[self.event.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=organizer,
+        )
+        self.stages = [
+            EventSubsection.objects.create(
+                event=self.event, name=name,
+                boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+            )
+            for name in ('Main Stage', 'Tent')
+        ]
+
+    def add_act(self, stage, title, starts_in, ends_in):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            StageEvent.objects.create(
+                subsection=stage, title=title,
+                start_time=now + timezone.timedelta(seconds=starts_in),
+                end_time=now + timezone.timedelta(seconds=ends_in),
+            )
+
+    async def read(self, messages):
+        message = (await asyncio.wait_for(anext(messages), 5)).decode()
+        event, data = message.strip().split('\n')
+        return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_event_stream_pushes_saved_acts(self):
+        response = await self.async_client.get(reverse('event_live_stream', args=[self.event.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = aiter(response.streaming_content)
+        event, board = await self.read(messages)
+        self.assertEqual(event, 'status')
+        self.assertEqual([stage['live_event'] for stage in board], [None, None])
+
+        await sync_to_async(self.add_act)(self.stages[1], 'Opening Act', -60, 3600)
+        event, stage = await self.read(messages)
+        self.assertEqual((event, stage['name'], stage['live_event']['title']), ('live', 'Tent', 'Opening Act'))
+
+    async def test_stage_stream_follows_schedule_boundaries(self):
+        await sync_to_async(self.add_act)(self.stages[0], 'Headliner', 0.3, 3600)
+        response = await self.async_client.get(reverse('stage_live_stream', args=[self.stages[0].id]))
+        messages = aiter(response.streaming_content)
+        event, stage = await self.read(messages)
+        self.assertEqual(event, 'status')
+        self.assertIsNone(stage['live_event'])
+        self.assertEqual(stage['next_event']['title'], 'Headliner')
+
+        # Pushed by the timer once the act starts, without any write
+        self.assertEqual((await self.read(messages))[0], 'live')
+        event, stage = await self.read(messages)
+        self.assertEqual(event, 'next')
+        self.assertEqual((stage['live_event']['title'], stage['next_event']), ('Headliner', None))
+
+    async def test_failed_refresh_is_retried(self):
+        calls = []
+
+        def flaky_board(event_id):
+            calls.append(event_id)
+            if len(calls) == 1:
+                raise OperationalError('database is unavailable')
+            return live_board(event_id)
+
+        with patch.object(live, 'live_board', flaky_board), patch.object(live, 'REFRESH_INTERVAL', 0.2), \
+                self.assertLogs('events.live', 'ERROR'):
+            response = await self.async_client.get(reverse('event_live_stream', args=[self.event.id]))
+            event, board = await self.read(aiter(response.streaming_content))
+        self.assertEqual((event, len(board)), ('status', 2))
+        self.assertEqual(calls, [self.event.id, self.event.id])
+
+    async def test_unknown_stream(self):
+        response = await self.async_client.get(reverse('stage_live_stream', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+class ScheduleIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=organizer,
+        )
+        self.stage = EventSubsection.objects.create(
+            event=event, name='Main Stage',
+            boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+        )
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def at(self, minutes):
+        return self.now + timezone.timedelta(minutes=minutes)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        slots = []
+        for i in range(300):
+            start = rng.randint(0, 1000)
+            slots.append(schedule.Slot(i, f'Act {i}', start, start + rng.randint(1, 60)))
+        index = schedule.ScheduleIndex(slots)
+        for _ in range(300):
+            t = rng.randint(-10, 1100)
+            self.assertEqual(
+                [slot.id for slot in index.live_at(t)],
+                [slot.id for slot in sorted(slots, key=lambda s: (s.start_time, s.id)) if slot.start_time <= t <= slot.end_time],
+            )
+            upcoming = sorted((slot for slot in slots if slot.start_time > t), key=lambda s: (s.start_time, s.id))
+            self.assertEqual(index.next_after(t), upcoming[0] if upcoming else None)
+            self.assertEqual(index.count_after(t), len(upcoming))
+            end = t + rng.randint(1, 30)
+            exclude = rng.randrange(300)
+            self.assertEqual(
+                {slot.id for slot in index.overlapping(t, end, exclude=exclude)},
+                {slot.id for slot in slots if slot.start_time < end and slot.end_time > t and slot.id != exclude},
+            )
+
+    def test_index_is_cached_until_schedule_changes(self):
+        StageEvent.objects.create(subsection=self.stage, title='Opener', start_time=self.at(-30), end_time=self.at(30))
+        index = schedule.schedule_index(self.stage.id)
+        with self.assertNumQueries(0):
+            self.assertIs(schedule.schedule_index(self.stage.id), index)
+        act = StageEvent.objects.create(subsection=self.stage, title='Headliner', start_time=self.at(60), end_time=self.at(120))
+        index = schedule.schedule_index(self.stage.id)
+        self.assertEqual(index.next_after(self.now).title, 'Headliner')
+        act.delete()
+        self.assertIsNone(schedule.schedule_index(self.stage.id).next_after(self.now))
+
+    def test_stage_details_use_index(self):
+        StageEvent.objects.create(subsection=self.stage, title='Opener', start_time=self.at(-30), end_time=self.at(30))
+        StageEvent.objects.create(subsection=self.stage, title='Headliner', start_time=self.at(60), end_time=self.at(120))
+        schedule.schedule_index(self.stage.id)
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('stage_details_api', args=[self.stage.id])).json()
+        self.assertEqual(data['live_event']['title'], 'Opener')
+        self.assertEqual(data['next_event']['title'], 'Headliner')
+        self.assertEqual(data['upcoming_count'], 1)
+
+    def test_form_overlap_check(self):
+        from .forms import StageEventForm
+        act = StageEvent.objects.create(subsection=self.stage, title='Opener', start_time=self.at(0), end_time=self.at(60))
+
+        def form(start, end, instance=None):
+            fmt = '%Y-%m-%dT%H:%M'
+            return StageEventForm(
+                {
+                    'title': 'Act',
+                    'start_time': timezone.localtime(self.at(start)).strftime(fmt),
+                    'end_time': timezone.localtime(self.at(end)).strftime(fmt),
+                },
+                subsection=self.stage, instance=instance,
+            )
+
+        self.assertFalse(form(30, 90).is_valid())
+        self.assertTrue(form(60, 90).is_valid())
+        self.assertTrue(form(10, 50, instance=act).is_valid())
+
+        # Writes are checked against the database, not a stale cached index
+        schedule.schedule_index(self.stage.id)
+        StageEvent.objects.bulk_create([StageEvent(subsection=self.stage, title='Closer', start_time=self.at(120), end_time=self.at(180))])
+        self.assertFalse(form(150, 200).is_valid())
+
+class ScheduleImportTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.organizer.userprofile.role = 'ORGANIZER'
+        self.organizer.userprofile.save()
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=self.organizer,
+        )
+        self.stages = [
+            EventSubsection.objects.create(
+                event=self.event, name=name,
+                boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+            )
+            for name in ('Main Stage', 'Tent', 'Dome')
+        ]
+
+    def festival_csv(self, slots):
+        lines = ['stage,title,start,end,description']
+        start = timezone.datetime(2026, 7, 1, 12, 0)
+        for i in range(slots):
+            slot_start = start + timezone.timedelta(minutes=30 * (i // 3))
+            slot_end = slot_start + timezone.timedelta(minutes=30)
+            lines.append(f'{self.stages[i % 3].name},Act {i},{slot_start.isoformat()},{slot_end.isoformat()},')
+        return '\n'.join(lines)
+
+    def test_bulk_csv_import(self):
+        rows = schedule_import.parse_schedule(self.festival_csv(2000), 'lineup.csv')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            created = schedule_import.import_schedule(self.event, rows)
+            version = schedule.schedule_version(self.stages[1].id)
+        # Stage versions move again once the acts are committed
+        self.assertGreater(schedule.schedule_version(self.stages[1].id), version)
+        # Batched inserts, not a query per row
+        self.assertLess(len(queries), 30)
+        self.assertEqual(len(created), 2000)
+        self.assertEqual(StageEvent.objects.filter(subsection=self.stages[0]).count(), 667)
+        # Indexes and cached responses see the new acts despite bulk_create sending no signals
+        self.assertEqual(len(schedule.schedule_index(self.stages[1].id)), 667)
+
+    def test_csv_row_with_extra_fields(self):
+        text = 'stage,title,start,end\nTent,Act,2026-07-01T12:00,2026-07-01T13:00,surplus\n'
+        with self.assertRaises(schedule_import.ScheduleImportError) as raised:
+            schedule_import.parse_csv(text)
+        self.assertEqual(raised.exception.errors, ['Line 2: more fields than columns'])
+
+    def test_title_too_long(self):
+        text = f'stage,title,start,end\nTent,{"x" * 201},2026-07-01T12:00,2026-07-01T13:00\n'
+        with self.assertRaises(schedule_import.ScheduleImportError) as raised:
+            schedule_import.import_schedule(self.event, schedule_import.parse_csv(text))
+        self.assertEqual(raised.exception.errors, ['Line 2: title is longer than 200 characters'])
+
+    def test_overlaps_are_reported_together(self):
+        StageEvent.objects.create(
+            subsection=self.stages[0], title='Opener',
+            start_time=timezone.make_aware(timezone.datetime(2026, 7, 1, 11, 0)),
+            end_time=timezone.make_aware(timezone.datetime(2026, 7, 1, 12, 15)),
+        )
+        text = '\n'.join([
+            'stage,title,start,end',
+            'main stage,First,2026-07-01T12:00,2026-07-01T13:00',
+            'Tent,Second,2026-07-01T12:00,2026-07-01T13:00',
+            'Tent,Third,2026-07-01T12:30,2026-07-01T13:30',
+            'Tent,Fourth,2026-07-01T13:30,2026-07-01T14:00',
+            'Attic,Fifth,2026-07-01T12:00,2026-07-01T13:00',
+            'Dome,Sixth,2026-07-01T13:00,2026-07-01T12:00',
+        ])
+        with self.assertRaises(schedule_import.ScheduleImportError) as raised:
+            schedule_import.import_schedule(self.event, schedule_import.parse_csv(text))
+        self.assertEqual(raised.exception.errors, [
+            'Line 2: overlaps "Opener" already scheduled on Main Stage',
+            'Line 4: overlaps line 3 on Tent',
+            'Line 6: unknown stage "Attic"',
+            'Line 7: end time must be after start time',
+        ])
+        self.assertEqual(StageEvent.objects.count(), 1)
+
+    def test_ics_import(self):
+        text = '\r\n'.join([
+            'BEGIN:VCALENDAR',
+            'BEGIN:VEVENT',
+            'SUMMARY:Sunset Set\\, Part 1',
+            'LOCATION:Dome',
+            'DTSTART:20260701T180000Z',
+            'DTEND:20260701T190000Z',
+            'DESCRIPTION:Long description that is folded',
+            '  across two lines',
+            'END:VEVENT',
+            'BEGIN:VEVENT',
+            'SUMMARY:Night Set',
+            'LOCATION:Dome',
+            'DTSTART;TZID=Europe/Berlin:20260701T230000',
+            'DTEND;TZID=Europe/Berlin:20260702T000000',
+            'END:VEVENT',
+            'END:VCALENDAR',
+        ])
+        schedule_import.import_schedule(self.event, schedule_import.parse_schedule(text))
+        first, second = StageEvent.objects.filter(subsection=self.stages[2]).order_by('start_time')
+        self.assertEqual(first.title, 'Sunset Set, Part 1')
+        self.assertEqual(first.description, 'Long description that is folded across two lines')
+        self.assertEqual(second.start_time, timezone.datetime(2026, 7, 1, 21, 0, tzinfo=dt_timezone.utc))
+
+    def test_import_view(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.login(username='organizer', password='testpassword123')
+        url = reverse('import_event_schedule', args=[self.event.id])
+        upload = SimpleUploadedFile('lineup.csv', self.festival_csv(30).encode())
+        response = self.client.post(url, {'schedule_file': upload})
+        self.assertRedirects(response, reverse('manage_event_stages', args=[self.event.id]))
+        self.assertEqual(StageEvent.objects.count(), 30)
+
+        upload = SimpleUploadedFile('lineup.csv', self.festival_csv(3).encode())
+        response = self.client.post(url, {'schedule_file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'overlaps')
+        self.assertEqual(StageEvent.objects.count(), 30)
+
+class ScheduleFeedTests(TestCase):
+    def setUp(self):
+        organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=organizer,
+        )
+        self.stages = [
+            EventSubsection.objects.create(
+                event=self.event, name=name,
+                boundary_coordinates=[[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]],
+            )
+            for name in ('Main Stage', 'Tent')
+        ]
+        start = timezone.make_aware(timezone.datetime(2026, 7, 1, 18, 0))
+        for i, stage in enumerate(self.stages * 2):
+            StageEvent.objects.create(
+                subsection=stage, title=f'Act {i}, live', description='A long description; ' * 5 if i == 0 else '',
+                start_time=start + timezone.timedelta(hours=i), end_time=start + timezone.timedelta(hours=i, minutes=45),
+            )
+
+    def get_feed(self, url, **headers):
+        response = self.client.get(url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content.decode()
+
+    def test_feed_round_trips_through_import(self):
+        response, body = self.get_feed(reverse('event_schedule_ics', args=[self.event.id]))
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+        rows = schedule_import.parse_ics(body)
+        self.assertEqual(
+            [(row.stage, row.title, row.description, row.start_time) for row in rows],
+            list(StageEvent.objects.order_by('start_time').values_list('subsection__name', 'title', 'description', 'start_time')),
+        )
+        _, stage_body = self.get_feed(reverse('stage_schedule_ics', args=[self.stages[1].id]))
+        self.assertEqual([row.title for row in schedule_import.parse_ics(stage_body)], ['Act 1, live', 'Act 3, live'])
+
+    def test_conditional_requests_and_cache(self):
+        url = reverse('stage_schedule_ics', args=[self.stages[0].id])
+        response, body = self.get_feed(url)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            cached, cached_body = self.get_feed(url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached_body, body)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=cached['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        StageEvent.objects.filter(subsection=self.stages[0]).first().delete()
+        response, body = self.get_feed(url, HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+
+    def test_event_feed_follows_stage_changes(self):
+        url = reverse('event_schedule_ics', args=[self.event.id])
+        etag = self.client.get(url)['ETag']
+        self.stages[1].delete()
+        response, body = self.get_feed(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Tent', body)
+
+    def test_stage_feed_follows_event_title(self):
+        url = reverse('stage_schedule_ics', args=[self.stages[0].id])
+        etag = self.client.get(url)['ETag']
+        self.event.title = 'Summer Festival'
+        self.event.save()
+        response, body = self.get_feed(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-WR-CALNAME:Summer Festival - Main Stage', body)
+
+class SubsectionDiffTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.organizer.userprofile.role = 'ORGANIZER'
+        self.organizer.userprofile.save()
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=self.organizer,
+        )
+        self.boundary = [[12.97, 77.59], [12.98, 77.59], [12.97, 77.60]]
+        self.stages = [
+            EventSubsection.objects.create(event=self.event, name=name, boundary_coordinates=self.boundary, color='#ef4444')
+            for name in ('Main Stage', 'Tent', 'Dome')
+        ]
+        start = timezone.now()
+        for stage in self.stages:
+            StageEvent.objects.create(subsection=stage, title='Act', start_time=start, end_time=start + timezone.timedelta(hours=1))
+
+    def submitted(self):
+        return json.loads(self.client.get(reverse('edit_event', args=[self.event.id])).context['existing_subsections_json'])
+
+    def post(self, subsections, version=None, status_code=302):
+        self.client.login(username='organizer', password='testpassword123')
+        response = self.client.post(reverse('edit_event', args=[self.event.id]), {
+            'title': 'Festival', 'description': 'Music', 'date': '2026-07-01T18:00', 'location_name': 'Park',
+            'latitude': 12.97, 'longitude': 77.59, 'subsections_data': json.dumps(subsections),
+            'version': version or Event.objects.get(pk=self.event.pk).version,
+        })
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_stale_form_is_refused(self):
+        self.client.login(username='organizer', password='testpassword123')
+        response = self.client.get(reverse('edit_event', args=[self.event.id]))
+        self.assertContains(response, 'name="version" value="1"')
+        subsections = self.submitted()
+        # A patch made from another tab in the meantime
+        response = self.client.patch(
+            reverse('event_patch_api', args=[self.event.id]),
+            json.dumps({'version': 1, 'subsections': [{'id': self.stages[1].id, 'name': 'Big Tent'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        del subsections[1]
+        response = self.post(subsections, version=1, status_code=200)
+        self.assertContains(response, 'Event was changed by someone else')
+        self.assertEqual(list(self.event.subsections.values_list('name', flat=True)), ['Main Stage', 'Big Tent', 'Dome'])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, 2)
+
+    def test_rename_keeps_schedule(self):
+        self.client.login(username='organizer', password='testpassword123')
+        subsections = self.submitted()
+        self.assertEqual([item['id'] for item in subsections], [stage.id for stage in self.stages])
+        subsections[1]['name'] = 'Big Tent'
+        version = schedule.schedule_version(self.stages[1].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(subsections)
+            # Caches are refreshed once the rows are committed
+            self.assertEqual(schedule.schedule_version(self.stages[1].id), version)
+        self.assertEqual(
+            list(self.event.subsections.values_list('id', 'name')),
+            [(self.stages[0].id, 'Main Stage'), (self.stages[1].id, 'Big Tent'), (self.stages[2].id, 'Dome')],
+        )
+        self.assertEqual(StageEvent.objects.count(), 3)
+        self.assertGreater(schedule.schedule_version(self.stages[1].id), version)
+
+    def test_submit_while_editing_keeps_subsection(self):
+        self.client.login(username='organizer', password='testpassword123')
+        response = self.client.get(reverse('edit_event', args=[self.event.id]))
+        # The form puts a subsection opened with Edit back into the list before posting
+        self.assertContains(response, 'id="event-form"')
+        self.assertContains(response, "getElementById('event-form').addEventListener('submit', restoreEditingSubsection)")
+        subsections = self.submitted()
+        editing = subsections.pop(0)
+        subsections.append(editing)
+        self.post(subsections)
+        self.assertEqual(self.event.subsections.count(), 3)
+        self.assertEqual(StageEvent.objects.filter(subsection=self.stages[0]).count(), 1)
+
+    def test_new_ids_without_returning_inserts(self):
+        from .subsections import apply_subsections
+        subsections = [{'id': stage.id, 'name': stage.name, 'boundary_coordinates': self.boundary, 'color': '#ef4444'} for stage in self.stages]
+        subsections += [{'name': name, 'boundary_coordinates': self.boundary} for name in ('Food Court', 'Kids Area')]
+        # As on MySQL, where bulk_create() leaves the primary keys unset
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                patch.object(schedule, 'bump_schedule_version') as bump, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(apply_subsections(self.event, subsections), (2, 0, 0))
+        new_ids = list(self.event.subsections.filter(name__in=['Food Court', 'Kids Area']).values_list('id', flat=True))
+        self.assertEqual([bumped.args[0] for bumped in bump.call_args_list], new_ids)
+
+    def test_only_changed_rows_are_written(self):
+        self.client.login(username='organizer', password='testpassword123')
+        subsections = self.submitted()
+        subsections[0]['boundary_coordinates'] = [[12.96, 77.58], [12.99, 77.58], [12.96, 77.61]]
+        del subsections[2]
+        subsections.append({'name': 'Food Court', 'description': '', 'boundary_coordinates': self.boundary, 'color': '#3b82f6'})
+        with CaptureQueriesContext(connection) as queries:
+            self.post(subsections)
+        for statement in ('UPDATE "events_eventsubsection"', 'INSERT INTO "events_eventsubsection"', 'DELETE FROM "events_eventsubsection"'):
+            self.assertEqual(sum(query['sql'].startswith(statement) for query in queries), 1, statement)
+
+        stages = list(self.event.subsections.all())
+        self.assertEqual([stage.name for stage in stages], ['Main Stage', 'Tent', 'Food Court'])
+        self.assertEqual(stages[0].id, self.stages[0].id)
+        self.assertEqual(stages[0].bounds_south, 12.96)
+        self.assertEqual(geometry.decode_polyline(stages[0].boundary_encoded['full']), stages[0].boundary_coordinates)
+        self.assertIsNotNone(stages[2].boundary_lod)
+        self.assertEqual(StageEvent.objects.count(), 2)
+
+    def test_ids_of_other_events_are_not_touched(self):
+        other = Event.objects.create(
+            title='Other', description='', date=timezone.now(),
+            latitude=12.97, longitude=77.59, location_name='Park', organizer=self.organizer,
+        )
+        foreign = EventSubsection.objects.create(event=other, name='Theirs', boundary_coordinates=self.boundary)
+        self.client.login(username='organizer', password='testpassword123')
+        subsections = self.submitted()
+        subsections.append({'id': foreign.id, 'name': 'Mine', 'boundary_coordinates': self.boundary, 'color': '#ef4444'})
+        self.post(subsections)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.name, 'Theirs')
+        self.assertEqual(self.event.subsections.count(), 4)
+
+class EventPatchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.organizer.userprofile.role = 'ORGANIZER'
+        self.organizer.userprofile.save()
+        self.boundary = [[12.97, 77.59], [12.98, 77.59], [12.98, 77.60], [12.97, 77.60]]
+        self.event = Event.objects.create(
+            title='Festival', description='', date=timezone.now(), boundary_coordinates=self.boundary,
+            latitude=12.975, longitude=77.595, location_name='Park', organizer=self.organizer,
+        )
+        self.stages = [
+            EventSubsection.objects.create(event=self.event, name=name, boundary_coordinates=self.boundary)
+            for name in ('Main Stage', 'Tent')
+        ]
+        start = timezone.now()
+        StageEvent.objects.create(subsection=self.stages[0], title='Act', start_time=start, end_time=start + timezone.timedelta(hours=1))
+        self.client.login(username='organizer', password='testpassword123')
+
+    def patch(self, data):
+        return self.client.patch(
+            reverse('event_patch_api', args=[self.event.id]), json.dumps(data), content_type='application/json',
+        )
+
+    def test_vertex_edit_writes_only_changed_columns(self):
+        version = self.client.get(reverse('event_detail_api', args=[self.event.id])).json()['version']
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.patch({'version': version, 'subsections': [
+                {'id': self.stages[0].id, 'boundary_vertices': [
+                    {'op': 'replace', 'index': 0, 'point': [12.96, 77.58]},
+                    {'op': 'remove', 'index': 3},
+                ]},
+            ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'version': version + 1, 'created': []})
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE "events_eventsubsection"'))
+        self.assertIn('"boundary_encoded"', update)
+        self.assertNotIn('"name"', update)
+        self.assertFalse(any(query['sql'].startswith('DELETE FROM "events_searchtoken"') for query in queries))
+
+        stage = EventSubsection.objects.get(pk=self.stages[0].pk)
+        self.assertEqual(stage.boundary_coordinates, [[12.96, 77.58], [12.98, 77.59], [12.98, 77.60]])
+        self.assertEqual((stage.bounds_south, stage.bounds_west), (12.96, 77.58))
+        self.assertEqual(stage.scheduled_events.count(), 1)
+        self.assertEqual(self.client.get(reverse('event_detail_api', args=[self.event.id])).json()['version'], version + 1)
+
+    def test_stale_version_is_refused(self):
+        self.assertEqual(self.patch({'version': 1, 'event': {'latitude': 12.976}}).status_code, 200)
+        response = self.patch({'version': 1, 'subsections': [{'id': self.stages[1].id, 'name': 'Big Tent'}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 2)
+        self.assertEqual(EventSubsection.objects.get(pk=self.stages[1].pk).name, 'Tent')
+
+    def test_event_boundary_and_subsection_changes(self):
+        response = self.patch({
+            'version': 1,
+            'event': {'boundary_vertices': [{'op': 'insert', 'index': 4, 'point': [12.965, 77.595]}]},
+            'subsections': [
+                {'id': self.stages[1].id, 'delete': True},
+                {'name': 'Food Court', 'boundary_coordinates': self.boundary, 'color': '#3b82f6'},
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.version, 2)
+        self.assertEqual(self.event.boundary_coordinates[-1], [12.965, 77.595])
+        self.assertEqual(self.event.bounds_south, 12.965)
+        self.assertEqual(
+            list(self.event.subsections.values_list('id', 'name')),
+            [(self.stages[0].id, 'Main Stage'), (response.json()['created'][0], 'Food Court')],
+        )
+
+    def test_invalid_patches_change_nothing(self):
+        for patch in (
+            {'version': 1, 'subsections': [
+                {'id': self.stages[0].id, 'name': 'Renamed'},
+                {'id': self.stages[1].id, 'boundary_vertices': [{'op': 'replace', 'index': 0, 'point': [95, 77.59]}]},
+            ]},
+            {'version': 1, 'subsections': [{'id': self.stages[0].id, 'boundary_vertices': [{'op': 'remove', 'index': 0}] * 2}]},
+            {'version': 1, 'event': {'title': 'Renamed'}},
+            {'version': 1, 'subsections': [{'id': [self.stages[0].id]}]},
+            {'subsections': []},
+        ):
+            response = self.patch(patch)
+            self.assertEqual(response.status_code, 400, patch)
+        self.assertEqual(EventSubsection.objects.get(pk=self.stages[0].pk).name, 'Main Stage')
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, 1)
+
+    def test_other_organizers_are_refused(self):
+        other = User.objects.create_user(username='other', password='testpassword123')
+        other.userprofile.role = 'ORGANIZER'
+        other.userprofile.save()
+        self.client.login(username='other', password='testpassword123')
+        self.assertEqual(self.patch({'version': 1, 'event': {'latitude': 12.976}}).status_code, 403)
+        self.assertEqual(self.client.post(reverse('event_patch_api', args=[self.event.id])).status_code, 405)
+
+class EventIngestTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='organizer', password='testpassword123')
+        self.ring = [[77.59, 12.97], [77.60, 12.97], [77.60, 12.98], [77.59, 12.98], [77.59, 12.97]]
+        self.features = [
+            {'type': 'Feature', 'id': 'fest-1', 'geometry': {'type': 'Polygon', 'coordinates': [self.ring]}, 'properties': {
+                'title': 'Jazz Festival', 'date': '2026-07-01T18:00:00', 'location_name': 'Cubbon Park', 'category': 'Music',
+                'subsections': [
+                    {'name': 'Main Stage', 'geometry': {'type': 'Polygon', 'coordinates': [self.ring]}},
+                    {'name': 'Tent', 'boundary_coordinates': [[12.97, 77.59], [12.975, 77.59], [12.97, 77.595]], 'color': '#3b82f6'},
+                ],
+            }},
+            {'type': 'Feature', 'id': 'meetup-2', 'geometry': {'type': 'Point', 'coordinates': [77.61, 12.95]}, 'properties': {
+                'title': 'Python Meetup', 'date': '2026-07-02T19:00:00+05:30', 'category': 'technology',
+            }},
+        ]
+        Category.objects.create(name='Technology')
+
+    def ingest(self, path, **options):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('ingest_events', path, organizer='organizer', stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def write(self, content, suffix):
+        feed = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with feed:
+            feed.write(content)
+        self.addCleanup(os.remove, feed.name)
+        return feed.name
+
+    def geojson(self):
+        return self.write(json.dumps({'type': 'FeatureCollection', 'name': 'partner', 'features': self.features}), '.geojson')
+
+    def test_backend_without_returned_ids(self):
+        # As on MySQL, where bulk_create() leaves the primary keys unset
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            out, _ = self.ingest(self.geojson())
+        self.assertIn('2 created, 0 updated', out)
+        festival = Event.objects.get(external_id='fest-1')
+        meetup = Event.objects.get(external_id='meetup-2')
+        self.assertEqual(list(festival.subsections.values_list('name', flat=True)), ['Main Stage', 'Tent'])
+        self.assertEqual([event.id for event in search.search_events(Event.objects.all(), 'python')], [meetup.id])
+        self.assertTrue(SearchToken.objects.filter(event=festival).exists())
+
+    def test_features_are_streamed_across_chunks(self):
+        text = json.dumps({'type': 'FeatureCollection', 'bbox': [1.5, 2.25], 'features': self.features}, indent=1)
+        self.assertEqual(list(ingest.iter_features(io.StringIO(text), chunk_size=7)), self.features)
+        self.assertEqual(list(ingest.iter_features(io.StringIO('{"features": []}'), chunk_size=3)), [])
+        with self.assertRaises(ingest.IngestError):
+            list(ingest.iter_features(io.StringIO(text[:-40]), chunk_size=7))
+
+    def test_geojson_upsert(self):
+        out, _ = self.ingest(self.geojson())
+        self.assertIn('2 created, 0 updated, 0 unchanged, 0 invalid', out)
+        festival = Event.objects.get(external_id='fest-1')
+        self.assertEqual(festival.boundary_coordinates, [[12.97, 77.59], [12.97, 77.60], [12.98, 77.60], [12.98, 77.59]])
+        self.assertEqual((round(festival.latitude, 3), round(festival.longitude, 3)), (12.975, 77.595))
+        self.assertEqual(festival.category.name, 'Music')
+        self.assertIsNotNone(festival.boundary_encoded)
+        self.assertEqual(list(festival.subsections.values_list('name', flat=True)), ['Main Stage', 'Tent'])
+        meetup = Event.objects.get(external_id='meetup-2')
+        self.assertEqual((meetup.latitude, meetup.longitude), (12.95, 77.61))
+        self.assertEqual(meetup.category.name, 'Technology')
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(EventCluster.objects.get(zoom=0).count, 2)
+        self.assertEqual([event.id for event in search.search_events(Event.objects.all(), 'jazz')], [festival.id])
+
+        stage = festival.subsections.get(name='Main Stage')
+        start = timezone.now()
+        StageEvent.objects.create(subsection=stage, title='Act', start_time=start, end_time=start + timezone.timedelta(hours=1))
+        self.features[0]['properties']['title'] = 'Jazz & Blues Festival'
+        del self.features[0]['properties']['subsections'][1]
+        out, _ = self.ingest(self.geojson())
+        self.assertIn('0 created, 1 updated, 1 unchanged', out)
+        festival = Event.objects.get(external_id='fest-1')
+        self.assertEqual(festival.title, 'Jazz & Blues Festival')
+        self.assertEqual(festival.version, 2)
+        self.assertEqual(Event.objects.get(external_id='meetup-2').version, 1)
+        self.assertEqual(list(festival.subsections.values_list('id', flat=True)), [stage.id])
+        self.assertEqual(stage.scheduled_events.count(), 1)
+        self.assertEqual([event.id for event in search.search_events(Event.objects.all(), 'blues')], [festival.id])
+        self.assertEqual(EventCluster.objects.get(zoom=0).count, 2)
+
+    def test_csv_with_invalid_rows(self):
+        path = self.write(
+            'id,title,date,latitude,longitude,category,boundary\n'
+            'a,Food Fair,2026-07-03T10:00:00,12.97,77.59,Food,"[[12.97, 77.59], [12.98, 77.59], [12.97, 77.6]]"\n'
+            'b,Broken,not a date,12.97,77.59,,\n'
+            'c,Far Away,2026-07-03T10:00:00,95,77.59,,\n'
+            'a,Food Fair Again,2026-07-03T10:00:00,12.97,77.59,Food,\n',
+            '.csv',
+        )
+        out, err = self.ingest(path, batch_size=2)
+        self.assertIn('4 records', out)
+        self.assertIn('1 created, 0 updated, 0 unchanged, 2 invalid', out)
+        self.assertIn('Line 3: invalid date', err)
+        self.assertIn('Line 4: invalid latitude', err)
+        event = Event.objects.get()
+        self.assertEqual((event.title, event.boundary_coordinates, event.bounds_south), ('Food Fair Again', None, None))
+
+    def test_csv_with_large_boundary(self):
+        boundary = [[12.97 + 0.01 * sin(2 * pi * i / 8000), 77.59 + 0.01 * cos(2 * pi * i / 8000)] for i in range(8000)]
+        self.assertGreater(len(json.dumps(boundary)), 131072)
+        path = self.write(f'id,title,date,latitude,longitude,boundary\na,Fair,2026-07-03T10:00:00,12.97,77.59,"{json.dumps(boundary)}"\n', '.csv')
+        out, _ = self.ingest(path)
+        self.assertIn('1 created', out)
+        self.assertEqual(len(Event.objects.get().boundary_coordinates), 8000)
+        self.addCleanup(csv.field_size_limit, csv.field_size_limit())
+        with patch.object(ingest, 'MAX_FEATURE_BYTES', 1000), self.assertRaisesMessage(CommandError, 'Invalid CSV after line 1'):
+            self.ingest(path)
+
+    def test_unchanged_feed_invalidates_nothing(self):
+        self.ingest(self.geojson())
+        with patch.object(tiles, 'invalidate_extents') as invalidate, patch.object(response_cache, 'bump_version') as bump:
+            out, _ = self.ingest(self.geojson())
+        self.assertIn('0 created, 0 updated, 2 unchanged', out)
+        invalidate.assert_not_called()
+        bump.assert_not_called()
+
+    def test_rolled_back_batch_is_forgotten(self):
+        ingestion = ingest.Ingestion(self.organizer, batch_size=1)
+        with open(self.geojson(), encoding='utf-8') as feed, patch.object(search, 'index_events', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                ingestion.run(ingest.read_geojson(feed))
+        # The first batch created the Music category and an event, then rolled back
+        self.assertFalse(Category.objects.filter(name='Music').exists())
+        self.assertNotIn('music', ingestion.categories)
+        self.assertEqual((ingestion.created, ingestion._extent), (0, None))
+        self.assertFalse(EventCluster.objects.filter(count__gt=0).exists())
+
+
+class LoadDataTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(username='loadtest', password='testpassword123')
+
+    def test_generated_dataset(self):
+        out = io.StringIO()
+        call_command('generate_load_data', events=30, stages_per_event=2, slots_per_stage=4, batch_size=8, stdout=out)
+        self.assertIn('Created 30 events, 60 stages and 240 scheduled events', out.getvalue())
+        self.assertEqual(Event.objects.filter(organizer=self.organizer).count(), 30)
+        self.assertEqual(sum(EventCluster.objects.filter(zoom=0).values_list('count', flat=True)), 30)
+
+        for instance in list(Event.objects.all()[:5]) + list(EventSubsection.objects.all()[:5]):
+            points = instance.boundary_coordinates
+            self.assertEqual(geometry.decode_polyline(instance.boundary_encoded['full']), [[round(lat, 5), round(lng, 5)] for lat, lng in points])
+            self.assertEqual(instance.bounds_south, min(lat for lat, _ in points))
+            self.assertEqual(instance.bounds_east, max(lng for _, lng in points))
+        for stage in EventSubsection.objects.all():
+            slots = list(stage.scheduled_events.order_by('start_time'))
+            self.assertEqual(len(slots), 4)
+            for previous, slot in zip(slots, slots[1:]):
+                self.assertLessEqual(previous.end_time, slot.start_time)
+
+        event = Event.objects.first()
+        self.assertIn(event, search.search_events(Event.objects.all(), event.title.split()[0]))
+        # New rows get ids after the generated ones
+        self.assertGreater(Event.objects.create(title='After', description='d', date=timezone.now(), latitude=1, longitude=1, organizer=self.organizer).id, 30)
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', events=1, stdout=out)
+
+
+class ApiBenchmarkTests(TestCase):
+    def benchmark(self, **options):
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        out = io.StringIO()
+        call_command('benchmark_api', scales=[12], requests=2, output=output.name, stdout=out, stderr=io.StringIO(), **options)
+        with open(output.name) as f:
+            return json.load(f), out.getvalue()
+
+    def test_results_and_compare(self):
+        results, _ = self.benchmark()
+        paths = results['results']['12']
+        self.assertEqual(set(paths), {'event_list', 'event_list_search', 'nearby_events', 'stage_details', 'stage_events_public'})
+        self.assertEqual(set(paths['stage_details']), {'p50_ms', 'p90_ms', 'p99_ms', 'queries', 'bytes'})
+        self.assertGreater(paths['stage_events_public']['bytes'], 0)
+        # The generated data was rolled back
+        self.assertFalse(Event.objects.exists())
+
+        baseline = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.remove, baseline.name)
+        for path in paths.values():
+            path['p50_ms'] = path['p90_ms'] = 1e6
+        with baseline:
+            json.dump(results, baseline)
+        _, out = self.benchmark(compare=baseline.name)
+        self.assertIn('No regressions', out)
+
+        paths['stage_details']['queries'] -= 1
+        paths['event_list']['p50_ms'] = 0
+        with open(baseline.name, 'w') as f:
+            json.dump(results, f)
+        with self.assertRaisesMessage(CommandError, '2 regressions'):
+            self.benchmark(compare=baseline.name)
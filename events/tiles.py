@@ -0,0 +1,222 @@
+"""
+Compact JSON map tiles for events and stage polygons.
+
+A tile at z/x/y holds coordinates quantized to a TILE_EXTENT grid local to
+the tile, in the spirit of Mapbox Vector Tiles:
+
+* below BOUNDARY_MIN_ZOOM, the precomputed marker clusters of the tile;
+* from BOUNDARY_MIN_ZOOM up, the event markers plus event and subsection
+  boundaries (from the matching level-of-detail tier) clipped to the tile.
+
+Rendered tiles are kept in the Django cache under their z/x/y key and only
+the tiles overlapping a changed Event or EventSubsection are invalidated.
+When a change spans more than MAX_INVALIDATED_TILES tiles at some zoom level
+(a city-wide boundary at z16, say), the whole level is invalidated at once by
+bumping its generation number, which is part of every tile key.
+
+Invalidation runs once the writing transaction commits, so a tile rendered
+meanwhile from the old rows is dropped too. It only reaches the processes
+sharing the Django cache: with a per-process cache (the default LocMemCache)
+other workers keep their tiles until TILE_CACHE_TIMEOUT runs out.
+"""
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .clustering import CELLS_PER_TILE, CLUSTER_MAX_ZOOM
+from .geo import mercator, mercator_latitude
+from .geometry import BOUNDARY_MIN_ZOOM
+from .models import Event, EventCluster, EventSubsection
+from .serializers import boundary_column
+
+TILE_MAX_ZOOM = 16
+TILE_EXTENT = 4096
+# Polygons are clipped slightly outside the tile so edges don't show seams
+TILE_BUFFER = 64
+# Seconds a tile is kept, which bounds its staleness where the cache isn't shared
+TILE_CACHE_TIMEOUT = 300
+MAX_INVALIDATED_TILES = 256
+
+
+def _generation_key(z):
+    return f'tile-generation:{z}'
+
+
+def _tile_key(z, generation, x, y):
+    return f'tile:{z}:{generation}:{x}:{y}'
+
+
+def tile_key(z, x, y):
+    """Cache key of the current rendering of tile z/x/y"""
+    return _tile_key(z, cache.get(_generation_key(z), 0), x, y)
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of a tile in degrees"""
+    n = 2 ** z
+    return (
+        mercator_latitude((y + 1) / n),
+        x / n * 360 - 180,
+        mercator_latitude(y / n),
+        (x + 1) / n * 360 - 180,
+    )
+
+
+def tile_for(lat, lon, z):
+    n = 2 ** z
+    x, y = mercator(lat, lon)
+    return max(0, min(int(x * n), n - 1)), max(0, min(int(y * n), n - 1))
+
+
+def project(lat, lon, z, x, y):
+    """Quantized position of a point inside tile z/x/y"""
+    n = 2 ** z
+    mx, my = mercator(lat, lon)
+    return round((mx * n - x) * TILE_EXTENT), round((my * n - y) * TILE_EXTENT)
+
+
+def clip_ring(points, south, west, north, east):
+    """Sutherland-Hodgman clip of a [lat, lng] ring against a latitude/longitude box"""
+    edges = [
+        (lambda p: p[0] >= south, 0, south),
+        (lambda p: p[0] <= north, 0, north),
+        (lambda p: p[1] >= west, 1, west),
+        (lambda p: p[1] <= east, 1, east),
+    ]
+    for inside, axis, value in edges:
+        if not points:
+            break
+        clipped = []
+        previous = points[-1]
+        for current in points:
+            if inside(current) != inside(previous):
+                t = (value - previous[axis]) / (current[axis] - previous[axis])
+                crossing = [previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])]
+                crossing[axis] = value
+                clipped.append(crossing)
+            if inside(current):
+                clipped.append(current)
+            previous = current
+        points = clipped
+    return points
+
+
+def _bounds_overlap(south, west, north, east):
+    return Q(bounds_south__lte=north, bounds_north__gte=south, bounds_west__lte=east, bounds_east__gte=west)
+
+
+def _polygon(ring, z, x, y, buffered):
+    ring = clip_ring(ring, *buffered)
+    flat = []
+    previous = None
+    for lat, lon in ring:
+        point = project(lat, lon, z, x, y)
+        if point != previous:
+            flat.extend(point)
+            previous = point
+    return flat if len(flat) >= 6 else None
+
+
+def render_tile(z, x, y):
+    south, west, north, east = tile_bounds(z, x, y)
+    tile = {'zoom': z, 'x': x, 'y': y, 'extent': TILE_EXTENT}
+
+    if z < BOUNDARY_MIN_ZOOM:
+        cluster_zoom = min(z, CLUSTER_MAX_ZOOM)
+        rows = EventCluster.objects.filter(
+            zoom=cluster_zoom,
+            cell_x__range=(x * CELLS_PER_TILE, (x + 1) * CELLS_PER_TILE - 1),
+            cell_y__range=(y * CELLS_PER_TILE, (y + 1) * CELLS_PER_TILE - 1),
+        ).values_list('count', 'latitude_sum', 'longitude_sum')
+        tile['clusters'] = [
+            list(project(lat_sum / count, lon_sum / count, z, x, y)) + [count]
+            for count, lat_sum, lon_sum in rows
+        ]
+        return tile
+
+    markers = Event.objects.filter(
+        latitude__gte=south, latitude__lt=north, longitude__gte=west, longitude__lt=east,
+    ).values_list('id', 'latitude', 'longitude', 'title')
+    tile['events'] = [[event_id] + list(project(lat, lon, z, x, y)) + [title] for event_id, lat, lon, title in markers]
+
+    margin_lat = (north - south) * TILE_BUFFER / TILE_EXTENT
+    margin_lon = (east - west) * TILE_BUFFER / TILE_EXTENT
+    buffered = (south - margin_lat, west - margin_lon, north + margin_lat, east + margin_lon)
+    column = boundary_column(z)
+
+    polygons = []
+    for event_id, ring in Event.objects.filter(_bounds_overlap(*buffered)).values_list('id', column):
+        flat = _polygon(ring, z, x, y, buffered) if ring else None
+        if flat:
+            polygons.append({'event': event_id, 'ring': flat})
+    subsections = EventSubsection.objects.filter(_bounds_overlap(*buffered)).values_list('id', 'event_id', 'color', column)
+    for subsection_id, event_id, color, ring in subsections:
+        flat = _polygon(ring, z, x, y, buffered) if ring else None
+        if flat:
+            polygons.append({'event': event_id, 'subsection': subsection_id, 'color': color, 'ring': flat})
+    tile['polygons'] = polygons
+    return tile
+
+
+def get_tile(z, x, y):
+    """Serialized tile, rendered on a cache miss"""
+    key = tile_key(z, x, y)
+    content = cache.get(key)
+    if content is None:
+        content = json.dumps(render_tile(z, x, y), separators=(',', ':'))
+        cache.set(key, content, TILE_CACHE_TIMEOUT)
+    return content
+
+
+def invalidate_extents(extents):
+    """
+    Drop every cached tile overlapping the given extents, each a
+    (lat, lon, south, west, north, east) tuple whose point or bounds may be
+    None, when the current transaction commits. Neighbouring tiles are
+    included since polygons spill into them through the clip buffer.
+    """
+    boxes = []
+    for extent in extents:
+        if not extent:
+            continue
+        lat, lon, south, west, north, east = extent
+        if lat is not None:
+            boxes.append((lat, lon, lat, lon))
+        if south is not None:
+            boxes.append((south, west, north, east))
+    if boxes:
+        transaction.on_commit(lambda: _invalidate_boxes(boxes))
+
+
+def _invalidate_boxes(boxes):
+    generation_keys = [_generation_key(z) for z in range(TILE_MAX_ZOOM + 1)]
+    generations = cache.get_many(generation_keys)
+    keys = set()
+    for z in range(TILE_MAX_ZOOM + 1):
+        last = 2 ** z - 1
+        ranges = []
+        for box_south, box_west, box_north, box_east in boxes:
+            min_x, min_y = tile_for(box_north, box_west, z)
+            max_x, max_y = tile_for(box_south, box_east, z)
+            ranges.append((max(0, min_x - 1), min(last, max_x + 1), max(0, min_y - 1), min(last, max_y + 1)))
+
+        if sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, x1, y0, y1 in ranges) > MAX_INVALIDATED_TILES:
+            try:
+                cache.incr(generation_keys[z])
+            except ValueError:
+                cache.set(generation_keys[z], 1, None)
+            continue
+
+        generation = generations.get(generation_keys[z], 0)
+        for x0, x1, y0, y1 in ranges:
+            for tx in range(x0, x1 + 1):
+                for ty in range(y0, y1 + 1):
+                    keys.add(_tile_key(z, generation, tx, ty))
+    if keys:
+        cache.delete_many(keys)
@@ -6,6 +6,11 @@ urlpatterns = [
     path('map/', views.map_view, name='map_home'),
     path('api/events/', views.event_list_api, name='event_list_api'),
     path('api/events/nearby/', views.nearby_events_api, name='nearby_events_api'),
+    path('api/events/<int:event_id>/', views.event_detail_api, name='event_detail_api'),
+    path('api/events/<int:event_id>/patch/', views.event_patch_api, name='event_patch_api'),
+    path('api/events/clusters/', views.event_clusters_api, name='event_clusters_api'),
+    path('api/events/suggest/', views.event_suggest_api, name='event_suggest_api'),
+    path('tiles/<int:z>/<int:x>/<int:y>.json', views.tile_api, name='tile_api'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -16,9 +21,15 @@ urlpatterns = [
     path('dashboard/user/delete/<int:user_id>/', views.delete_user_view, name='delete_user'),
     path('dashboard/organizer/', views.organizer_dashboard, name='organizer_dashboard'),
     path('organizer/event/<int:event_id>/stages/', views.manage_event_stages, name='manage_event_stages'),
+    path('organizer/event/<int:event_id>/schedule/import/', views.import_event_schedule, name='import_event_schedule'),
     path('organizer/stage/<int:subsection_id>/schedule/', views.manage_stage_schedule, name='manage_stage_schedule'),
     path('organizer/stage/<int:subsection_id>/add-event/', views.add_stage_event, name='add_stage_event'),
     path('api/stage/<int:subsection_id>/details/', views.stage_details_api, name='stage_details_api'),
+    path('api/event/<int:event_id>/stages/live/', views.event_stages_live_api, name='event_stages_live_api'),
+    path('api/event/<int:event_id>/stages/live/stream/', views.event_live_stream, name='event_live_stream'),
+    path('api/stage/<int:subsection_id>/live/stream/', views.stage_live_stream, name='stage_live_stream'),
     path('stage/<int:subsection_id>/events/', views.stage_events_public_view, name='stage_events_public'),
+    path('stage/<int:subsection_id>/schedule.ics', views.stage_schedule_ics, name='stage_schedule_ics'),
+    path('event/<int:event_id>/schedule.ics', views.event_schedule_ics, name='event_schedule_ics'),
     path('dashboard/user/', views.user_dashboard, name='user_dashboard'),
 ]
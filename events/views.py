@@ -1,28 +1,33 @@
+import heapq
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_http_methods
 from .decorators import admin_required, organizer_required, organizer_or_admin_required
 from .forms import UserRegistrationForm, EventForm
-from .forms import UserRegistrationForm, EventForm, UserEditForm, StageEventForm
+from .forms import UserRegistrationForm, EventForm, UserEditForm, StageEventForm, ScheduleImportForm
 from .models import Event, UserProfile, EventSubsection, StageEvent
 from django.contrib.auth.models import User
 from django.utils import timezone
-from math import radians, sin, cos, sqrt, atan2
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in kilometers using Haversine formula"""
-    R = 6371  # Earth's radius in km
-    
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    
-    return R * c
+from . import live
+from .clustering import clusters_in_viewport
+from .geometry import BOUNDARY_MIN_ZOOM
+from .pagination import is_paginated, parse_page, next_page_url
+from .tiles import get_tile, is_valid_tile
+from .response_cache import cached_response
+from .schedule_import import ScheduleImportError, import_schedule, parse_schedule
+from .subsections import apply_subsections
+from .event_patch import PatchError, VersionConflict, apply_patch
+from .ics import schedule_feed
+from .schedule import event_schedule_version, live_board, schedule_index, stage_status, status_changes_at
+from .search import search_events
+from .suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, suggest
+from .serializers import parse_fields, parse_geometry_format, serialize_events, event_rows, attach_subsections, iter_events_json
+from .geo import bounding_boxes, viewport_boxes, bounding_box_filter, pack_coordinates, within_radius
 
 def landing_page(request):
     return render(request, 'events/landing.html')
@@ -30,6 +35,23 @@ def landing_page(request):
 def map_view(request):
     return render(request, 'events/map.html')
 
+MAX_ZOOM = 22
+
+def parse_zoom(request):
+    """Read the optional map zoom level, raising ValueError if malformed"""
+    zoom = request.GET.get('zoom')
+    if zoom is not None:
+        zoom = int(zoom)
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError('Invalid zoom')
+    return zoom
+
+def parse_viewport(request):
+    """Read the bbox=south,west,north,east and zoom parameters, raising ValueError if malformed"""
+    south, west, north, east = (float(value) for value in request.GET['bbox'].split(','))
+    return viewport_boxes(south, west, north, east), parse_zoom(request)
+
+@cached_response
 def event_list_api(request):
     # Get search query from request
     search_query = request.GET.get('search', '').strip()
@@ -37,46 +59,106 @@ def event_list_api(request):
     # Start with all events
     events = Event.objects.all()
     
-    # Apply search filter if query exists
+    # Sparse fieldsets: fields=id,title,latitude,longitude&include=subsections
+    try:
+        fields, include_subsections = parse_fields(request)
+        zoom = parse_zoom(request)
+        encoded = parse_geometry_format(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    if zoom is not None and zoom < BOUNDARY_MIN_ZOOM:
+        fields = tuple(name for name in fields if name != 'boundary_coordinates')
+        include_subsections = False
+    
+    # Restrict to the map viewport if one was sent: bbox=south,west,north,east
+    if request.GET.get('bbox'):
+        try:
+            boxes, _ = parse_viewport(request)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid parameters'}, status=400)
+        events = events.filter(bounding_box_filter(boxes))
+    
+    # Apply search filter if query exists, best matches first
     if search_query:
-        from django.db.models import Q
-        events = events.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location_name__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+        events = search_events(events, search_query)
     
-    data = []
-    for event in events:
-        # Get subsections for this event
-        subsections_data = []
-        for subsection in event.subsections.all():
-            subsections_data.append({
-                'name': subsection.name,
-                'description': subsection.description,
-                'boundary_coordinates': subsection.boundary_coordinates,
-                'name': subsection.name,
-                'description': subsection.description,
-                'boundary_coordinates': subsection.boundary_coordinates,
-                'color': subsection.color,
-                'id': subsection.id
-            })
-        
-        data.append({
-            'title': event.title,
-            'description': event.description,
-            'date': event.date.strftime('%Y-%m-%d %H:%M'),
-            'latitude': event.latitude,
-            'longitude': event.longitude,
-            'location_name': event.location_name,
-            'category': event.category.name if event.category else 'Uncategorized',
-            'boundary_coordinates': event.boundary_coordinates,
-            'subsections': subsections_data,
-            'id': event.id,
-        })
+    # Large exports can be streamed chunk by chunk instead of built in memory
+    if request.GET.get('stream') in ('1', 'true'):
+        return StreamingHttpResponse(iter_events_json(events, fields, include_subsections, zoom, encoded), content_type='application/json')
+    
+    # Keyset pagination ordered by id: limit=N&cursor=...
+    if is_paginated(request):
+        try:
+            limit, cursor = parse_page(request)
+            if search_query:
+                # Search results are ordered by (rank desc, id)
+                if cursor:
+                    rank, last_id = int(cursor['rank']), int(cursor['id'])
+                    events = events.filter(Q(search_rank__lt=rank) | Q(search_rank=rank, id__gt=last_id))
+            else:
+                events = events.order_by('id')
+                if cursor:
+                    events = events.filter(id__gt=int(cursor['id']))
+        except (KeyError, ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid parameters'}, status=400)
+        page = events[:limit + 1]
+        # The rank of the last result goes in the cursor of the next page
+        extra = ('search_rank',) if search_query else ()
+        data = serialize_events(page, fields, include_subsections, zoom, encoded, extra)
+        ranks = [row.pop('search_rank') for row in data] if search_query else None
+        next_url = None
+        if len(data) > limit:
+            data = data[:limit]
+            last = {'id': data[-1]['id']}
+            if search_query:
+                last['rank'] = ranks[limit - 1]
+            next_url = next_page_url(request, last)
+        return JsonResponse({'results': data, 'next': next_url})
+    
+    data = serialize_events(events, fields, include_subsections, zoom, encoded)
     return JsonResponse(data, safe=False)
 
+def event_suggest_api(request):
+    """Autocomplete for the search box: /api/events/suggest/?q=jaz&limit=8"""
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SUGGESTIONS))
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise ValueError('Invalid limit')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    return JsonResponse({'suggestions': suggest(request.GET.get('q', ''), limit)})
+
+@cached_response
+def event_detail_api(request, event_id):
+    """Full payload for a single event, e.g. to load geometry when a marker popup opens"""
+    try:
+        fields, include_subsections = parse_fields(request)
+        zoom = parse_zoom(request)
+        encoded = parse_geometry_format(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    data = serialize_events(Event.objects.filter(id=event_id), fields, include_subsections, zoom, encoded)
+    if not data:
+        return JsonResponse({'error': 'Event not found'}, status=404)
+    return JsonResponse(data[0])
+
+@cached_response
+def event_clusters_api(request):
+    """Marker clusters (centroid and event count) covering the viewport at one zoom level"""
+    try:
+        boxes, zoom = parse_viewport(request)
+        if zoom is None:
+            raise ValueError('Zoom is required')
+    except (KeyError, ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    return JsonResponse(clusters_in_viewport(boxes, zoom), safe=False)
+
+def tile_api(request, z, x, y):
+    """Compact JSON tile with clusters (zoomed out) or markers and clipped polygons"""
+    if not is_valid_tile(z, x, y):
+        raise Http404("Tile out of range")
+    return HttpResponse(get_tile(z, x, y), content_type='application/json')
+
 def register_view(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
@@ -134,18 +216,10 @@ def add_event_view(request):
             subsections_data = request.POST.get('subsections_data', '[]')
             try:
                 import json
-                from .models import EventSubsection
                 subsections = json.loads(subsections_data)
                 
-                # Create EventSubsection objects
-                for subsection in subsections:
-                    EventSubsection.objects.create(
-                        event=event,
-                        name=subsection['name'],
-                        description=subsection.get('description', ''),
-                        boundary_coordinates=subsection['boundary_coordinates'],
-                        color=subsection['color']
-                    )
+                # Create all EventSubsection objects in one insert
+                apply_subsections(event, subsections)
             except Exception as e:
                 print(f"Error creating subsections: {e}")
             
@@ -167,45 +241,41 @@ def edit_event_view(request, event_id):
     if request.method == 'POST':
         form = EventForm(request.POST, instance=event)
         if form.is_valid():
-            event = form.save(commit=False)
-            # Ensure ownership doesn't change on edit unless admin?? 
-            # Actually, standard is not to change owner.
-            event.save()
-            
-            # Handle subsections - For simplicity, we'll clear existing and recreate
-            # In a more complex app, we might want to track IDs to update instead of delete/create
-            subsections_data = request.POST.get('subsections_data', '[]')
-            try:
-                import json
-                from .models import EventSubsection
-                subsections = json.loads(subsections_data)
-                
-                # Clear existing subsections
-                event.subsections.all().delete()
-                
-                # Create new EventSubsection objects
-                for subsection in subsections:
-                    EventSubsection.objects.create(
-                        event=event,
-                        name=subsection['name'],
-                        description=subsection.get('description', ''),
-                        boundary_coordinates=subsection['boundary_coordinates'],
-                        color=subsection['color']
-                    )
-            except Exception as e:
-                print(f"Error updating subsections: {e}")
+            with transaction.atomic():
+                # The page carries the version it was loaded at, like a patch does, so
+                # saving it cannot silently overwrite changes made since
+                current = Event.objects.select_for_update().filter(pk=event.pk).values_list('version', flat=True).first()
+                if request.POST.get('version') != str(current):
+                    form.add_error(None, 'Event was changed by someone else. Reload the page to see the changes.')
+                else:
+                    event = form.save(commit=False)
+                    # Ensure ownership doesn't change on edit unless admin?? 
+                    # Actually, standard is not to change owner.
+                    event.version = current + 1  # Outdates patches made against the previous version
+                    event.save()
+                    
+                    # Handle subsections - existing ones come back with their id, so only
+                    # changed rows are written and stages keep their schedules
+                    subsections_data = request.POST.get('subsections_data', '[]')
+                    try:
+                        import json
+                        subsections = json.loads(subsections_data)
+                        apply_subsections(event, subsections)
+                    except Exception as e:
+                        print(f"Error updating subsections: {e}")
             
-            if request.user.userprofile.role == 'ADMIN':
-                return redirect('admin_dashboard')
-            else:
-                return redirect('organizer_dashboard')
+            if not form.errors:
+                if request.user.userprofile.role == 'ADMIN':
+                    return redirect('admin_dashboard')
+                else:
+                    return redirect('organizer_dashboard')
     else:
         form = EventForm(instance=event)
     
     # Serialize subsections for the template
     import json
     from django.core.serializers.json import DjangoJSONEncoder
-    existing_subsections = list(event.subsections.values('name', 'description', 'boundary_coordinates', 'color'))
+    existing_subsections = list(event.subsections.values('id', 'name', 'description', 'boundary_coordinates', 'color'))
     existing_subsections_json = json.dumps(existing_subsections, cls=DjangoJSONEncoder)
     
     context = {
@@ -216,6 +286,28 @@ def edit_event_view(request, event_id):
     }
     return render(request, 'events/add_event.html', context)
 
+@login_required
+@organizer_or_admin_required
+@require_http_methods(['PATCH'])
+def event_patch_api(request, event_id):
+    """Partial update of an event's geometry and subsections, see events/event_patch.py"""
+    organizer_id = Event.objects.filter(id=event_id).values_list('organizer_id', flat=True).first()
+    if organizer_id is None:
+        return JsonResponse({'error': 'Event not found'}, status=404)
+    if request.user.userprofile.role != 'ADMIN' and organizer_id != request.user.id:
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    try:
+        import json
+        result = apply_patch(event_id, json.loads(request.body))
+    except PatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except VersionConflict as e:
+        return JsonResponse({'error': 'Event was changed by someone else', 'version': e.version}, status=409)
+    return JsonResponse(result)
+
+@cached_response
 def nearby_events_api(request):
     """Find events within a specified radius of a location"""
     try:
@@ -223,41 +315,61 @@ def nearby_events_api(request):
         lat = float(request.GET.get('lat', 0))
         lon = float(request.GET.get('lon', 0))
         radius = float(request.GET.get('radius', 10))  # Default 10km
+        fields, include_subsections = parse_fields(request)
+        zoom = parse_zoom(request)
+        encoded = parse_geometry_format(request)
+        paginated = is_paginated(request)
+        if paginated:
+            limit, cursor = parse_page(request)
+            after = (float(cursor['distance']), int(cursor['id'])) if cursor else None
+        
+        # Prune candidates with an indexed bounding box query before the exact distance check
+        events = Event.objects.filter(bounding_box_filter(bounding_boxes(lat, lon, radius)))
+        
+        if paginated:
+            # Only positions are read to pick the page; payloads are loaded for its events alone
+            candidates = list(events.values_list('id', 'latitude', 'longitude'))
+            lats, lons = pack_coordinates((row[1], row[2]) for row in candidates)
+            keys = [(round(distance, 2), candidates[index][0]) for index, distance in within_radius(lat, lon, lats, lons, radius)]
+            if after:
+                keys = [key for key in keys if key > after]
+            # Only the next page is sorted, so deep pages cost the same as the first
+            keys = heapq.nsmallest(limit + 1, keys)
+            next_url = None
+            if len(keys) > limit:
+                keys = keys[:limit]
+                next_url = next_page_url(request, {'distance': keys[-1][0], 'id': keys[-1][1]})
+            rows = {row['id']: row for row in event_rows(events.filter(id__in=[event_id for _, event_id in keys]), fields, zoom, encoded)}
+            page = []
+            for distance, event_id in keys:
+                # An event deleted in between is left out
+                if event_id in rows:
+                    rows[event_id]['distance'] = distance  # Distance in km
+                    page.append(rows[event_id])
+            if include_subsections:
+                attach_subsections(page, zoom=zoom, encoded=encoded)
+            return JsonResponse({'results': page, 'next': next_url})
         
-        # Get all events
-        events = Event.objects.all()
+        position_fields = tuple(name for name in ('latitude', 'longitude') if name not in fields)
+        candidates = event_rows(events, fields + position_fields, zoom, encoded)
         
-        # Calculate distances and filter
+        # Calculate distances for the whole candidate set in one batch
+        lats, lons = pack_coordinates((row['latitude'], row['longitude']) for row in candidates)
         nearby_events = []
-        for event in events:
-            distance = haversine_distance(lat, lon, event.latitude, event.longitude)
-            if distance <= radius:
-                nearby_events.append({
-                    'title': event.title,
-                    'description': event.description,
-                    'date': event.date.strftime('%Y-%m-%d %H:%M'),
-                    'latitude': event.latitude,
-                    'longitude': event.longitude,
-                    'location_name': event.location_name,
-                    'category': event.category.name if event.category else 'Uncategorized',
-                    'boundary_coordinates': event.boundary_coordinates,
-                    'id': event.id,
-                    'id': event.id,
-                    'distance': round(distance, 2),  # Distance in km
-                    'subsections': [{
-                        'name': s.name,
-                        'description': s.description,
-                        'boundary_coordinates': s.boundary_coordinates,
-                        'color': s.color,
-                        'id': s.id
-                    } for s in event.subsections.all()]
-                })
+        for index, distance in within_radius(lat, lon, lats, lons, radius):
+            row = candidates[index]
+            for name in position_fields:
+                del row[name]
+            row['distance'] = round(distance, 2)  # Distance in km
+            nearby_events.append(row)
         
         # Sort by distance (closest first)
-        nearby_events.sort(key=lambda x: x['distance'])
+        nearby_events.sort(key=lambda row: (row['distance'], row['id']))
+        if include_subsections:
+            attach_subsections(nearby_events, zoom=zoom, encoded=encoded)
         
         return JsonResponse(nearby_events, safe=False)
-    except (ValueError, TypeError) as e:
+    except (KeyError, ValueError, TypeError) as e:
         return JsonResponse({'error': 'Invalid parameters'}, status=400)
 
 @login_required
@@ -318,6 +430,29 @@ def manage_event_stages(request, event_id):
     subsections = event.subsections.all()
     return render(request, 'events/manage_event_stages.html', {'event': event, 'subsections': subsections})
 
+@login_required
+@organizer_required
+def import_event_schedule(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    
+    # Check ownership
+    if request.user.userprofile.role != 'ADMIN' and event.organizer != request.user:
+        return redirect('organizer_dashboard')
+
+    errors = []
+    if request.method == 'POST':
+        form = ScheduleImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            schedule_file = form.cleaned_data['schedule_file']
+            try:
+                import_schedule(event, parse_schedule(schedule_file.text, schedule_file.name))
+                return redirect('manage_event_stages', event_id=event.id)
+            except ScheduleImportError as e:
+                errors = e.errors
+    else:
+        form = ScheduleImportForm()
+    return render(request, 'events/import_schedule.html', {'form': form, 'event': event, 'errors': errors})
+
 @login_required
 @organizer_required
 def manage_stage_schedule(request, subsection_id):
@@ -350,32 +485,73 @@ def add_stage_event(request, subsection_id):
         form = StageEventForm(subsection=subsection)
     return render(request, 'events/add_stage_event.html', {'form': form, 'subsection': subsection})
 
+@cached_response
 def stage_details_api(request, subsection_id):
     subsection = get_object_or_404(EventSubsection, id=subsection_id)
     now = timezone.now()
+    schedule = schedule_index(subsection.id)
     
     # Find live event (start <= now <= end)
-    live_event = subsection.scheduled_events.filter(start_time__lte=now, end_time__gte=now).first()
+    live_slots = schedule.live_at(now)
+    live_event = live_slots[0]._asdict() if live_slots else None
     
     # Upcoming
-    next_event = subsection.scheduled_events.filter(start_time__gt=now).order_by('start_time').first()
-    upcoming_count = subsection.scheduled_events.filter(start_time__gt=now).count()
+    next_slot = schedule.next_after(now)
+    next_event = next_slot._asdict() if next_slot else None
+    upcoming_count = schedule.count_after(now)
     
-    data = {
-        'id': subsection.id,
-        'name': subsection.name,
-        'live_event': {
-            'title': live_event.title,
-            'start': live_event.start_time.strftime('%H:%M'),
-            'end': live_event.end_time.strftime('%H:%M')
-        } if live_event else None,
-        'next_event': {
-            'title': next_event.title,
-            'start': next_event.start_time.strftime('%H:%M')
-        } if next_event else None,
-        'upcoming_count': upcoming_count
-    }
-    return JsonResponse(data)
+    response = JsonResponse(stage_status(subsection.id, subsection.name, live_event, next_event, upcoming_count))
+    # The payload changes when the live act ends or the next one starts
+    changes_at = status_changes_at([live_event], [next_event])
+    if changes_at:
+        response.expires_at = changes_at.timestamp()
+    return response
+
+@cached_response
+def event_stages_live_api(request, event_id):
+    """Live and next act of every stage of an event, for refreshing a whole "now playing" board at once"""
+    event = get_object_or_404(Event.objects.only('id'), id=event_id)
+    board, changes_at = live_board(event.id)
+    response = JsonResponse({'event': event.id, 'stages': board})
+    if changes_at:
+        response.expires_at = changes_at.timestamp()
+    return response
+
+async def stage_live_stream(request, subsection_id):
+    """Server-Sent Events stream of one stage's live and next act"""
+    event_id = await EventSubsection.objects.filter(id=subsection_id).values_list('event_id', flat=True).afirst()
+    if event_id is None:
+        raise Http404('No such stage')
+    return live_stream_response(live.stream(event_id, subsection_id))
+
+async def event_live_stream(request, event_id):
+    """Server-Sent Events stream of the live and next acts of every stage of an event"""
+    if not await Event.objects.filter(id=event_id).aexists():
+        raise Http404('No such event')
+    return live_stream_response(live.stream(event_id))
+
+def live_stream_response(messages):
+    response = StreamingHttpResponse(messages, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def stage_schedule_ics(request, subsection_id):
+    """Subscribable iCalendar feed of one stage"""
+    subsection = get_object_or_404(EventSubsection.objects.select_related('event'), id=subsection_id)
+    # The event's own version too, as the feed is named after the event
+    version = event_schedule_version(subsection.event_id, [subsection.id])
+    return schedule_feed(
+        request, f'stage-{subsection.id}', version,
+        f'{subsection.event.title} - {subsection.name}', StageEvent.objects.filter(subsection=subsection),
+    )
+
+def event_schedule_ics(request, event_id):
+    """Subscribable iCalendar feed of every stage of an event"""
+    event = get_object_or_404(Event.objects.only('id', 'title'), id=event_id)
+    version = event_schedule_version(event.id, event.subsections.values_list('id', flat=True))
+    return schedule_feed(request, f'event-{event.id}', version, event.title, StageEvent.objects.filter(subsection__event=event))
 
 def stage_events_public_view(request, subsection_id):
     subsection = get_object_or_404(EventSubsection, id=subsection_id)
@@ -383,7 +559,8 @@ def stage_events_public_view(request, subsection_id):
     
     upcoming_events = subsection.scheduled_events.filter(start_time__gte=now).order_by('start_time')
     past_events = subsection.scheduled_events.filter(end_time__lt=now).order_by('-start_time')
-    live_event = subsection.scheduled_events.filter(start_time__lte=now, end_time__gte=now).first()
+    live_slots = schedule_index(subsection.id).live_at(now)
+    live_event = subsection.scheduled_events.filter(pk=live_slots[0].id).first() if live_slots else None
     
     return render(request, 'events/stage_events_public.html', {
         'subsection': subsection,